@@ -0,0 +1,82 @@
+"""Compare aligning structures to a STEM target with the former
+`scipy.optimize.fmin` search over translations against the cross-correlation
+registration used by `relaxations.STEM.align`. Each structure is the Au55
+target, randomly rattled and translated in the xy-plane.
+
+Usage: python benchmarks/STEM_alignment.py [ntrials] [rattle] [max_shift]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+from ase.io import read
+from scipy.optimize import fmin
+
+import structopt
+from structopt.common.individual.relaxations.STEM import STEM
+
+TARGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples', 'genetic', 'aperiodic',
+                      'Au55-STEM-move_surface_atoms_STEM-parallel', 'Au55-decahedron.xyz')
+
+
+def chi2(shift, atoms, module):
+    x, y = shift
+    atoms = atoms.copy()
+    atoms.translate([x, y, 0])
+    image = module.get_image(atoms)
+    return np.sum(np.square(module.target - image)) ** 0.5
+
+
+def fmin_align(atoms, module):
+    """The alignment used before registration."""
+    x, y = fmin(chi2, [0, 0], args=(atoms, module), disp=False)
+    atoms.translate([x, y, 0])
+
+
+def register_align(atoms, module):
+    module.align(atoms)
+
+
+def main(ntrials=20, rattle=0.05, max_shift=2.0):
+    sys.modules['gparameters'].update({'logging': {'path': tempfile.mkdtemp()}, 'mpi': {'rank': 0}})
+    module = STEM({'kwargs': {'HWHM': 0.4, 'dimensions': [20.0, 20.0], 'resolution': 5.0,
+                              'zed': 1, 'target': TARGET}})
+    module.generate_target()
+    target = read(TARGET)
+
+    rng = np.random.RandomState(0)
+    trials = []
+    for i in range(ntrials):
+        atoms = target.copy()
+        atoms.rattle(rattle, seed=i)
+        shift = np.append(rng.uniform(-max_shift, max_shift, 2), 0.0)
+        atoms.translate(shift)
+        trials.append((atoms, shift))
+
+    get_image = module.get_image
+    for name, align in [('fmin', fmin_align), ('registration', register_align)]:
+        images = [0]
+
+        def counting_get_image(atoms):
+            images[0] += 1
+            return get_image(atoms)
+
+        module.get_image = counting_get_image
+        errors, chis, t0 = [], [], time.time()
+        for atoms, shift in trials:
+            atoms = atoms.copy()
+            align(atoms, module)
+            errors.append(np.linalg.norm(atoms.positions.mean(axis=0)[:2] - target.positions.mean(axis=0)[:2]))
+            chis.append(chi2([0, 0], atoms, module))
+        elapsed = time.time() - t0
+        module.get_image = get_image
+        print('{:>12}: {:7.2f} ms and {:5.1f} images per alignment, translation error {:.4f} A, '
+              'chi {:.4f}'.format(name, elapsed / ntrials * 1e3, (images[0] - ntrials) / ntrials,
+                                  np.mean(errors), np.mean(chis)))
+
+
+if __name__ == '__main__':
+    main(*[float(arg) if '.' in arg else int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""Time the FFT and real-space splat backends of the STEM fitness on the
+Au55 and Pt561 examples, check that they agree, and show which one the
+cost model picks. Also times the incremental update after moving one atom.
+
+Usage: python benchmarks/STEM_imaging.py [repeats]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+from ase.io import read
+
+import structopt
+from structopt.common.individual import Individual
+from structopt.common.individual.fitnesses.STEM import STEM
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples', 'genetic', 'aperiodic')
+STRUCTURES = [('Au55', 'Au55-STEM-move_surface_atoms_STEM-parallel/Au55-decahedron.xyz', 20.0, 1),
+              ('Pt561', 'Pt561-LAMMPS-STEM/Pt561-cuboctahedron.xyz', 40.0, 1.7)]
+
+
+def make_module(dimension, zed, imaging):
+    sys.modules['gparameters'].update({'logging': {'path': tempfile.mkdtemp()}, 'mpi': {'rank': 0}})
+    return STEM({'kwargs': {'HWHM': 0.4, 'dimensions': [dimension, dimension],
+                            'resolution': 5.0, 'zed': zed, 'imaging': imaging}})
+
+
+def make_individual(filename, dimension):
+    individual = Individual(load_modules=False)
+    individual.fitnesses = None
+    individual.extend(read(os.path.join(EXAMPLES, filename)))
+    individual.set_cell([dimension, dimension, dimension])
+    individual.center()
+    return individual
+
+
+def timeit(func, repeats):
+    t0 = time.time()
+    for _ in range(repeats):
+        result = func()
+    return (time.time() - t0) / repeats * 1e3, result
+
+
+def main(repeats=20):
+    for name, filename, dimension, zed in STRUCTURES:
+        individual = make_individual(filename, dimension)
+        images = {}
+        for imaging in ['fft', 'splat', 'auto']:
+            module = make_module(dimension, zed, imaging)
+            module.get_image(individual.copy())  # set up the PSF
+            ms, images[imaging] = timeit(lambda: module.get_image(individual.copy()), repeats)
+            print('{:>6} {:>5}: {:7.2f} ms per image'.format(name, imaging, ms))
+        error = np.absolute(images['splat'] - images['fft']).max() / images['fft'].max()
+        print('{:>6}: max |splat - fft| / max(fft) = {:.1e}, auto uses {}'.format(
+            name, error, 'splat' if module.use_splat(len(individual)) else 'fft'))
+
+        module.get_image(individual)
+
+        def move_one_atom():
+            mutated = individual.copy()
+            positions = mutated.get_positions()
+            positions[np.random.randint(len(mutated))] += np.random.uniform(-1.0, 1.0, 3)
+            mutated.set_positions(positions)
+            return module.get_image(mutated)
+
+        ms, _ = timeit(move_one_atom, repeats)
+        print('{:>6}: {:7.2f} ms per image after moving one atom'.format(name, ms))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
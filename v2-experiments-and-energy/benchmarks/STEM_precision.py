@@ -0,0 +1,91 @@
+"""Compare the single and double precision modes of the STEM fitness on the
+Au55 and Pt561 examples: time per fitness evaluation, the memory held by
+the target, PSF spectrum and the image state kept on each individual, and
+the largest fitness difference. Also times `get_offset` in both modes.
+
+numpy.fft always transforms in double precision; single precision only
+speeds up the FFTs themselves if scipy >= 1.4 (scipy.fft) is installed.
+
+Usage: python benchmarks/STEM_precision.py [repeats]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+from ase.io import read
+
+import structopt
+from structopt.common.individual import Individual
+from structopt.common.individual.fitnesses.STEM import STEM
+from structopt.common.crossmodule.similarity import get_offset
+from structopt.tools.fft import backend
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples', 'genetic', 'aperiodic')
+STRUCTURES = [('Au55', 'Au55-STEM-move_surface_atoms_STEM-parallel/Au55-decahedron.xyz', 20.0, 1),
+              ('Pt561', 'Pt561-LAMMPS-STEM/Pt561-cuboctahedron.xyz', 40.0, 1.7)]
+
+
+def make_module(dimension, zed, precision):
+    sys.modules['gparameters'].update({'logging': {'path': tempfile.mkdtemp()}, 'mpi': {'rank': 0}})
+    return STEM({'kwargs': {'HWHM': 0.4, 'dimensions': [dimension, dimension], 'resolution': 5.0,
+                            'zed': zed, 'imaging': 'fft', 'precision': precision,
+                            'normalize': {'SSE': True, 'nprotons': True}}})
+
+
+def make_individual(filename, dimension):
+    individual = Individual(load_modules=False)
+    individual.fitnesses = None
+    individual.extend(read(os.path.join(EXAMPLES, filename)))
+    individual.set_cell([dimension, dimension, dimension])
+    individual.center()
+    return individual
+
+
+def timeit(func, repeats):
+    t0 = time.time()
+    for _ in range(repeats):
+        result = func()
+    return (time.time() - t0) / repeats * 1e3, result
+
+
+def nbytes(module, individual):
+    state = individual._STEM_state
+    return (module.target.nbytes + module.get_target_spectrum().nbytes + module.get_psf_spectrum().nbytes
+            + state['V'].nbytes + state['image'].nbytes)
+
+
+def main(repeats=20):
+    print('FFT backend: {}'.format(backend().__name__))
+    for name, filename, dimension, zed in STRUCTURES:
+        individual = make_individual(filename, dimension)
+        candidates = []
+        for i in range(repeats):
+            candidate = individual.copy()
+            candidate.rattle(0.02 * i, seed=i)
+            candidates.append(candidate)
+
+        fitnesses = {}
+        for precision in ['double', 'single']:
+            module = make_module(dimension, zed, precision)
+            module.target = module.get_image(individual)
+            module.calculate_fitness(candidates[0])
+            ms, _ = timeit(lambda: module.calculate_fitness(candidates[0].copy()), repeats)
+            fitnesses[precision] = np.array([module.calculate_fitness(candidate) for candidate in candidates])
+            print('{:>6} {:>6}: {:7.2f} ms per fitness, {:6.0f} kB of images and spectra'.format(
+                name, precision, ms, nbytes(module, candidates[0]) / 1024))
+
+            shifted = individual.copy()
+            shifted.translate([1.1, -0.6, 0.3])
+            ms, offset = timeit(lambda: get_offset(individual, shifted, r=2.0, precision=precision), 3)
+            print('{:>6} {:>6}: {:7.2f} ms per get_offset {}'.format(name, precision, ms, offset))
+
+        error = np.absolute(fitnesses['single'] - fitnesses['double']).max() / fitnesses['double'].max()
+        same = (np.argsort(fitnesses['single']) == np.argsort(fitnesses['double'])).all()
+        print('{:>6}: max |single - double| / max(double) = {:.1e}, same ranking: {}'.format(name, error, same))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
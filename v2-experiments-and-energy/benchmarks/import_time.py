@@ -0,0 +1,45 @@
+"""Measure the wall time of `import structopt` and of loading the operator
+packages, each in a fresh interpreter, and list the heavy dependencies that
+were pulled in along the way.
+
+Usage: python benchmarks/import_time.py [repeats]
+"""
+
+import sys
+import subprocess
+
+SCRIPT = """
+import sys, time
+t0 = time.time()
+import structopt
+t1 = time.time()
+from importlib import import_module
+for kind in ['aperiodic', 'periodic']:
+    for package in ['population.crossovers', 'population.selections', 'population.predators',
+                    'population.fingerprinters', 'population.fitnesses', 'population.relaxations',
+                    'individual.mutations', 'individual.fitnesses', 'individual.relaxations']:
+        import_module('structopt.{}.{}'.format(kind, package))
+t2 = time.time()
+heavy = sorted(set('.'.join(name.split('.')[:2]) for name in sys.modules
+                   if name.split('.')[0] in ('scipy', 'mpi4py', 'matplotlib')
+                   or name.startswith(('ase.visualize', 'ase.io', 'ase.cluster', 'distutils.spawn'))))
+print(t1 - t0, t2 - t1, ' '.join(heavy))
+"""
+
+
+def measure():
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT], universal_newlines=True)
+    structopt_time, operators_time, *heavy = output.split()
+    return float(structopt_time), float(operators_time), heavy
+
+
+def main(repeats=5):
+    results = [measure() for _ in range(repeats)]
+    print('import structopt:   best {:.3f} s'.format(min(r[0] for r in results)))
+    print('operator packages:  best {:.3f} s'.format(min(r[1] for r in results)))
+    heavy = results[-1][2]
+    print('heavy modules loaded: {}'.format(', '.join(heavy) if heavy else 'none'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
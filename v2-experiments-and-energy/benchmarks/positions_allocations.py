@@ -0,0 +1,87 @@
+"""Compare the memory allocated per PSO generation when reading positions
+through `get_positions()` (a copy per access) and through the read-only
+`Individual.positions` view.
+
+Usage: python benchmarks/positions_allocations.py [shells] [nparticles]
+"""
+
+import sys
+import tracemalloc
+
+import numpy as np
+from ase.cluster import Icosahedron
+
+import structopt
+from structopt.common.individual import Individual
+
+
+def make_individual(shells):
+    individual = Individual(load_modules=False)
+    individual.extend(Icosahedron('Au', shells))
+    individual.set_cell([40.0, 40.0, 40.0])
+    individual.set_velocities(np.random.random((len(individual), 3)) - 0.5)
+    return individual
+
+
+def copying_update(individual, best_particle, best_swarm, omega=0.8, phi_p=0.5, phi_g=0.5):
+    """The update pattern used before positions became a view."""
+    natoms = len(individual.get_positions())
+    rp = np.random.random((natoms, 3))
+    rg = np.random.random((natoms, 3))
+    velocities = (omega * individual.get_velocities() +
+            phi_p * rp * (best_particle.get_positions() - individual.get_positions()) +
+            phi_g * rg * (best_swarm.get_positions() - individual.get_positions()))
+    individual.set_velocities(velocities)
+    individual.set_positions(individual.get_positions() + velocities)
+
+
+def view_update(individual, best_particle, best_swarm, omega=0.8, phi_p=0.5, phi_g=0.5):
+    """The update pattern in pso_moves/update_particle.py."""
+    natoms = len(individual)
+    rp = np.random.random((natoms, 3))
+    rg = np.random.random((natoms, 3))
+    positions = individual.positions
+    velocities = (omega * individual.velocities +
+            phi_p * rp * (best_particle.positions - positions) +
+            phi_g * rg * (best_swarm.positions - positions))
+    individual.set_velocities(velocities)
+    individual.set_positions(positions + velocities)
+
+
+def measure(update, swarm, best_particles, best_swarm):
+    """Return the peak memory traced while updating every particle once."""
+    tracemalloc.start()
+    for individual, best_particle in zip(swarm, best_particles):
+        update(individual, best_particle, best_swarm)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(shells=5, nparticles=20):
+    np.random.seed(0)
+    swarm = [make_individual(shells) for _ in range(nparticles)]
+    best_particles = [make_individual(shells) for _ in range(nparticles)]
+    best_swarm = make_individual(shells)
+    natoms = len(best_swarm)
+
+    for name, update in [('get_positions()', copying_update), ('positions view', view_update)]:
+        copies = [0]
+        get_positions = Individual.get_positions
+
+        def counting_get_positions(self, *args, **kwargs):
+            copies[0] += 1
+            return get_positions(self, *args, **kwargs)
+
+        Individual.get_positions = counting_get_positions
+        try:
+            peak = measure(update, swarm, best_particles, best_swarm)
+        finally:
+            Individual.get_positions = get_positions
+        print('{:>16}: {:4d} position copies, peak {:.1f} KiB per generation '
+              '({} particles of {} atoms)'.format(name, copies[0], peak / 1024.,
+                                                  nparticles, natoms))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
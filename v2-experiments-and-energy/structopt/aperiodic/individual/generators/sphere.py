@@ -2,7 +2,6 @@ import json
 import random
 import numpy as np
 from ase import Atom, Atoms
-from ase.visualize import view
 from ase.data import atomic_numbers, reference_states
 
 from structopt.tools import random_three_vector
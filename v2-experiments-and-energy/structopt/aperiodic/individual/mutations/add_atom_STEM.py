@@ -1,12 +1,11 @@
 import random
 
 import numpy as np
-from scipy.ndimage import filters
 from ase import Atom, Atoms
 
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
-from structopt.common.individual.fitnesses import STEM
+from structopt.common.crossmodule import get_columns
 
 def add_atom_STEM(individual, STEM_parameters, add_prob=None, permute=0.5, 
                   filter_size=1, column_cutoff=0.2, surf_cutoff=0.5, min_cutoff=0.5):
@@ -31,13 +30,13 @@ def add_atom_STEM(individual, STEM_parameters, add_prob=None, permute=0.5,
         The search radius for selecting a surface site near a low intensity point
         Defaults to the average bond distance
     """
+    from structopt.common.individual.fitnesses.STEM import STEM
+    from scipy.ndimage import filters
 
     module = STEM({'kwargs': STEM_parameters})
-    module.generate_target()
-    target = module.target
-
-    image, x_shift, y_shift = module.cross_correlate(module.get_image(individual))
-    contrast = image - target
+    products = module.get_products(individual)
+    x_shift, y_shift = products['shift']
+    contrast = products['contrast']
     min_min = np.min(contrast)
 
     # Determine filter size for locating local minimum
@@ -67,7 +66,7 @@ def add_atom_STEM(individual, STEM_parameters, add_prob=None, permute=0.5,
         return False
     min_coords = np.argwhere(minima)
     min_xys = (min_coords[:,::-1] - [x_shift, y_shift]) / resolution
-    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords])
+    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords], dtype=float)
     min_intensities = np.absolute(min_intensities)
     min_intensities /= sum(min_intensities)
 
@@ -91,34 +90,17 @@ def add_atom_STEM(individual, STEM_parameters, add_prob=None, permute=0.5,
 
     # Get indices of atoms considered to be moved and sites to move to
     # Organize atoms into columns
-    pos = individual.get_positions()
-    xys = np.expand_dims(pos[:, :2], 0)
-    dists = np.linalg.norm(xys - np.transpose(xys, (1, 0, 2)), axis=2)
-
-    NNs = np.sort(np.argwhere(dists < column_cutoff))
-    column_indices = []
-    atoms_to_be_sorted = list(range(len(individual)))
-    while len(atoms_to_be_sorted) > 0:
-        i = atoms_to_be_sorted[0]
-        same_column_indices = np.unique(NNs[NNs[:,0] == i])
-        column_indices.append(same_column_indices)
-        for j in reversed(sorted(same_column_indices)):
-            i_del = atoms_to_be_sorted.index(j)
-            atoms_to_be_sorted.pop(i_del)
-            NNs = NNs[NNs[:,0] != j]
-            NNs = NNs[NNs[:,1] != j]
+    pos = individual.positions
+    columns = get_columns(individual, column_cutoff)
 
     # Make a list of the top and bottom atom of each column as well
     # the average bond length of atoms in the column
-    top_indices, bot_indices, avg_bond_lengths = [], [], []
+    top_indices, bot_indices = list(columns.top), list(columns.bottom)
+    avg_bond_lengths = []
     vac_new_pos = []
-    for indices in column_indices:
-        zs = pos[indices][:,2]
-        top_indices.append(indices[np.argmax(zs)])
-        bot_indices.append(indices[np.argmin(zs)])
-
+    for indices in columns.indices:
         # Get the average bond length of each column for adding
-        zs = np.sort(zs)
+        zs = np.sort(pos[indices][:,2])
         if len(zs) == 1:
             avg_bond_lengths.append(np.nan)
             continue
@@ -189,7 +171,7 @@ def add_atom_STEM(individual, STEM_parameters, add_prob=None, permute=0.5,
         individual.append(Atom(element, new_position))
         return
 
-    xys = individual.get_positions()[:,:2]
+    xys = individual.positions[:,:2]
     syms = individual.get_chemical_symbols()
     dists_xys = np.linalg.norm(xys - new_xy, axis=1)
     indices_to_switch = [i for i, d in enumerate(dists_xys) if d < column_cutoff and syms[i] != element]
@@ -1,24 +1,21 @@
 import random
 
 import numpy as np
-from scipy.ndimage import filters, sobel
 
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
-from structopt.common.individual.fitnesses import STEM
 
-from ase.io import write
 
 def enrich_surface_column(individual, STEM_parameters, filter_size=0.5,
                           column_cutoff=0.5, species=None, surf_CN=11):
     """This mutation randomly does an atom swap within a column of atoms"""
+    from structopt.common.individual.fitnesses.STEM import STEM
+    from scipy.ndimage import filters
 
     CNs = CoordinationNumbers(individual)
     
     module = STEM({'kwargs': STEM_parameters})
-    module.generate_target()
-
-    image = module.get_image(individual)
+    image = module.get_products(individual)['image']
 
     # Find the xy coordinates of the columns in the image
     avg_bond_length = get_avg_radii(individual) * 2
@@ -53,7 +50,7 @@ def enrich_surface_column(individual, STEM_parameters, filter_size=0.5,
 
     # Get the symbols in each column with > 1 type of atom and a non-species site
     # at the surface available to be switched
-    xys = individual.get_positions()[:, :2]
+    xys = individual.positions[:, :2]
     dists_to_columns = np.expand_dims(xys, 0) - np.transpose(np.expand_dims(column_xys, 0), (1, 0, 2))
     dists_to_columns = np.linalg.norm(dists_to_columns, axis=2)
     all_column_indices = [np.where(dists < column_cutoff)[0] for dists in dists_to_columns]
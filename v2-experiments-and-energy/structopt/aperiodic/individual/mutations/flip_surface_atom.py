@@ -4,7 +4,6 @@ import numpy as np
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
 
-from ase.io import write
 
 def flip_surface_atom(individual, surf_CN=11, cutoff=0.5):
     """Randomly "flips" an atom from one side of the particle to the other side
@@ -36,7 +35,7 @@ def flip_surface_atom(individual, surf_CN=11, cutoff=0.5):
     CNs = CoordinationNumbers(individual)
     
     # Get all surface atoms
-    positions = individual.get_positions()
+    positions = individual.positions
     surf_indices_CNs = [[i, CN] for i, CN in enumerate(CNs)
                         if CN <= surf_CN and CN > 2]
     surf_indices, surf_CNs = list(zip(*surf_indices_CNs))
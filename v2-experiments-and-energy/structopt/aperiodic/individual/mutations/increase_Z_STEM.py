@@ -1,11 +1,9 @@
 import random
 
 import numpy as np
-from scipy.ndimage import filters
 from ase.data import atomic_numbers, chemical_symbols
 
 from structopt.common.crossmodule import get_avg_radii
-from structopt.common.individual.fitnesses import STEM
 
 def increase_Z_STEM(individual, STEM_parameters, filter_size=0.5,
                     move_cutoff=0.5, min_cutoff=0.5):
@@ -23,13 +21,13 @@ def increase_Z_STEM(individual, STEM_parameters, filter_size=0.5,
         The search radius for selecting an atom to move near a high intensity point.
         Defaults to the average bond distance
     """
+    from structopt.common.individual.fitnesses.STEM import STEM
+    from scipy.ndimage import filters
 
     module = STEM({'kwargs': STEM_parameters})
-    module.generate_target()
-    target = module.target
-
-    image, x_shift, y_shift = module.cross_correlate(module.get_image(individual))
-    contrast = image - target
+    products = module.get_products(individual)
+    x_shift, y_shift = products['shift']
+    contrast = products['contrast']
     max_max = np.max(contrast)
     min_min = np.min(contrast)
 
@@ -58,7 +56,7 @@ def increase_Z_STEM(individual, STEM_parameters, filter_size=0.5,
 
     min_coords = np.argwhere(minima)
     min_xys = (min_coords[:,::-1] - [x_shift, y_shift]) / resolution
-    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords])
+    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords], dtype=float)
     min_intensities = np.absolute(min_intensities)
     min_intensities /= sum(min_intensities)
 
@@ -82,7 +80,7 @@ def increase_Z_STEM(individual, STEM_parameters, filter_size=0.5,
     # import sys; sys.exit()
 
     # Get atoms associated with each max and min column
-    xys = individual.get_positions()[:, :2]
+    xys = individual.positions[:, :2]
 
     min_dists = np.expand_dims(xys, 0) - np.transpose(np.expand_dims(min_xys, 0), (1, 0, 2))
     min_dists = np.linalg.norm(min_dists, axis=2)
@@ -28,7 +28,7 @@ def move_atoms(individual, max_natoms=0.20):
     
     # Get the surface atoms. These provide bounds for the moves
     # First get unit vectors and mags of all surface atoms
-    positions = individual.get_positions()
+    positions = individual.positions
     com = np.sum(positions.T, axis=1) / len(individual)
     surf_indices = [i for i, CN in enumerate(CNs) if CN < 11]
     surf_positions = np.array([positions[i] for i in surf_indices])
@@ -4,6 +4,7 @@ import numpy as np
 from ase.data import chemical_symbols
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
+from structopt.common.crossmodule import get_columns
 
 def move_column_defects(individual, cutoff=0.2, CN_factor=1.1):
     """Calculates the error per column of atoms in the z-direction"""
@@ -12,32 +13,15 @@ def move_column_defects(individual, cutoff=0.2, CN_factor=1.1):
     cutoff *= avg_radii * 2
 
     # Organize atoms into columns
-    pos = individual.get_positions()
-    xys = np.expand_dims(pos[:, :2], 0)
-    dists = np.linalg.norm(xys - np.transpose(xys, (1, 0, 2)), axis=2)
-
-    NNs = np.sort(np.argwhere(dists < cutoff))
-    column_indices = []
-    atoms_to_be_sorted = list(range(len(individual)))
-    while len(atoms_to_be_sorted) > 0:
-        i = atoms_to_be_sorted[0]
-        same_column_indices = np.unique(NNs[NNs[:,0] == i])
-        column_indices.append(same_column_indices)
-        for j in reversed(sorted(same_column_indices)):
-            i_del = atoms_to_be_sorted.index(j)
-            atoms_to_be_sorted.pop(i_del)
-            NNs = NNs[NNs[:,0] != j]
-            NNs = NNs[NNs[:,1] != j]
+    pos = individual.positions
+    columns = get_columns(individual, cutoff)
 
     # Make a list of the top and bottom atom of each column as well
     # the average bond length of atoms in the column
-    top_indices, bot_indices, avg_bond_lengths = [], [], []
-    for indices in column_indices:
-        zs = pos[indices][:,2]
-        top_indices.append(indices[np.argmax(zs)])
-        bot_indices.append(indices[np.argmin(zs)])
-
-        zs = np.sort(zs)
+    top_indices, bot_indices = list(columns.top), list(columns.bottom)
+    avg_bond_lengths = []
+    for indices in columns.indices:
+        zs = np.sort(pos[indices][:,2])
         if len(zs) == 1:
             avg_bond_lengths.append(np.nan)
         else:
@@ -83,6 +67,6 @@ def move_column_defects(individual, cutoff=0.2, CN_factor=1.1):
     move_index = move_indices[move_indices_i]
     move_new_pos = move_new_pos[move_indices_i]
     
-    individual.positions[move_index] = move_new_pos
+    individual[move_index].position = move_new_pos
 
     return
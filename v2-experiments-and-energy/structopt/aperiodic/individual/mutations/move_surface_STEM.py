@@ -1,11 +1,9 @@
 import random
 
 import numpy as np
-from scipy.ndimage import filters
 
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
-from structopt.common.individual.fitnesses import STEM
 
 def move_surface_STEM(individual, STEM_parameters, move_CN=11, surf_CN=11,
                       filter_size=1, move_cutoff=0.5, surf_cutoff=0.5,
@@ -33,13 +31,13 @@ def move_surface_STEM(individual, STEM_parameters, move_CN=11, surf_CN=11,
         The search radius for selecting a surface site near a low intensity point
         Defaults to the average bond distance
     """
+    from structopt.common.individual.fitnesses.STEM import STEM
+    from scipy.ndimage import filters
 
     module = STEM({'kwargs': STEM_parameters})
-    module.generate_target()
-    target = module.target
-
-    image, x_shift, y_shift = module.cross_correlate(module.get_image(individual))
-    contrast = image - target
+    products = module.get_products(individual)
+    x_shift, y_shift = products['shift']
+    contrast = products['contrast']
     max_max = np.max(contrast)
     min_min = np.min(contrast)
 
@@ -68,7 +66,7 @@ def move_surface_STEM(individual, STEM_parameters, move_CN=11, surf_CN=11,
         return False
     max_coords = np.argwhere(maxima)
     max_xys = (max_coords[:,::-1] - np.array([[x_shift, y_shift]])) / resolution
-    max_intensities = np.asarray([data_max[tuple(coord)] for coord in max_coords])
+    max_intensities = np.asarray([data_max[tuple(coord)] for coord in max_coords], dtype=float)
     max_intensities /= sum(max_intensities)
 
     ###################################
@@ -90,7 +88,7 @@ def move_surface_STEM(individual, STEM_parameters, move_CN=11, surf_CN=11,
         return False
     min_coords = np.argwhere(minima)
     min_xys = (min_coords[:,::-1] - [x_shift, y_shift]) / resolution
-    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords])
+    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords], dtype=float)
     min_intensities = np.absolute(min_intensities)
     min_intensities /= sum(min_intensities)
 
@@ -4,7 +4,6 @@ import numpy as np
 from structopt.common.crossmodule import NeighborList
 from structopt.common.crossmodule import get_avg_radii
 
-from ase.io import write
 
 def move_surface_atoms(individual, max_natoms=0.2, move_CN=11, surf_CN=11):
     """Randomly moves atoms at the surface to other surface sites
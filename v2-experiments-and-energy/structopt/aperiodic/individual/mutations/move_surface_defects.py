@@ -4,7 +4,6 @@ import numpy as np
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
 
-from ase.io import write
 
 def move_surface_defects(individual, surf_CN=11):
     """Moves atoms around on the surface based on coordination number
@@ -1,11 +1,9 @@
 import random
 
 import numpy as np
-from scipy.ndimage import filters
 from ase.data import atomic_numbers
 
 from structopt.common.crossmodule import get_avg_radii
-from structopt.common.individual.fitnesses import STEM
 
 def permutation_STEM(individual, STEM_parameters, filter_size=0.5,
                      move_cutoff=0.5, max_cutoff=0.5, min_cutoff=0.5):
@@ -24,13 +22,13 @@ def permutation_STEM(individual, STEM_parameters, filter_size=0.5,
         The search radius for selecting an atom to move near a high intensity point.
         Defaults to the average bond distance
     """
+    from structopt.common.individual.fitnesses.STEM import STEM
+    from scipy.ndimage import filters
 
     module = STEM({'kwargs': STEM_parameters})
-    module.generate_target()
-    target = module.target
-
-    image, x_shift, y_shift = module.cross_correlate(module.get_image(individual))
-    contrast = image - target
+    products = module.get_products(individual)
+    x_shift, y_shift = products['shift']
+    contrast = products['contrast']
     max_max = np.max(contrast)
     min_min = np.min(contrast)
 
@@ -58,7 +56,7 @@ def permutation_STEM(individual, STEM_parameters, filter_size=0.5,
         return False
     max_coords = np.argwhere(maxima)
     max_xys = (max_coords[:,::-1] - np.array([[x_shift, y_shift]])) / resolution
-    max_intensities = np.asarray([data_max[tuple(coord)] for coord in max_coords])
+    max_intensities = np.asarray([data_max[tuple(coord)] for coord in max_coords], dtype=float)
     max_intensities /= sum(max_intensities)
 
     ###################################
@@ -88,7 +86,7 @@ def permutation_STEM(individual, STEM_parameters, filter_size=0.5,
 
     min_coords = np.argwhere(minima)
     min_xys = (min_coords[:,::-1] - [x_shift, y_shift]) / resolution
-    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords])
+    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords], dtype=float)
     min_intensities = np.absolute(min_intensities)
     min_intensities /= sum(min_intensities)
 
@@ -112,7 +110,7 @@ def permutation_STEM(individual, STEM_parameters, filter_size=0.5,
     # import sys; sys.exit()
 
     # Get atoms associated with each max and min column
-    xys = individual.get_positions()[:, :2]
+    xys = individual.positions[:, :2]
     max_dists = np.expand_dims(xys, 0) - np.transpose(np.expand_dims(max_xys, 0), (1, 0, 2))
     max_dists = np.linalg.norm(max_dists, axis=2)
     max_column_indices = [np.where(dists < move_cutoff)[0] for dists in max_dists]
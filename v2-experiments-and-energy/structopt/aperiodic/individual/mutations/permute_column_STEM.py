@@ -1,13 +1,10 @@
 import random
 
 import numpy as np
-from scipy.ndimage import filters, sobel
 
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
-from structopt.common.individual.fitnesses import STEM
 
-from ase.io import write
 
 def permute_column_STEM(individual, STEM_parameters, filter_size=1,
                         column_cutoff=0.5, max_cutoff=0.5):
@@ -15,13 +12,14 @@ def permute_column_STEM(individual, STEM_parameters, filter_size=1,
     the individual and target.
 
     """
+    from structopt.common.individual.fitnesses.STEM import STEM
+    from scipy.ndimage import filters
 
     module = STEM({'kwargs': STEM_parameters})
-    module.generate_target()
-    target = module.target
-
-    image, x_shift, y_shift = module.cross_correlate(module.get_image(individual))
-    contrast = image - target
+    products = module.get_products(individual)
+    x_shift, y_shift = products['shift']
+    contrast = products['contrast']
+    image = np.roll(products['image'], (y_shift, x_shift), axis=(0, 1))
     max_max = np.max(contrast)
     min_min = np.min(contrast)
 
@@ -42,7 +40,7 @@ def permute_column_STEM(individual, STEM_parameters, filter_size=1,
         return False
     max_coords = np.argwhere(maxima)
     max_xys = (max_coords[:,::-1] - np.array([[x_shift, y_shift]])) / resolution
-    max_intensities = np.asarray([data_max[tuple(coord)] for coord in max_coords])
+    max_intensities = np.asarray([data_max[tuple(coord)] for coord in max_coords], dtype=float)
     max_intensities /= sum(max_intensities)
 
     ###################################
@@ -64,7 +62,7 @@ def permute_column_STEM(individual, STEM_parameters, filter_size=1,
         return False
     min_coords = np.argwhere(minima)
     min_xys = (min_coords[:,::-1] - [x_shift, y_shift]) / resolution
-    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords])
+    min_intensities = np.asarray([data_min[tuple(coord)] for coord in min_coords], dtype=float)
     min_intensities = np.absolute(min_intensities)
     min_intensities /= sum(min_intensities)
 
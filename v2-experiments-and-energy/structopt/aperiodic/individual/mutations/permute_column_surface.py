@@ -1,23 +1,20 @@
 import random
 
 import numpy as np
-from scipy.ndimage import filters, sobel
 
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
-from structopt.common.individual.fitnesses import STEM
 
-from ase.io import write
 
 def permute_column_surface(individual, STEM_parameters, filter_size=0.5,
                            column_cutoff=0.5):
     """Permutes a column by shifting atoms up and down and filling defects.
     """
+    from structopt.common.individual.fitnesses.STEM import STEM
+    from scipy.ndimage import filters
 
     module = STEM({'kwargs': STEM_parameters})
-    module.generate_target()
-
-    image = module.get_image(individual)
+    image = module.get_products(individual)['image']
 
     # Find the xy coordinates of the columns in the image
     avg_bond_length = get_avg_radii(individual) * 2
@@ -49,14 +46,14 @@ def permute_column_surface(individual, STEM_parameters, filter_size=0.5,
     i = random.randint(0, len(column_xys) - 1)
     column_xy = column_xys[i]
 
-    xys = individual.get_positions()[:,:2]
+    xys = individual.positions[:,:2]
     dists = np.linalg.norm(column_xy - xys, axis=1)
     indices = np.arange(len(individual))[dists < column_cutoff]
 
     if len(indices) < 2:
         return False
 
-    z_positions = individual.get_positions()[indices, 2]
+    z_positions = individual.positions[indices, 2]
     top_atom = indices[np.argmax(z_positions)]
     bot_atom = indices[np.argmin(z_positions)]
 
@@ -1,11 +1,9 @@
 import random
 
 import numpy as np
-from scipy.ndimage import filters
 
 from structopt.common.crossmodule import CoordinationNumbers
 from structopt.common.crossmodule import get_avg_radii
-from structopt.common.individual.fitnesses import STEM
 
 def remove_atom_STEM(individual, STEM_parameters, permute=True, remove_prob=None,
                      filter_size=1, remove_CN=11, remove_cutoff=0.5, max_cutoff=0.5,
@@ -34,13 +32,13 @@ def remove_atom_STEM(individual, STEM_parameters, permute=True, remove_prob=None
         The search radius for selecting a surface site near a low intensity point
         Defaults to the average bond distance
     """
+    from structopt.common.individual.fitnesses.STEM import STEM
+    from scipy.ndimage import filters
 
     module = STEM({'kwargs': STEM_parameters})
-    module.generate_target()
-    target = module.target
-
-    image, x_shift, y_shift = module.cross_correlate(module.get_image(individual))
-    contrast = image - target
+    products = module.get_products(individual)
+    x_shift, y_shift = products['shift']
+    contrast = products['contrast']
     max_max = np.max(contrast)
 
     # Determine filter size for locating local minimum
@@ -68,7 +66,7 @@ def remove_atom_STEM(individual, STEM_parameters, permute=True, remove_prob=None
         return False
     max_coords = np.argwhere(maxima)
     max_xys = (max_coords[:,::-1] - np.array([[x_shift, y_shift]])) / resolution
-    max_intensities = np.asarray([data_max[tuple(coord)] for coord in max_coords])
+    max_intensities = np.asarray([data_max[tuple(coord)] for coord in max_coords], dtype=float)
     max_intensities /= sum(max_intensities)
 
     ###################################
@@ -86,7 +84,7 @@ def remove_atom_STEM(individual, STEM_parameters, permute=True, remove_prob=None
 
     # Get indices of atoms considered to be moved and sites to move too
     CNs = CoordinationNumbers(individual)
-    positions = individual.get_positions()
+    positions = individual.positions
 
     remove_indices = [i for i, CN in enumerate(CNs) if CN <= remove_CN]
     remove_xys = positions[list(remove_indices)][:, :2]
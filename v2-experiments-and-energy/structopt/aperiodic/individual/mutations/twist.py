@@ -2,7 +2,6 @@ import random
 import numpy as np
 
 from ase import Atom, Atoms
-from ase.visualize import view
 
 from structopt.common.crossmodule import NeighborList
 from structopt.tools import random_three_vector
@@ -27,7 +26,7 @@ def twist(individual, max_radius=0.90):
     
     # Get the surface atoms. These provide bounds for the moves
     # First get unit vectors and mags of all surface atoms
-    positions = individual.get_positions()
+    positions = individual.positions
     com = np.sum(positions.T, axis=1) / len(individual)
     surf_indices = [i for i, CN in enumerate(CNs) if CN < 11]
     surf_positions = np.array([positions[i] for i in surf_indices])
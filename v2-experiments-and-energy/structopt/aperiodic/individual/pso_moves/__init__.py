@@ -22,6 +22,7 @@ class Pso_Moves(object):
         """ """
         logger = logging.getLogger("default")        
         individual._relaxed = False
+        individual.touched = None
         individual._fitted = False
         return self.update_particle(individual, best_swarm, best_particle, self.kwargs.omega, self.kwargs.phi_p, self.kwargs.phi_g)
 
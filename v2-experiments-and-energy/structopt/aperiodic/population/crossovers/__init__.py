@@ -1,9 +1,10 @@
 import functools
 import structopt.common.population.crossovers
 
-from .rotate import rotate
+from .rotate import rotate, rotate_batch
 
 rotate.tag = 'Ro'
+rotate.batch = rotate_batch
 
 class Crossovers(structopt.common.population.crossovers.Crossovers):
 
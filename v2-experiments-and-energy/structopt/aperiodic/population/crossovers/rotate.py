@@ -1,14 +1,10 @@
-import random
 import numpy as np
-from ase import Atoms
 
-from structopt.common.individual import Individual
 from structopt.tools import root, single_core, parallel
-from structopt.tools import random_three_vector
 from structopt.common.crossmodule import repair_cluster
 from structopt.common.crossmodule.similarity import get_offset
-
-import time
+from structopt.common.crossmodule.cut_and_splice import (stack_positions, rotate_stacked,
+    random_rotations, planar_cut, splice, build_child)
 
 @single_core
 def rotate(individual1, individual2, center_at_atom=True, repair_composition=True):
@@ -39,57 +35,73 @@ def rotate(individual1, individual2, center_at_atom=True, repair_composition=Tru
     Individual: The second child
     """
 
-    # Translate individuals so COP is at (0, 0, 0)
-    ind1c = individual1.copy()
-    ind2c = individual2.copy()
-    cop1 = ind1c.get_positions().mean(axis=0)
-    cop2 = ind2c.get_positions().mean(axis=0)
+    return rotate_batch([(individual1, individual2)], center_at_atom, repair_composition)[0]
+
 
-    if center_at_atom:
-        offset = get_offset(ind1c, ind2c, r=1.0, HWHM=0.4)
-        ind1c.translate(offset)
-        cop = ind1c.get_positions().mean(axis=0)
+@single_core
+def rotate_batch(pairs, center_at_atom=True, repair_composition=True):
+    """Performs `rotate` on many pairs of parents at once. The parents are
+    stacked into a single position array so that rotating every pair is
+    one vectorized step.
+
+    Parameters
+    ----------
+    pairs : list
+        (individual1, individual2) tuples of parents
+    center_at_atom : bool
+        See `rotate`.
+    repair_composition : bool
+        See `rotate`.
 
-        ind1c.translate(-cop)
-        ind2c.translate(-cop)
-    else:
-        ind1c.translate(ind1c.get_positions().mean(axis=0))
-        ind2c.translate(ind2c.get_positions().mean(axis=0))
+    Returns
+    -------
+    list: (child1, child2) tuples, one per pair
+    """
+    # Translate individuals so COP is at (0, 0, 0)
+    parents = [individual for pair in pairs for individual in pair]
+    centers = np.empty((len(parents), 3))
+    for i, (individual1, individual2) in enumerate(pairs):
+        cop1 = individual1.positions.mean(axis=0)
+        cop2 = individual2.positions.mean(axis=0)
+        if center_at_atom:
+            # Shift the first parent onto the second one and cut both
+            # through the same point
+            offset = get_offset(individual1, individual2, r=1.0, HWHM=0.4)
+            centers[2*i] = cop1
+            centers[2*i+1] = cop1 + offset
+        else:
+            centers[2*i] = cop1
+            centers[2*i+1] = cop2
+    positions, owners = stack_positions(parents, centers)
 
-    # Pick a random rotation angle and vector
-    rot_vec = random_three_vector()
-    rot_angle = random.uniform(0, 180) * np.pi / 180.0
+    # Pick a random rotation angle and vector, the same for both parents of a pair
+    rotations = np.repeat(random_rotations(len(pairs)), 2, axis=0)
+    rotated = rotate_stacked(positions, owners, rotations)
+    rotated = np.split(rotated, np.cumsum([len(individual) for individual in parents])[:-1])
 
-    # Rotate both individuals
-    ind1c.rotate(rot_vec, a=rot_angle, center=(0, 0, 0))
-    ind2c.rotate(rot_vec, a=rot_angle, center=(0, 0, 0))
+    children = []
+    for i, (individual1, individual2) in enumerate(pairs):
+        # Create the children
+        positions1, positions2 = rotated[2*i], rotated[2*i+1]
+        top1, top2 = planar_cut(positions1[:, 2], positions2[:, 2])
+        arrays1 = dict(individual1.arrays, positions=positions1)
+        arrays2 = dict(individual2.arrays, positions=positions2)
+        arrays1, arrays2 = splice(arrays1, top1, arrays2, top2)
+        child1 = build_child(individual1, arrays1)
+        child2 = build_child(individual2, arrays2)
 
-    # Create the children
-    child1 = Atoms(cell=ind1c.get_cell())
-    child2 = Atoms(cell=ind2c.get_cell())
-    child1.extend(ind1c[ind1c.positions[:,2] >= 0])
-    child1.extend(ind2c[ind2c.positions[:,2] < 0])
-    child2.extend(ind2c[ind2c.positions[:,2] >= 0])
-    child2.extend(ind1c[ind1c.positions[:,2] < 0])
+        # Repair the children
+        if repair_composition:
+            syms = individual1.get_chemical_symbols()
+            atomlist = [[sym, syms.count(sym)] for sym in set(syms)]
+            repair_cluster(child1, atomlist)
+            repair_cluster(child2, atomlist)
 
-    # Repair the children
-    if repair_composition:
-        syms = ind1c.get_chemical_symbols()
-        atomlist = [[sym, syms.count(sym)] for sym in set(syms)]
-        repair_cluster(child1, atomlist)
-        repair_cluster(child2, atomlist)
+        # Reorient the children
+        for child in (child1, child2):
+            child.set_positions(np.dot(child.positions, rotations[2*i]))
+            child.center()
 
-    # Reorient the children
-    child1.rotate(rot_vec, a=-rot_angle, center=(0, 0, 0))
-    child1.center()
-    child2.rotate(rot_vec, a=-rot_angle, center=(0, 0, 0))
-    child2.center()
+        children.append((child1, child2))
 
-    # Convert the children to an Individual with the parent
-    # module parameters
-    full_child1 = ind1c.copy(include_atoms=False)
-    full_child1.extend(child1)
-    full_child2 = ind2c.copy(include_atoms=False)
-    full_child2.extend(child2)
-    
-    return full_child1, full_child2
+    return children
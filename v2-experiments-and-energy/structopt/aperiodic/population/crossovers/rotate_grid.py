@@ -1,19 +1,17 @@
-import random
 import numpy as np
-from ase import Atoms
 
-from structopt.common.individual import Individual
 from structopt.tools import root, single_core, parallel
-from structopt.tools import random_three_vector
 from structopt.common.crossmodule import repair_cluster
 from structopt.common.crossmodule.similarity import get_offset
-
-import time
+from structopt.common.crossmodule.cut_and_splice import random_rotations, planar_cut, splice, build_child
 
 @single_core
-def rotate_fixed(individual1, individual2, align_cutoff=0.1, repair_composition=True):
-    """Similar to rotate except the children aren't borne out of cut out
-    versions.
+def rotate_fixed(individual1, individual2, repair_composition=True):
+    """Similar to rotate except the parents are not cut about their own
+    centers: the first parent is aligned onto the second by
+    cross-correlating their blurred atom positions, and both are cut
+    through a random plane about the aligned center of the first. The
+    children are centered in the cell.
 
     Parameters
     ----------
@@ -21,10 +19,6 @@ def rotate_fixed(individual1, individual2, align_cutoff=0.1, repair_composition=
         The first parent
     individual2 : Individual 
         The second parent
-    center_at_atom : bool
-        This centers the cut at an atom. This is particularly useful 
-        when one desires a crystalline solution. If both parents
-        are crystalline, the children will likely not have grain boundaries.
     repair_composition : bool 
         If True, conserves composition. For crossovers that create children
         with more (less) atoms, atoms are taken from (added to) the surface
@@ -38,42 +32,33 @@ def rotate_fixed(individual1, individual2, align_cutoff=0.1, repair_composition=
     """
 
     # Translate individuals so atoms are most aligned
-    
-
-    # Pick a random rotation angle and vector
-    rot_vec = random_three_vector()
-    rot_angle = random.uniform(0, 180) * np.pi / 180.0
+    offset = np.asarray(get_offset(individual1, individual2, r=1.0, HWHM=0.4))
+    cop = individual1.positions.mean(axis=0) + offset
+    positions1 = individual1.positions + offset - cop
+    positions2 = individual2.positions - cop
 
-    # Rotate both individuals
-    ind1c.rotate(rot_vec, a=rot_angle, center=(0, 0, 0))
-    ind2c.rotate(rot_vec, a=rot_angle, center=(0, 0, 0))
+    # Pick a random rotation angle and vector and rotate both individuals
+    rotation = random_rotations(1)[0]
+    positions1 = np.dot(positions1, rotation.T)
+    positions2 = np.dot(positions2, rotation.T)
 
     # Create the children
-    child1 = Atoms(cell=ind1c.get_cell())
-    child2 = Atoms(cell=ind2c.get_cell())
-    child1.extend(ind1c[ind1c.positions[:,2] >= 0])
-    child1.extend(ind2c[ind2c.positions[:,2] < 0])
-    child2.extend(ind2c[ind2c.positions[:,2] >= 0])
-    child2.extend(ind1c[ind1c.positions[:,2] < 0])
+    top1, top2 = planar_cut(positions1[:, 2], positions2[:, 2])
+    arrays1, arrays2 = splice(dict(individual1.arrays, positions=positions1), top1,
+                              dict(individual2.arrays, positions=positions2), top2)
+    child1 = build_child(individual1, arrays1)
+    child2 = build_child(individual2, arrays2)
 
     # Repair the children
     if repair_composition:
-        syms = ind1c.get_chemical_symbols()
+        syms = individual1.get_chemical_symbols()
         atomlist = [[sym, syms.count(sym)] for sym in set(syms)]
         repair_cluster(child1, atomlist)
         repair_cluster(child2, atomlist)
 
-    # Reorient the children
-    child1.rotate(rot_vec, a=-rot_angle, center=(0, 0, 0))
-    child1.center()
-    child2.rotate(rot_vec, a=-rot_angle, center=(0, 0, 0))
-    child2.center()
+    # Reorient the children and center them in the cell
+    for child in (child1, child2):
+        child.set_positions(np.dot(child.positions, rotation) + cop)
+        child.center()
 
-    # Convert the children to an Individual with the parent
-    # module parameters
-    full_child1 = ind1c.copy(include_atoms=False)
-    full_child1.extend(child1)
-    full_child2 = ind2c.copy(include_atoms=False)
-    full_child2.extend(child2)
-    
-    return full_child1, full_child2
+    return child1, child2
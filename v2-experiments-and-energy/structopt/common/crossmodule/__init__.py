@@ -3,3 +3,4 @@ from .get_avg_radii import get_avg_radii
 from .get_particle_radius import get_particle_radius
 from .analysis import CoordinationNumbers, NeighborList, NeighborElements
 from .repair_cluster import repair_cluster
+from .columns import get_columns
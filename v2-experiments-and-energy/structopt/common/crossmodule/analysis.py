@@ -34,7 +34,7 @@ def CoordinationNumbers(atoms, cutoff=None, factor=1.1):
         atomlist = [[symbol, chemical_symbols.count(symbol)] for symbol in unique_symbols]
         cutoff = get_avg_radii(atomlist) * 2 * factor
 
-    pos = np.array([atoms.get_positions()])
+    pos = np.expand_dims(atoms.positions, 0)
     pos_T = np.transpose(pos, [1, 0, 2])
     vecs = pos - pos_T
     dists = np.linalg.norm(vecs, axis=2)
@@ -75,7 +75,7 @@ def NeighborList(atoms, cutoff=None, factor=1.1):
         atomlist = [[symbol, chemical_symbols.count(symbol)] for symbol in unique_symbols]
         cutoff = get_avg_radii(atomlist) * 2 * factor
 
-    pos = np.array([atoms.get_positions()])
+    pos = np.expand_dims(atoms.positions, 0)
     pos_T = np.transpose(pos, [1, 0, 2])
     vecs = pos - pos_T
     dists = np.linalg.norm(vecs, axis=2)
@@ -0,0 +1,131 @@
+"""An archive of the local minima (basins) found during a run.
+
+Structures are described by their composition and a descriptor that does
+not change under rotations, translations and permutations of the atoms:
+radial symmetry functions
+
+    G_k = 1/N sum_i sum_j exp(-eta (r_ij - r_k)^2) f_c(r_ij),
+
+one set per pair of elements, with f_c(r) = (cos(pi r / r_c) + 1) / 2, and
+the Steinhardt order parameters Q_l of all the bonds shorter than the
+cutoff. The neighbors come from a k-d tree, without periodic images.
+
+Every descriptor seen for a basin, e.g. those of the structures before and
+after they were relaxed into it, is kept. A descriptor is looked up by
+rounding it to a grid, in a dictionary, and otherwise among the stored
+descriptors of the same composition with an approximate nearest neighbor
+search of a k-d tree.
+"""
+
+import pickle
+
+import numpy as np
+
+
+def describe(structure, cutoff=6.0, n_radial=16, l_set=range(2, 13, 2)):
+    """Returns the composition of `structure` (Atoms), as a tuple of
+    (atomic number, count) pairs, and its descriptor."""
+    from structopt.common.crossmodule.bond_order import get_bonds, bond_order
+
+    positions = np.asarray(structure.positions, dtype=float)
+    elements, kinds, counts = np.unique(structure.numbers, return_inverse=True, return_counts=True)
+    composition = tuple((int(z), int(count)) for z, count in zip(elements, counts))
+    ne = len(elements)
+    if len(positions) == 0:
+        return composition, np.zeros(ne * (ne + 1) // 2 * n_radial + len(list(l_set)))
+
+    centers = np.linspace(0.0, cutoff, n_radial)
+    eta = 0.5 / (centers[1] - centers[0])**2 if n_radial > 1 else 1.0
+    pairs, vectors = get_bonds(positions, cutoff)
+    r = np.sqrt((vectors**2).sum(axis=1))
+    g = np.exp(-eta * (r[:, None] - centers)**2) * (0.5 * (np.cos(np.pi * r / cutoff) + 1))[:, None]
+
+    # Index the unordered pairs of elements
+    first, second = np.sort(kinds[pairs], axis=1).T
+    pair_types = first * ne - first * (first - 1) // 2 + second - first
+    radial = np.zeros((ne * (ne + 1) // 2, n_radial))
+    np.add.at(radial, pair_types, g)
+
+    Q_l = bond_order([positions], l_set, cutoff)[0]
+    return composition, np.concatenate((2 * radial.ravel() / len(positions), Q_l))
+
+
+class BasinArchive(object):
+    """The descriptors of the basins found so far and what is known about
+    each basin.
+
+    Parameters
+    ----------
+    resolution : float
+        The grid spacing of the descriptors in the exact lookup.
+    tolerance : float
+        Descriptors within this distance of a stored descriptor of the same
+        composition belong to its basin.
+    eps : float
+        The relative error allowed in the nearest neighbor search (see
+        `scipy.spatial.cKDTree.query`).
+    """
+
+    def __init__(self, resolution=1e-3, tolerance=1e-2, eps=0.1):
+        self.resolution = resolution
+        self.tolerance = tolerance
+        self.eps = eps
+        self.basins = []
+        self.keys = {}
+        self.descriptors = {}
+        self._trees = {}
+
+    def __len__(self):
+        return len(self.basins)
+
+    def key(self, composition, descriptor):
+        return composition, tuple(np.round(np.asarray(descriptor) / self.resolution).astype(int))
+
+    def find(self, composition, descriptor):
+        """Returns the index of the basin of a descriptor, or None."""
+        basin = self.keys.get(self.key(composition, descriptor))
+        if basin is not None or composition not in self.descriptors:
+            return basin
+
+        from scipy.spatial import cKDTree
+
+        if composition not in self._trees:
+            self._trees[composition] = cKDTree(np.array([d for d, b in self.descriptors[composition]]))
+        distance, i = self._trees[composition].query(descriptor, eps=self.eps,
+                                                     distance_upper_bound=self.tolerance)
+        if np.isfinite(distance):
+            return self.descriptors[composition][i][1]
+        return None
+
+    def add(self, composition, descriptor, basin):
+        """Adds a descriptor of basin `basin`."""
+        key = self.key(composition, descriptor)
+        if key in self.keys:
+            return
+        self.keys[key] = basin
+        self.descriptors.setdefault(composition, []).append((np.asarray(descriptor, dtype=float), basin))
+        self._trees.pop(composition, None)
+
+    def add_basin(self, record):
+        """Adds a basin with what is known about it (a dict) and returns its
+        index."""
+        self.basins.append(record)
+        return len(self.basins) - 1
+
+    def save(self, filename):
+        """Saves the archive to a file."""
+        with open(filename, 'wb') as f:
+            pickle.dump({'settings': (self.resolution, self.tolerance, self.eps),
+                         'basins': self.basins, 'descriptors': self.descriptors}, f)
+
+    @classmethod
+    def load(cls, filename):
+        """Loads an archive saved with `save`."""
+        with open(filename, 'rb') as f:
+            data = pickle.load(f)
+        archive = cls(*data['settings'])
+        archive.basins = data['basins']
+        for composition, descriptors in data['descriptors'].items():
+            for descriptor, basin in descriptors:
+                archive.add(composition, descriptor, basin)
+        return archive
@@ -0,0 +1,129 @@
+"""Steinhardt bond-orientational order parameters.
+
+For a set of bonds with unit vectors r_b,
+
+    Q_lm = < Y_lm(r_b) >_b,    Q_l = sqrt(4 pi / (2l + 1) sum_m |Q_lm|^2),
+
+where Y_lm are the orthonormal spherical harmonics (with the
+Condon-Shortley phase, as `scipy.special.sph_harm`). The bonds are found
+with a k-d tree and the harmonics of every bond of every structure are
+evaluated together, one (l, m) at a time, with the recurrence of the
+normalized associated Legendre functions.
+"""
+
+import numpy as np
+
+
+def get_bonds(positions, cutoff):
+    """Returns the bonds i < j shorter than `cutoff` as an (n, 2) index
+    array and the (n, 3) vectors ``positions[i] - positions[j]``."""
+    from scipy.spatial import cKDTree
+
+    pairs = cKDTree(positions).query_pairs(cutoff, output_type='ndarray')
+    pairs = pairs.reshape(-1, 2)
+    return pairs, positions[pairs[:, 0]] - positions[pairs[:, 1]]
+
+
+def sum_harmonics(vectors, groups, ngroups, lmax):
+    """Sums the spherical harmonics Y_lm, m >= 0, of the directions of
+    `vectors` by `groups`.
+
+    Returns
+    -------
+    (ngroups, lmax + 1, lmax + 1) complex array
+        The sums indexed [group, l, m], zero for m > l.
+    """
+    x, y, z = np.asarray(vectors, dtype=float).T
+    rho = np.hypot(x, y)
+    r = np.hypot(rho, z)
+    r[r == 0] = 1
+    cos_theta, sin_theta = z / r, rho / r
+
+    # exp(i phi) without an arctan, 1 along the z-axis
+    azimuth = np.ones(len(x), dtype=complex)
+    off_axis = rho > 0
+    azimuth[off_axis] = (x[off_axis] + 1j * y[off_axis]) / rho[off_axis]
+
+    sums = np.zeros((ngroups, lmax + 1, lmax + 1), dtype=complex)
+    diagonal = np.full(len(x), np.sqrt(1 / (4 * np.pi)))
+    phase = np.ones(len(x), dtype=complex)
+    for m in range(lmax + 1):
+        if m > 0:
+            diagonal = -np.sqrt((2 * m + 1) / (2 * m)) * sin_theta * diagonal
+            phase = phase * azimuth
+        previous, current = 0, diagonal
+        for l in range(m, lmax + 1):
+            if l == m + 1:
+                previous, current = current, np.sqrt(2 * m + 3) * cos_theta * current
+            elif l > m + 1:
+                a = np.sqrt((4 * l * l - 1) / (l * l - m * m))
+                b = np.sqrt(((l - 1)**2 - m * m) / (4 * (l - 1)**2 - 1))
+                previous, current = current, a * (cos_theta * current - b * previous)
+            values = current * phase
+            sums[:, l, m] = (np.bincount(groups, values.real, minlength=ngroups)
+                             + 1j * np.bincount(groups, values.imag, minlength=ngroups))
+    return sums
+
+
+def order_parameters(q_lm, l_set):
+    """Q_l from the averages Q_lm, m >= 0, indexed [..., l, m]."""
+    l_set = np.asarray(l_set)
+    squares = np.absolute(q_lm)**2
+    # Y_l,-m = (-1)^m conj(Y_lm), so the m < 0 terms double those of m > 0
+    totals = 2 * squares.sum(axis=-1) - squares[..., 0]
+    return np.sqrt(4 * np.pi / (2 * l_set + 1) * totals[..., l_set])
+
+
+def bond_order(structures, l_set=range(2, 14, 2), cutoff=3.0, per_atom=False):
+    """Computes the Steinhardt order parameters Q_l of many structures.
+
+    Parameters
+    ----------
+    structures : list of Atoms or (N, 3) arrays
+        The structures.
+    l_set : list of int
+        The orders l.
+    cutoff : float
+        The bond length cutoff.
+    per_atom : bool
+        Also return the averages q_lm over the bonds of each atom.
+
+    Returns
+    -------
+    Q_l : (nstructures, len(l_set)) array
+        Q_l over all the bonds of each structure, zero without bonds and
+        for odd l.
+    q_lm : list of (N, max(l_set) + 1, max(l_set) + 1) complex arrays
+        Only with `per_atom`: q_lm of the atoms of each structure indexed
+        [atom, l, m], m >= 0.
+    """
+    l_set = list(l_set)
+    lmax = max(l_set)
+    positions = [np.asarray(getattr(structure, 'positions', structure), dtype=float) for structure in structures]
+
+    vectors, owners, atoms = [], [], []
+    offset = 0
+    for i, p in enumerate(positions):
+        pairs, v = get_bonds(p, cutoff)
+        vectors.append(v)
+        owners.append(np.full(len(v), i, dtype=int))
+        atoms.append(pairs + offset)
+        offset += len(p)
+    vectors = np.concatenate(vectors) if vectors else np.empty((0, 3))
+    owners = np.concatenate(owners) if owners else np.empty(0, dtype=int)
+    nbonds = np.bincount(owners, minlength=len(positions))
+
+    # Bonds count in both directions and Y_lm(-r) = (-1)^l Y_lm(r), so the
+    # averages of odd l vanish
+    parity = (-1)**np.arange(lmax + 1)[:, None]
+    q_lm = sum_harmonics(vectors, owners, len(positions), lmax) * (1 + parity) / 2
+    Q_l = order_parameters(q_lm / np.maximum(nbonds, 1)[:, None, None], l_set)
+    if not per_atom:
+        return Q_l
+
+    atoms = np.concatenate(atoms) if atoms else np.empty((0, 2), dtype=int)
+    sums = sum_harmonics(vectors, atoms[:, 0], offset, lmax)
+    sums += parity * sum_harmonics(vectors, atoms[:, 1], offset, lmax)
+    counts = np.bincount(atoms.ravel(), minlength=offset)
+    q_atoms = sums / np.maximum(counts, 1)[:, None, None]
+    return Q_l, np.split(q_atoms, np.cumsum([len(p) for p in positions])[:-1])
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class Columns(object):
+    """Atoms grouped into columns along the z-direction.
+
+    Attributes
+    ----------
+    labels : (N,) int array
+        The column of each atom.
+    indices : list of int arrays
+        The atoms in each column, in increasing index order. Columns are
+        ordered by their lowest atom index.
+    heights : (M,) int array
+        The number of atoms in each column.
+    xys : (M, 2) array
+        The average xy coordinates of each column.
+    top, bottom : (M,) int arrays
+        The index of the highest and lowest atom of each column.
+    """
+
+    def __init__(self, positions, labels):
+        self.labels = labels
+        self.heights = np.bincount(labels)
+
+        order = np.argsort(labels, kind='mergesort')
+        boundaries = np.cumsum(self.heights)[:-1]
+        self.indices = np.split(order, boundaries)
+
+        self.xys = np.empty((len(self.heights), 2))
+        self.xys[:, 0] = np.bincount(labels, positions[:, 0]) / self.heights
+        self.xys[:, 1] = np.bincount(labels, positions[:, 1]) / self.heights
+
+        order = np.lexsort((positions[:, 2], labels))
+        starts = np.append(0, boundaries)
+        self.bottom = order[starts]
+        self.top = order[starts + self.heights - 1]
+
+    def __len__(self):
+        return len(self.heights)
+
+
+def find_columns(positions, cutoff):
+    """Groups `positions` into columns: atoms closer than `cutoff` in the
+    xy-plane are in the same column, as are all atoms connected through
+    such neighbors.
+
+    Parameters
+    ----------
+    positions : (N, 3) array
+        The atom positions.
+    cutoff : float
+        The xy distance within which two atoms share a column.
+
+    Returns
+    -------
+    Columns
+    """
+    from scipy.spatial import cKDTree
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    n = len(positions)
+    pairs = cKDTree(positions[:, :2]).query_pairs(cutoff, output_type='ndarray')
+    graph = coo_matrix((np.ones(len(pairs), bool), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    return Columns(positions, labels)
+
+
+def get_columns(atoms, cutoff):
+    """Returns the `Columns` of `atoms` (see `find_columns`).
+
+    The result is cached on `atoms` and reused for as long as the positions
+    hash to the same value, so mutations and fitnesses working on the same
+    structure only group it into columns once.
+    """
+    positions = atoms.positions
+    key = (hash(positions.tobytes()), len(positions), cutoff)
+    cache = getattr(atoms, '_columns', None)
+    if cache is None or cache[0] != key:
+        cache = (key, find_columns(positions, cutoff))
+        atoms._columns = cache
+    return cache[1]
@@ -0,0 +1,144 @@
+import random
+import numpy as np
+
+from structopt.tools import rotation_matrix, random_three_vector
+
+AXES = {'x': (1, 0, 0), '-x': (-1, 0, 0),
+        'y': (0, 1, 0), '-y': (0, -1, 0),
+        'z': (0, 0, 1), '-z': (0, 0, -1)}
+
+
+def rotate_stacked(positions, owners, rotations):
+    """Rotates the stacked positions of many structures in one step.
+
+    Parameters
+    ----------
+    positions : (N, 3) array
+        The positions of all structures, concatenated.
+    owners : (N,) int array
+        The index of the structure each position belongs to.
+    rotations : (M, 3, 3) array
+        One rotation matrix per structure.
+
+    Returns
+    -------
+    (N, 3) array: The rotated positions.
+    """
+    return np.einsum('nij,nj->ni', rotations[owners], positions)
+
+
+def stack_positions(individuals, centers):
+    """Concatenates the positions of a list of individuals, each shifted
+    by its center, and returns them with the owner index of every atom."""
+    sizes = [len(individual) for individual in individuals]
+    owners = np.repeat(np.arange(len(individuals)), sizes)
+    positions = np.concatenate([individual.positions for individual in individuals])
+    return positions - np.asarray(centers)[owners], owners
+
+
+def random_rotations(n, axes=None, max_angle=np.pi):
+    """Returns `n` random rotation matrices. If `axes` is None the rotation
+    vectors are uniform on the sphere, otherwise they are picked from the
+    given list of axis names."""
+    rotations = np.empty((n, 3, 3))
+    for i in range(n):
+        if axes is None:
+            axis = random_three_vector()
+        else:
+            axis = AXES[random.choice(axes)]
+        rotations[i] = rotation_matrix(axis, random.uniform(0, max_angle))
+    return rotations
+
+
+def planar_cut(z1, z2):
+    """Returns the indices of the atoms at or above the z = 0 plane of each parent."""
+    return np.flatnonzero(z1 >= 0), np.flatnonzero(z2 >= 0)
+
+
+def balanced_cut(z1, z2):
+    """Like `planar_cut` but atoms are moved at random from the larger
+    half to below the cut until both halves hold the same number of atoms."""
+    top1, top2 = planar_cut(z1, z2)
+    n = min(len(top1), len(top2))
+    top1 = np.sort(np.random.choice(top1, n, replace=False))
+    top2 = np.sort(np.random.choice(top2, n, replace=False))
+    return top1, top2
+
+
+def species_matched_cut(z1, numbers1, z2, numbers2):
+    """Selects the halves to swap between two parents so that the
+    children keep the composition of their parents.
+
+    Every species above the z = 0 plane of parent 1 is matched by the same
+    number of atoms of that species from parent 2, taking the atoms with the
+    largest z. When parent 2 runs short of a species, the lowest atoms of
+    that species are left below the cut in parent 1.
+
+    Returns
+    -------
+    top1, top2 : int arrays
+        Indices into parent 1 and parent 2 of equal length and matching
+        species.
+    """
+    above = np.flatnonzero(z1 >= 0)
+    top1, top2 = [np.empty(0, int)], [np.empty(0, int)]
+    for number in np.unique(numbers1[above]):
+        candidates1 = above[numbers1[above] == number]
+        candidates2 = np.flatnonzero(numbers2 == number)
+        n = min(len(candidates1), len(candidates2))
+        top1.append(candidates1[np.argsort(-z1[candidates1], kind='mergesort')[:n]])
+        top2.append(candidates2[np.argsort(-z2[candidates2], kind='mergesort')[:n]])
+    return np.concatenate(top1), np.concatenate(top2)
+
+
+def splice(arrays1, top1, arrays2, top2):
+    """Swaps the selected halves of two parents.
+
+    Parameters
+    ----------
+    arrays1, arrays2 : dict
+        The per-atom arrays of the parents (e.g. `Individual.arrays`).
+    top1, top2 : int arrays
+        The indices of the atoms above the cut in each parent.
+
+    Returns
+    -------
+    dict: The arrays of the first child, parent 2's top on parent 1's bottom
+    dict: The arrays of the second child, parent 1's top on parent 2's bottom
+    """
+    bottom1 = np.ones(len(arrays1['numbers']), bool)
+    bottom1[top1] = False
+    bottom2 = np.ones(len(arrays2['numbers']), bool)
+    bottom2[top2] = False
+    names = [name for name in arrays1 if name in arrays2]
+    child1 = {name: np.concatenate((arrays2[name][top2], arrays1[name][bottom1])) for name in names}
+    child2 = {name: np.concatenate((arrays1[name][top1], arrays2[name][bottom2])) for name in names}
+    return child1, child2
+
+
+def ensure_species(child1, child2, numbers):
+    """Makes sure both children contain at least one atom of each species
+    in `numbers`. A missing species is copied over from the other child, or
+    assigned to a random atom if neither child has it."""
+    for number in numbers:
+        has1 = np.flatnonzero(child1['numbers'] == number)
+        has2 = np.flatnonzero(child2['numbers'] == number)
+        if len(has1) == 0 and len(has2) == 0:
+            child1['numbers'][random.randrange(len(child1['numbers']))] = number
+            child2['numbers'][random.randrange(len(child2['numbers']))] = number
+        elif len(has1) == 0:
+            i, j = random.randrange(len(child1['numbers'])), random.choice(has2)
+            for name in child1:
+                child1[name][i] = child2[name][j]
+        elif len(has2) == 0:
+            i, j = random.randrange(len(child2['numbers'])), random.choice(has1)
+            for name in child2:
+                child2[name][i] = child1[name][j]
+
+
+def build_child(parent, arrays):
+    """Returns an Individual with the module parameters and cell of
+    `parent` holding the per-atom `arrays`."""
+    child = parent.copy(include_atoms=False)
+    child.arrays = arrays
+    return child
@@ -1,2 +1,6 @@
 class FEMSIMError(Exception):
     pass
+
+
+class LAMMPSTimeout(RuntimeError):
+    pass
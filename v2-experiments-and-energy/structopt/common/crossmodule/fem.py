@@ -0,0 +1,262 @@
+"""A NumPy implementation of the fluctuation electron microscopy (FEM)
+simulation of femsim (https://github.com/paul-voyles/femsim-hrmc).
+
+The model is a periodic cube. For each model rotation, nanodiffraction
+patterns are simulated at a square grid of probe positions (pixels) and
+the normalized variance of their intensities is
+
+    V(k) = <I(k)^2> / <I(k)>^2 - 1
+
+over all rotations and pixels. The intensity of a pixel is the
+azimuthally averaged kinematic diffraction of the atoms in the column
+under the probe,
+
+    I(k) = sum_ij w_i w_j J0(2 pi k r_ij),
+
+where r_ij is the projected distance between atoms i and j and the
+weight w_i is the atomic number of atom i times the amplitude of the
+coherent (Airy) probe at its projected distance from the pixel center.
+The probe is cut off at its first zero, R = 0.61 / Q. The k-dependence of
+the scattering factors is ignored; it cancels exactly in V(k) for single
+species models.
+
+Pair distances are binned with linear weights and the sums over pairs are
+taken as one matrix product with a table of J0 at the bin edges, so the
+cost is the number of atom pairs that share a pixel. The intensities of
+every rotation and pixel are kept (`FEMSimulator.intensities`) so that
+when a few atoms change, only the pairs involving those atoms are
+recomputed (`FEMSimulator.update`).
+"""
+
+from itertools import product
+
+import numpy as np
+
+
+class FEMSimulator(object):
+    """Simulates V(k) for periodic models in a cube of side `size`.
+
+    Parameters
+    ----------
+    size : float
+        The side of the periodic cube, in Angstroms.
+    k : (nk,) array
+        The scattering vectors, in inverse Angstroms.
+    Q : float
+        The objective aperture, in inverse Angstroms. The pixels are
+        ``size // (0.61 / Q)`` to a side (at least one).
+    nphi, npsi, ntheta : int
+        The number of model rotations around each Euler angle (z-x-z).
+        phi and psi cover 0 to 2 pi and theta 0 to pi.
+    bin_width : float
+        The width of the pair distance bins, in Angstroms.
+    batch_size : int
+        The number of rotations computed at once, which bounds the memory
+        used for the pairs.
+    """
+
+    def __init__(self, size, k, Q, nphi, npsi, ntheta, bin_width=0.02, batch_size=16):
+        from scipy.special import j0
+
+        self.size = float(size)
+        self.k = np.asarray(k, dtype=float)
+        self.Q = float(Q)
+        self.resolution = 0.61 / self.Q
+        self.batch_size = batch_size
+        self.rotations = euler_rotations(nphi, npsi, ntheta)
+
+        npix = max(1, int(self.size // self.resolution))
+        pitch = self.size / npix
+        centers = -0.5 * self.size + pitch * (np.arange(npix) + 0.5)
+        self.pixels = np.array(list(product(centers, centers)))
+
+        # Pairs in a pixel are at most two probe radii apart
+        self.bin_width = bin_width
+        self.nbins = int(np.ceil(2 * self.resolution / bin_width)) + 2
+        r = np.arange(self.nbins) * bin_width
+        self.bessel = j0(2 * np.pi * np.outer(r, self.k))
+
+    @property
+    def shape(self):
+        """The shape of the array returned by `intensities`."""
+        return (len(self.rotations), len(self.pixels), len(self.k))
+
+    def probe(self, r):
+        """The amplitude of the Airy probe at projected distances `r`."""
+        from scipy.special import j1
+
+        u = 2 * np.pi * self.Q * np.asarray(r, dtype=float)
+        amplitude = np.ones_like(u)
+        nonzero = u > 0
+        amplitude[nonzero] = 2 * j1(u[nonzero]) / u[nonzero]
+        return amplitude
+
+    def images(self, positions, numbers):
+        """Returns the positions, relative to the center of the cube, and
+        the atomic numbers of the periodic images of the atoms that may lie
+        in the cube after a rotation."""
+        positions = np.mod(positions, self.size) - 0.5 * self.size
+        offsets = self.size * np.array(list(product((-1, 0, 1), repeat=3)))
+        images = (positions[None, :, :] + offsets[:, None, :]).reshape(-1, 3)
+        numbers = np.tile(np.asarray(numbers, dtype=float), len(offsets))
+        keep = (images**2).sum(axis=1) <= 0.75 * self.size**2
+        return images[keep], numbers[keep]
+
+    def project(self, images, numbers, rotations):
+        """Rotates `images` by each of `rotations` and finds the pixels
+        they fall into.
+
+        Returns
+        -------
+        groups : (n,) int array
+            The rotation and pixel, ``rotation * npixels + pixel``, of each
+            atom in a pixel, sorted.
+        xys : (n, 2) array
+            Their projected positions.
+        weights : (n,) array
+            Their weights, the atomic number times the probe amplitude.
+        """
+        rotated = np.einsum('mj,bij->bmi', images, rotations)
+        rotation, image = np.nonzero((np.absolute(rotated) < 0.5 * self.size).all(axis=2))
+        xys = rotated[rotation, image, :2]
+
+        distances = np.sqrt(((xys[:, None, :] - self.pixels[None, :, :])**2).sum(axis=2))
+        member, pixel = np.nonzero(distances < self.resolution)
+        groups = rotation[member] * len(self.pixels) + pixel
+        weights = numbers[image[member]] * self.probe(distances[member, pixel])
+
+        order = np.argsort(groups, kind='mergesort')
+        return groups[order], xys[member[order]], weights[order]
+
+    def pair_sums(self, xys1, weights1, xys2, weights2, pairs, groups, ngroups):
+        """Sums ``w_i w_j J0(2 pi k r_ij)`` over `pairs` (indices into
+        the first and second set of atoms) by the `groups` of the pairs."""
+        i, j = pairs
+        dx = xys1[:, 0][i] - xys2[:, 0][j]
+        dy = xys1[:, 1][i] - xys2[:, 1][j]
+        r = np.sqrt(dx * dx + dy * dy) / self.bin_width
+        lower = np.floor(r).astype(int)
+        upper_weight = r - lower
+        w = weights1[i] * weights2[j]
+        bins = groups * self.nbins + lower
+        hist = np.bincount(bins, w * (1 - upper_weight), minlength=ngroups * self.nbins)
+        hist += np.bincount(bins + 1, w * upper_weight, minlength=ngroups * self.nbins)
+        return np.dot(hist.reshape(ngroups, self.nbins), self.bessel)
+
+    def batches(self):
+        for start in range(0, len(self.rotations), self.batch_size):
+            yield start, self.rotations[start:start + self.batch_size]
+
+    def intensities(self, positions, numbers):
+        """Computes the intensities I(k) of every rotation and pixel.
+
+        Returns
+        -------
+        (nrotations, npixels, nk) array
+        """
+        npix = len(self.pixels)
+        intensities = np.empty(self.shape)
+        images, image_numbers = self.images(positions, numbers)
+        for start, rotations in self.batches():
+            ngroups = len(rotations) * npix
+            groups, xys, weights = self.project(images, image_numbers, rotations)
+
+            # Each pair once, and the atoms themselves at r = 0
+            i, j = distinct_pairs_by_group(groups, ngroups)
+            I = self.pair_sums(xys, 2 * weights, xys, weights, (i, j), groups[i], ngroups)
+            I += np.bincount(groups, weights**2, minlength=ngroups)[:, None]
+            intensities[start:start + len(rotations)] = I.reshape(len(rotations), npix, -1)
+        return intensities
+
+    def update(self, intensities, unchanged, old, new):
+        """Updates `intensities` for atoms that moved, were added or were
+        removed. Only the pairs of atoms that involve a changed atom are
+        computed, but all the atoms are still rotated.
+
+        Parameters
+        ----------
+        intensities : (nrotations, npixels, nk) array
+            The intensities of the old structure. Not modified.
+        unchanged, old, new : tuples of (positions, numbers)
+            The atoms the old and new structures share, and the atoms only
+            in the old and only in the new structure.
+
+        Returns
+        -------
+        (nrotations, npixels, nk) array
+        """
+        npix = len(self.pixels)
+        intensities = intensities.copy()
+        unchanged = self.images(*unchanged)
+        changes = [(self.images(*old), -1), (self.images(*new), 1)]
+        for start, rotations in self.batches():
+            ngroups = len(rotations) * npix
+            groups, xys, weights = self.project(*unchanged, rotations=rotations)
+            delta = np.zeros((ngroups, len(self.k)))
+            for (images, numbers), sign in changes:
+                if len(images) == 0:
+                    continue
+                changed_groups, changed_xys, changed_weights = self.project(images, numbers, rotations)
+                changed_weights = sign * changed_weights
+                # Pairs with the unchanged atoms count twice, pairs among
+                # the changed atoms once in each order
+                pairs = pairs_by_group(changed_groups, groups, ngroups)
+                delta += self.pair_sums(changed_xys, 2 * changed_weights, xys, weights,
+                                        pairs, changed_groups[pairs[0]], ngroups)
+                pairs = pairs_by_group(changed_groups, changed_groups, ngroups)
+                delta += sign * self.pair_sums(changed_xys, changed_weights, changed_xys, changed_weights,
+                                               pairs, changed_groups[pairs[0]], ngroups)
+            intensities[start:start + len(rotations)] += delta.reshape(len(rotations), npix, -1)
+        return intensities
+
+    def vk(self, positions, numbers):
+        """Computes V(k) of a structure."""
+        return variance(self.intensities(positions, numbers))
+
+
+def variance(intensities):
+    """V(k) from the intensities of every rotation and pixel."""
+    intensities = intensities.reshape(-1, intensities.shape[-1])
+    return (intensities**2).mean(axis=0) / intensities.mean(axis=0)**2 - 1
+
+
+def euler_rotations(nphi, npsi, ntheta):
+    """Returns the (nphi * npsi * ntheta, 3, 3) z-x-z rotation matrices
+    ``Rz(phi) Rx(theta) Rz(psi)`` over a grid of the Euler angles."""
+    def rz(angle):
+        c, s = np.cos(angle), np.sin(angle)
+        return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+    def rx(angle):
+        c, s = np.cos(angle), np.sin(angle)
+        return np.array([[1, 0, 0], [0, c, -s], [0, s, c]])
+
+    phis = 2 * np.pi * np.arange(nphi) / nphi
+    psis = 2 * np.pi * np.arange(npsi) / npsi
+    thetas = np.pi * np.arange(ntheta) / ntheta
+    return np.array([rz(phi).dot(rx(theta)).dot(rz(psi))
+                     for theta in thetas for phi in phis for psi in psis])
+
+
+def pairs_by_group(groups1, groups2, ngroups):
+    """Returns all index pairs (i, j) with ``groups1[i] == groups2[j]``.
+    `groups2` must be sorted."""
+    counts = np.bincount(groups2, minlength=ngroups)
+    starts = np.cumsum(counts) - counts
+    n = counts[groups1]
+    ends = np.cumsum(n)
+    i = np.repeat(np.arange(len(groups1)), n)
+    j = np.repeat(starts[groups1] - ends + n, n) + np.arange(ends[-1] if len(ends) else 0)
+    return i, j
+
+
+def distinct_pairs_by_group(groups, ngroups):
+    """Returns the index pairs (i, j) with i < j and ``groups[i] ==
+    groups[j]``. `groups` must be sorted."""
+    counts = np.bincount(groups, minlength=ngroups)
+    ends = np.cumsum(counts)[groups]
+    n = ends - np.arange(len(groups)) - 1
+    cumulative = np.cumsum(n)
+    i = np.repeat(np.arange(len(groups)), n)
+    j = np.repeat(np.arange(1, len(groups) + 1) - cumulative + n, n) + np.arange(cumulative[-1] if len(n) else 0)
+    return i, j
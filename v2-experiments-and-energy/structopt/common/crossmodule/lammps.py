@@ -6,9 +6,12 @@ import decimal as dec
 from tempfile import mkdtemp, NamedTemporaryFile, mktemp as uns_mktemp
 from re import compile as re_compile, IGNORECASE
 import subprocess
-from ase.calculators.lammpsrun import Prism
 
 from structopt.io import write_data
+from structopt.common.crossmodule.exceptions import LAMMPSTimeout
+
+# The timeout, in seconds, of a LAMMPS run without a timeout parameter
+DEFAULT_TIMEOUT = 60
 
 # "End mark" used to indicate that the calculation is done
 CALCULATION_END_MARK = '__end_of_ase_invoked_calculation__'
@@ -157,9 +160,20 @@ class LAMMPS(object):
             f.write('fix fix_nve all nve\n')
             if parameters['relax_box']:
                 f.write('fix relax_box all box/relax iso 0.0 vmax 0.001\n')
-            for param in ['min_style', 'min_modify', 'minimize']:
+            for param in ['min_style', 'min_modify']:
                 if param in parameters:
                     f.write('{} {}\n'.format(param, parameters[param]))
+            local = parameters.get('free_atoms') is not None
+            if local:
+                # Only the atoms in free_atoms (0-based) are allowed to move
+                f.write('group free id {}\n'.format(id_ranges(parameters['free_atoms'])))
+                f.write('group frozen subtract all free\n')
+                f.write('fix freeze frozen setforce 0.0 0.0 0.0\n')
+            if 'minimize' in parameters:
+                f.write('minimize {}\n'.format(parameters['minimize']))
+            if local and parameters.get('polish_minimize'):
+                f.write('unfix freeze\n')
+                f.write('minimize {}\n'.format(parameters['polish_minimize']))
             f.write('compute pea all pe/atom\n')
 
             # Generate the thermodynamic and structural information
@@ -177,7 +191,7 @@ class LAMMPS(object):
         depends on the atoms object, and hence cannot be done in __init__.py."""
 
         parameters.setdefault('thermosteps', 0)
-        parameters.setdefault('timeout', 60)
+        parameters.setdefault('timeout', DEFAULT_TIMEOUT)
         parameters.setdefault('relax_box', False)
 
         # Initialize the potential parameters
@@ -383,6 +397,8 @@ class LAMMPS(object):
             f.write(error_string)
         os.chdir(self.cwd)
 
+        if error_string == "Timed out!":
+            raise LAMMPSTimeout('LAMMPS calculation in {} timed out after {} s'.format(self.calcdir, self.parameters['timeout']))
         raise RuntimeError('Error in LAMMPS calculation in {}:\n{}'.format(self.calcdir, error_string))
 
 
@@ -399,3 +415,16 @@ class LAMMPS(object):
             else:
                 raise ValueError("The thing trying to be copied is not a file or directory")
 
+
+def id_ranges(indices):
+    """Formats 0-based atom indices as LAMMPS atom IDs, with runs of
+    consecutive IDs written as ranges, e.g. "1:3 5"."""
+    indices = np.unique(indices) + 1
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    ranges = []
+    for run in np.split(indices, breaks):
+        if len(run) == 1:
+            ranges.append(str(run[0]))
+        else:
+            ranges.append('{}:{}'.format(run[0], run[-1]))
+    return ' '.join(ranges)
@@ -1,24 +1,22 @@
 import numpy as np
-from scipy.signal import fftconvolve
-from ase.cluster.octahedron import Octahedron
-from ase.visualize import view
 
-from structopt.aperiodic.individual.generators import fcc
 from structopt.common.crossmodule.analysis import get_avg_radii
+from structopt.common.crossmodule.columns import get_columns
+from structopt.tools.fft import get_dtype, rfftn, irfftn, hermitian_half
 
-def get_chi2(atoms1, atoms2, cutoff=0.8, r=2.0, HWHM=0.4):
+def get_chi2(atoms1, atoms2, cutoff=0.8, r=2.0, HWHM=0.4, precision='double'):
     """Calculates the chi2, which is the difference in positions
     between atoms1 and atoms2"""
 
     # Calculate the offset to apply to atoms1 to maximize matching
     # to atoms2
-    offset = get_offset(atoms1, atoms2, r=r, HWHM=HWHM)
+    offset = get_offset(atoms1, atoms2, r=r, HWHM=HWHM, precision=precision)
     atoms1.translate(offset)
 
     # Calculate the location difference of each atom1 atom with atom2 atom
     cutoff *= get_avg_radii(atoms1) * 2
-    pos1 = np.expand_dims(atoms1.get_positions(), 0)
-    pos2 = np.expand_dims(atoms2.get_positions(), 0)
+    pos1 = np.expand_dims(atoms1.positions, 0)
+    pos2 = np.expand_dims(atoms2.positions, 0)
     dists = np.linalg.norm(pos1 - np.transpose(pos2, (1, 0, 2)), axis=2)
 
     nn_dists = np.min(dists, axis=1)
@@ -28,81 +26,51 @@ def get_chi2(atoms1, atoms2, cutoff=0.8, r=2.0, HWHM=0.4):
 
     return x_fp, x_fn, chi2
 
-def get_chi2_column(atoms1, atoms2, cutoff=0.2, r=2.0, HWHM=0.4):
+def get_chi2_column(atoms1, atoms2, cutoff=0.2, r=2.0, HWHM=0.4, precision='double'):
     """Calculates the error per column of atoms in the z-direction"""
 
     cutoff *= get_avg_radii(atoms1) * 2
 
     # Calculate the offset to apply to atoms1 to maximize matching
     # to atoms2
-    offset = get_offset(atoms1, atoms2, r=r, HWHM=HWHM)
+    offset = get_offset(atoms1, atoms2, r=r, HWHM=HWHM, precision=precision)
     atoms1.translate(offset)
 
     # Group each atom in both atoms1 and atoms2 into columns
-    xys1 = np.expand_dims(atoms1.get_positions()[:, :2], 0)
-    xys2 = np.expand_dims(atoms2.get_positions()[:, :2], 0)
-    dists1 = np.linalg.norm(xys1 - np.transpose(xys1, (1, 0, 2)), axis=2)
-    dists2 = np.linalg.norm(xys2 - np.transpose(xys2, (1, 0, 2)), axis=2)
-
-    NNs1 = np.sort(np.argwhere(dists1 < cutoff))
-    column_indices1 = []
-    atoms_to_be_sorted1 = list(range(len(atoms1)))
-    while len(atoms_to_be_sorted1) > 0:
-        i = atoms_to_be_sorted1[0]
-        same_column_indices = np.unique(NNs1[NNs1[:,0] == i])
-        column_indices1.append(same_column_indices)
-        for j in reversed(sorted(same_column_indices)):
-            i_del = atoms_to_be_sorted1.index(j)
-            atoms_to_be_sorted1.pop(i_del)
-            NNs1 = NNs1[NNs1[:,0] != j]
-            NNs1 = NNs1[NNs1[:,1] != j]
-
-    NNs2 = np.sort(np.argwhere(dists2 < cutoff))
-    column_indices2 = []
-    atoms_to_be_sorted2 = list(range(len(atoms2)))
-    while len(atoms_to_be_sorted2) > 0:
-        i = atoms_to_be_sorted2[0]
-        same_column_indices = np.unique(NNs2[NNs2[:,0] == i])
-        column_indices2.append(same_column_indices)
-        for j in reversed(sorted(same_column_indices)):
-            i_del = atoms_to_be_sorted2.index(j)
-            atoms_to_be_sorted2.pop(i_del)
-            NNs2 = NNs2[NNs2[:,0] != j]
-            NNs2 = NNs2[NNs2[:,1] != j]            
-
-    # Find the average xy coordinates of each column
-    column_xys1 = np.asarray([np.average(np.squeeze(xys1, axis=0)[i], axis=0) for i in column_indices1])
-    column_xys2 = np.asarray([np.average(np.squeeze(xys2, axis=0)[i], axis=0) for i in column_indices2])
+    columns1 = get_columns(atoms1, cutoff)
+    columns2 = get_columns(atoms2, cutoff)
 
     # Find matching column locations in atoms1 and atoms2
-    dists = np.linalg.norm(np.expand_dims(column_xys1, 0) - np.transpose(np.expand_dims(column_xys2, 0), (1, 0, 2)), axis=2)
-    paired_atoms2 = [np.argmin(dist) if np.min(dist) < cutoff else False for dist in dists]
-    paired_atoms1 = [np.argmin(dist) if np.min(dist) < cutoff else False for dist in dists.T]
+    dists = np.linalg.norm(np.expand_dims(columns1.xys, 0) - np.expand_dims(columns2.xys, 1), axis=2)
+    paired_atoms2 = np.where(dists.min(axis=1) < cutoff, dists.argmin(axis=1), -1)
+    paired_atoms1 = np.where(dists.min(axis=0) < cutoff, dists.argmin(axis=0), -1)
+
+    n_fn = np.count_nonzero(paired_atoms2 == -1)
+    n_fp = np.count_nonzero(paired_atoms1 == -1)
+    column_pairs = sorted([[j, i] for i, j in enumerate(paired_atoms2) if j != -1], key=lambda i: i[0])
+
+    # Count the atoms of each element in every column
+    unique_syms = np.unique(atoms2.get_chemical_symbols())
+    counts1 = np.zeros((len(columns1), len(unique_syms)), int)
+    counts2 = np.zeros((len(columns2), len(unique_syms)), int)
+    for counts, atoms, columns in [(counts1, atoms1, columns1), (counts2, atoms2, columns2)]:
+        syms = np.asarray(atoms.get_chemical_symbols())
+        for k, sym in enumerate(unique_syms):
+            counts[:, k] = np.bincount(columns.labels[syms == sym], minlength=len(columns))
 
-    n_fn = np.count_nonzero(np.array(paired_atoms2) == False)
-    n_fp = np.count_nonzero(np.array(paired_atoms1) == False)
-    column_pairs = sorted([[j, i] for i, j in enumerate(paired_atoms2) if j is not False], key=lambda i: i[0])
-
-    syms1 = np.asarray(atoms1.get_chemical_symbols())
-    syms2 = np.asarray(atoms2.get_chemical_symbols())
-
-    unique_syms = np.unique(syms2)
     chi2 = {sym: [] for sym in unique_syms}
     chi2['n'] = []
-    
     for pair in column_pairs:
-        col_indices1 = column_indices1[pair[0]]
-        col_indices2 = column_indices2[pair[1]]
-        col_syms1 = list(syms1[col_indices1])
-        col_syms2 = list(syms2[col_indices2])
-        chi2['n'].append(len(col_syms1) - len(col_syms2))
-        for sym in unique_syms:
-            chi2[sym].append(col_syms1.count(sym) - col_syms2.count(sym))
+        chi2['n'].append(columns1.heights[pair[0]] - columns2.heights[pair[1]])
+        for k, sym in enumerate(unique_syms):
+            chi2[sym].append(counts1[pair[0], k] - counts2[pair[1], k])
 
     return n_fn, n_fp, chi2
 
-def get_offset(atoms1, atoms2, r=5.0, HWHM=0.4):
-    """Gets the offset to apply to atoms1 to have its positions match atoms2"""
+def get_offset(atoms1, atoms2, r=5.0, HWHM=0.4, precision='double'):
+    """Gets the offset to apply to atoms1 to have its positions match atoms2.
+    The images are blurred and correlated in `precision`, 'single' or
+    'double'."""
 
     cell1 = atoms1.get_cell()
     cell2 = atoms2.get_cell()
@@ -113,19 +81,20 @@ def get_offset(atoms1, atoms2, r=5.0, HWHM=0.4):
     assert (cell1 == cell2).all()
 
     # Load the 3d point spread function (psf)
+    dtype = get_dtype(precision)
     psf = get_3d_psf(cell1.diagonal(), r, HWHM)
-    ft_psf = np.fft.fftshift(psf)
+    ft_psf = hermitian_half(np.fft.fftshift(psf)).astype(dtype)
 
-    # Get the gridded locations
-    V1 = get_gridded_locations(cell1.diagonal(), r, atoms1)
-    ft_V1 = np.fft.fftn(V1).T
-    image1 = np.fft.ifftn(ft_psf * ft_V1)
+    # Get the gridded locations, indexed (x, y, z), and blur them into
+    # images indexed (z, y, x)
+    V1 = get_gridded_locations(cell1.diagonal(), r, atoms1).T.astype(dtype)
+    image1 = irfftn(ft_psf * rfftn(V1), V1.shape)
 
-    V2 = get_gridded_locations(cell2.diagonal(), r, atoms2)
-    ft_V2 = np.fft.fftn(V2).T
-    image2 = np.fft.ifftn(ft_psf * ft_V2)
+    V2 = get_gridded_locations(cell2.diagonal(), r, atoms2).T.astype(dtype)
+    image2 = irfftn(ft_psf * rfftn(V2), V2.shape)
 
     # Use cross-correlation to calculate the ideal offset
+    from scipy.signal import fftconvolve
     correlation = fftconvolve(image2, image1[::-1, ::-1, ::-1], mode='full')
     z_max, y_max, x_max = np.unravel_index(np.argmax(correlation), correlation.shape)
     x_shift = (x_max - image1.shape[2] + 1) / r
@@ -175,7 +144,7 @@ def get_gridded_locations(dimensions, r, individual):
     dy = ymax/ny
     dz = zmax/nz
 
-    ax, ay, az = individual.get_positions().T
+    ax, ay, az = individual.positions.T
 
     # Assign atom to the bottom left of the grid point
     ix, iy, iz = np.floor(ax / dx), np.floor(ay / dy), np.floor(az / dz)
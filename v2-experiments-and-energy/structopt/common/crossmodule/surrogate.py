@@ -0,0 +1,190 @@
+"""A surrogate model of the energy per atom, trained online.
+
+Each structure is described by symmetry functions summed over its atoms
+and divided by the number of atoms: radial functions
+
+    G_k(i) = sum_j exp(-eta (r_ij - r_k)^2) f_c(r_ij),
+
+resolved by the elements of atom i and of its neighbors j, with
+f_c(r) = (cos(pi r / r_c) + 1) / 2, and the Steinhardt order parameters
+q_l(i) of the bonds of each atom as angular functions, resolved by the
+element of atom i. The composition and N^(-1/3) are added to them. The
+neighbors come from a k-d tree, without periodic images.
+
+The energies are fitted with Bayesian ridge regression on the
+standardized descriptors. The model keeps only the sums of the
+descriptors and energies and of their products, so training on another
+generation costs the same however many structures were seen before, and
+the whole model is a few small arrays that can be saved and reloaded.
+"""
+
+import numpy as np
+
+
+class Surrogate(object):
+    """Bayesian ridge regression of the energy per atom.
+
+    Parameters
+    ----------
+    cutoff : float
+        The neighbor cutoff of the symmetry functions.
+    n_radial : int
+        The number of radial functions per pair of elements, centered
+        evenly between 1 and `cutoff`.
+    lmax : int
+        The angular functions are q_l for l = 1 ... lmax.
+    alpha : float
+        The ridge regularization of the standardized descriptors.
+    elements : list of int
+        The atomic numbers the model describes. Taken from the first
+        structures it is trained on if not given.
+    """
+
+    def __init__(self, cutoff=6.0, n_radial=8, lmax=6, alpha=1.0, elements=None):
+        self.cutoff = cutoff
+        self.n_radial = n_radial
+        self.lmax = lmax
+        self.alpha = alpha
+        self.elements = None if elements is None else sorted(elements)
+        self.n = 0
+        self.sums = None
+        self._solution = None
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def size(self):
+        """The number of descriptors."""
+        ne = len(self.elements)
+        return ne * ne * self.n_radial + ne * self.lmax + ne + 1
+
+    def features(self, structures):
+        """Returns the descriptors of `structures` (Atoms) as a
+        (len(structures), size) array, with rows of NaN for those with
+        elements the model does not describe."""
+        from structopt.common.crossmodule.bond_order import get_bonds, bond_order, order_parameters
+
+        ne = len(self.elements)
+        centers = np.linspace(1.0, self.cutoff, self.n_radial)
+        eta = 0.5 / (centers[1] - centers[0])**2 if self.n_radial > 1 else 1.0
+        l_set = np.arange(1, self.lmax + 1)
+        _, q_lm = bond_order(structures, l_set, self.cutoff, per_atom=True)
+
+        index = {z: k for k, z in enumerate(self.elements)}
+        features = np.full((len(structures), self.size), np.nan)
+        for s, structure in enumerate(structures):
+            kinds = np.array([index.get(z, -1) for z in structure.numbers], dtype=int)
+            if len(structure) == 0 or (kinds < 0).any():
+                continue
+            n = len(structure)
+
+            pairs, vectors = get_bonds(np.asarray(structure.positions, dtype=float), self.cutoff)
+            r = np.sqrt((vectors**2).sum(axis=1))
+            fc = 0.5 * (np.cos(np.pi * r / self.cutoff) + 1)
+            g = np.exp(-eta * (r[:, None] - centers)**2) * fc[:, None]
+            # Each bond contributes to both of its atoms
+            i, j = np.concatenate((pairs[:, 0], pairs[:, 1])), np.concatenate((pairs[:, 1], pairs[:, 0]))
+            g = np.concatenate((g, g))
+            radial = np.zeros((ne * ne, self.n_radial))
+            np.add.at(radial, kinds[i] * ne + kinds[j], g)
+
+            q_l = order_parameters(q_lm[s], l_set)
+            angular = np.zeros((ne, self.lmax))
+            np.add.at(angular, kinds, q_l)
+
+            composition = np.bincount(kinds, minlength=ne)
+            features[s, :-1] = np.concatenate((radial.ravel(), angular.ravel(), composition)) / n
+            features[s, -1] = n**(-1 / 3)
+        return features
+
+    def update(self, structures, energies, features=None):
+        """Trains the model on more structures and their energies per
+        atom. `features` may be given instead of being computed from the
+        structures; rows of NaN are skipped."""
+        if self.elements is None:
+            self.elements = sorted(set(np.concatenate([structure.numbers for structure in structures])))
+        if features is None:
+            features = self.features(structures)
+        features = np.asarray(features, dtype=float).reshape(-1, self.size)
+        energies = np.asarray(energies, dtype=float)
+        keep = np.isfinite(features).all(axis=1) & np.isfinite(energies)
+        x, y = features[keep], energies[keep]
+
+        if self.sums is None:
+            d = self.size
+            self.sums = {'x': np.zeros(d), 'y': 0.0, 'xx': np.zeros((d, d)), 'xy': np.zeros(d), 'yy': 0.0}
+        self.sums['x'] += x.sum(axis=0)
+        self.sums['y'] += y.sum()
+        self.sums['xx'] += x.T.dot(x)
+        self.sums['xy'] += x.T.dot(y)
+        self.sums['yy'] += y.dot(y)
+        self.n += len(y)
+        self._solution = None
+        return len(y)
+
+    def solve(self):
+        """Returns the means and scales of the descriptors, the mean
+        energy, the weights of the standardized descriptors, the inverse
+        of the regularized normal matrix and the noise variance."""
+        if self._solution is not None:
+            return self._solution
+        n, sums = self.n, self.sums
+        mx, my = sums['x'] / n, sums['y'] / n
+        cxx = sums['xx'] - n * np.outer(mx, mx)
+        cxy = sums['xy'] - n * mx * my
+        cyy = sums['yy'] - n * my * my
+
+        # Descriptors that do not vary (beyond rounding errors) are left
+        # unscaled
+        variance = np.diag(cxx) / n
+        constant = variance <= 1e-10 * np.diag(sums['xx']) / n
+        scale = np.sqrt(np.where(constant, 1.0, variance))
+        gram = cxx / np.outer(scale, scale)
+        b = cxy / scale
+        inverse = np.linalg.inv(gram + self.alpha * np.eye(len(b)))
+        w = inverse.dot(b)
+
+        rss = max(cyy - 2 * w.dot(b) + w.dot(gram).dot(w), 0.0)
+        dof = np.trace(gram.dot(inverse))
+        noise = rss / max(n - dof - 1, 1.0)
+        self._solution = mx, scale, my, w, inverse, noise
+        return self._solution
+
+    def predict(self, structures, features=None):
+        """Returns the predicted energies per atom of `structures` and
+        their standard deviations, NaN and infinity for those the model
+        cannot describe or before it was trained."""
+        mean = np.full(len(structures), np.nan)
+        std = np.full(len(structures), np.inf)
+        if self.n < 2:
+            return mean, std
+        if features is None:
+            features = self.features(structures)
+        mx, scale, my, w, inverse, noise = self.solve()
+        ok = np.isfinite(features).all(axis=1)
+        x = (features[ok] - mx) / scale
+        mean[ok] = my + x.dot(w)
+        std[ok] = np.sqrt(noise * (1 + np.einsum('ij,jk,ik->i', x, inverse, x)))
+        return mean, std
+
+    def save(self, filename):
+        """Saves the model to an .npz file."""
+        arrays = {'settings': [self.cutoff, self.n_radial, self.lmax, self.alpha, self.n],
+                  'elements': self.elements if self.elements is not None else []}
+        if self.sums is not None:
+            arrays.update({'sum_' + name: value for name, value in self.sums.items()})
+        np.savez(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """Loads a model saved with `save`."""
+        with np.load(filename) as data:
+            cutoff, n_radial, lmax, alpha, n = data['settings']
+            elements = [int(e) for e in data['elements']] or None
+            model = cls(cutoff, int(n_radial), int(lmax), alpha, elements)
+            model.n = int(n)
+            if 'sum_x' in data:
+                model.sums = {name: data['sum_' + name] for name in ['x', 'y', 'xx', 'xy', 'yy']}
+                model.sums['y'], model.sums['yy'] = float(model.sums['y']), float(model.sums['yy'])
+        return model
@@ -1,5 +1,6 @@
 import logging
 import random
+import numbers
 import ase
 from importlib import import_module
 import numpy as np
@@ -8,6 +9,26 @@ import structopt
 from structopt.tools import root, single_core, parallel
 from .generate_velocities.random_velocities import random_velocities
 
+class _Atom(ase.Atom):
+    """An ase.Atom that unshares its individual's copy-on-write array
+    before writing into it."""
+
+    def set(self, name, value):
+        if self.atoms is not None:
+            plural = 'numbers' if name == 'symbol' else ase.atom.names[name][0]
+            self.atoms._unshare_array(plural)
+        super().set(name, value)
+
+    def _set_coordinate(self, index, value):
+        position = self.position.copy()
+        position[index] = value
+        self.position = position
+
+    x = property(lambda self: self.position[0], lambda self, value: self._set_coordinate(0, value))
+    y = property(lambda self: self.position[1], lambda self, value: self._set_coordinate(1, value))
+    z = property(lambda self: self.position[2], lambda self, value: self._set_coordinate(2, value))
+
+
 class Individual(ase.Atoms):
     """An abstract base class for a structure."""
 
@@ -30,6 +51,11 @@ class Individual(ase.Atoms):
         self._fitted = False
         self._relaxed = False
         self._fitness = None
+        self.fitness_level = 0
+        self.rejected_at = None
+        # Indices of the atoms mutations changed since the last relaxation,
+        # or None if anything may have changed
+        self.touched = None
         self._Q_l = np.array([])
 
         cls_name = self.__class__.__name__.lower()
@@ -126,7 +152,8 @@ class Individual(ase.Atoms):
         # method to avoid modifying the original state.
         state = self.__dict__.copy()
         # Remove the unpicklable entries. The unpickled object WILL NOT have these attributes at all!
-        for name in ['fitnesses', 'relaxations', 'mutations', 'pso_moves']:
+        # The STEM state is only a cache and is cheaper to recompute than to send.
+        for name in ['fitnesses', 'relaxations', 'mutations', 'pso_moves', '_STEM_state', '_STEM_products', '_FEMSIM_state']:
             if name in state:
                 del state[name]
         return state
@@ -139,6 +166,50 @@ class Individual(ase.Atoms):
             self.load_modules()
 
 
+    def __getitem__(self, i):
+        if isinstance(i, numbers.Integral):
+            natoms = len(self)
+            if i < -natoms or i >= natoms:
+                raise IndexError('Index out of range.')
+            return _Atom(atoms=self, index=i)
+        return super().__getitem__(i)
+
+
+    def set_array(self, name, a, dtype=None, shape=None):
+        b = self.arrays.get(name)
+        if a is not None and b is not None and not b.flags.writeable:
+            # A copy-on-write array: replace it instead of writing into the shared buffer
+            a = np.asarray(a)
+            if a.shape != b.shape:
+                raise ValueError('Array has wrong shape %s != %s.' % (a.shape, b.shape))
+            self.arrays[name] = a.astype(b.dtype)
+        else:
+            super().set_array(name, a, dtype, shape)
+
+
+    def _unshare_array(self, name):
+        """Materialize a private copy of a copy-on-write array."""
+        a = self.arrays.get(name)
+        if a is not None and not a.flags.writeable:
+            self.arrays[name] = a.copy()
+
+
+    def translate(self, displacement):
+        self.set_positions(self.arrays['positions'] + np.array(displacement))
+
+
+    def rotate(self, *args, **kwargs):
+        # ase.Atoms.rotate writes into the positions array in place
+        self._unshare_array('positions')
+        super().rotate(*args, **kwargs)
+
+
+    def set_distance(self, *args, **kwargs):
+        # ase.Atoms.set_distance writes into the positions array in place
+        self._unshare_array('positions')
+        super().set_distance(*args, **kwargs)
+
+
     def __str__(self):
         return '<Individual {}>'.format(self.id)
     __repr__ = __str__
@@ -181,13 +252,40 @@ class Individual(ase.Atoms):
     @property
     @single_core
     def velocities(self):
-        return self.get_velocities()
+        """A read-only array of the atom velocities.
+
+        ase stores momenta rather than velocities, so this is computed from
+        the momenta and masses on every access; bind it to a local name in
+        loops. Use `get_velocities()` for a mutable array.
+        """
+        velocities = self.get_velocities()
+        if velocities is not None:
+            velocities.flags.writeable = False
+        return velocities
+
+
+    @velocities.setter
+    def velocities(self, velocities):
+        self.set_velocities(velocities)
 
 
     @property
     @single_core
     def positions(self):
-        return self.get_positions()
+        """A read-only, zero-copy view of the atom positions.
+
+        The view shares memory with the individual, so it reflects any later
+        change to the positions. Use `get_positions()` for a mutable copy and
+        `set_positions()` to write positions back.
+        """
+        positions = self.arrays['positions'].view()
+        positions.flags.writeable = False
+        return positions
+
+
+    @positions.setter
+    def positions(self, positions):
+        self.set_positions(positions)
 
     def wrap(self, center=(0.5, 0.5, 0.5), pbc=None, eps=1e-7):
         if pbc is None:
@@ -195,6 +293,39 @@ class Individual(ase.Atoms):
         self.set_positions(ase.geometry.wrap_positions(
             self.positions, self.cell, pbc, center, eps))
 
+    def center(self, vacuum=None, axis=(0, 1, 2), about=None):
+        # ase.Atoms.center writes through self.positions, which is read-only here
+        atoms = ase.Atoms(positions=self.get_positions(),
+                          cell=self.get_cell(), pbc=self.get_pbc())
+        atoms.center(vacuum=vacuum, axis=axis, about=about)
+        self.set_cell(atoms.get_cell())
+        self.set_positions(atoms.get_positions())
+
+    def set_scaled_positions(self, scaled):
+        self.set_positions(np.dot(scaled, self.get_cell(complete=True)))
+
+    def set_cell(self, cell, scale_atoms=False):
+        # ase.Atoms.set_cell scales the atoms through self.positions, which is read-only here
+        if not scale_atoms:
+            return super().set_cell(cell)
+        new = ase.Atoms(cell=cell).get_cell(complete=True)
+        M = np.linalg.solve(self.get_cell(complete=True), new)
+        positions = np.dot(self.arrays['positions'], M)
+        super().set_cell(cell)
+        self.set_positions(positions, apply_constraint=False)
+
+    def _masked_rotate(self, center, axis, diff, mask):
+        # Used by set_dihedral, rotate_dihedral and set_angle. ase.Atoms
+        # writes the rotated atoms through self.positions, which is read-only here
+        mask = np.asarray(mask, dtype=bool)
+        group = ase.Atoms(positions=self.arrays['positions'][mask])
+        group.translate(-np.asarray(center))
+        group.rotate(axis, diff)
+        group.translate(center)
+        positions = self.get_positions()
+        positions[mask] = group.get_positions()
+        self.set_positions(positions, apply_constraint=False)
+
     @property
     @single_core
     def fits(self):
@@ -284,9 +415,16 @@ class Individual(ase.Atoms):
                              pso_moves_parameters=self.pso_moves_parameters,
                              generator_parameters=None)
         if include_atoms:
+            # Share the atom arrays copy-on-write: both individuals hold
+            # read-only views of the same buffers, and whichever writes to
+            # an array first materializes its own copy of it. Every
+            # ase.Atoms method that writes in place goes through
+            # _unshare_array or set_array, so neither individual loses the
+            # ability to change its atoms
             new.arrays = {}
             for name, a in self.arrays.items():
-                new.arrays[name] = a.copy()
+                a.flags.writeable = False
+                new.arrays[name] = a.view()
         else:
             new.clear()
         new.set_cell(self.get_cell())
@@ -296,7 +434,20 @@ class Individual(ase.Atoms):
         new._fitted = self._fitted
         new._relaxed = self._relaxed
         new._fitness = self._fitness
+        new.fitness_level = self.fitness_level
+        new.rejected_at = self.rejected_at
+        if self.rejected_at is not None:
+            new.cascade_penalty = self.cascade_penalty
+        new.touched = self.touched if include_atoms else None
         new._Q_l = self._Q_l
+        if include_atoms:
+            # The STEM and FEMSIM states, the STEM products and the column
+            # grouping are never modified in place and check that they
+            # match the structure before use, so they can be shared with
+            # the copy
+            for name in ['_STEM_state', '_STEM_products', '_FEMSIM_state', '_columns']:
+                if name in self.__dict__:
+                    setattr(new, name, getattr(self, name))
         if self.fitnesses is not None:
             for module_name in self.fitnesses.module_names:
                 setattr(new, module_name, getattr(self, module_name, None))
@@ -7,11 +7,32 @@ import time
 import gparameters
 from structopt.io import write_xyz
 from structopt.tools import root, single_core, parallel
+from structopt.tools.parallel import MPMD_INPUT_TAG, MPMD_RESULT_TAG, MPMD_DONE_TAG
 from structopt.common.crossmodule.exceptions import FEMSIMError
 
 
 class FEMSIM(object):
-    """Contains parameters and functions for running FEMSIM through Python."""
+    """Contains parameters and functions for running FEMSIM through Python.
+
+    The ``transfer`` kwarg selects how femsim gets the model and returns
+    V(k). With ``"files"`` (the default) the model and a parameter file
+    are written for each individual and V(k) is read back from femsim's
+    output file. With ``"intercomm"`` femsim is started with the
+    arguments ``<base> intercomm`` and the model and V(k) are exchanged
+    as messages over the spawn intercommunicator, without touching the
+    filesystem (see `send_model` and `receive_model`). This requires a
+    femsim build that implements that protocol.
+
+    The ``engine`` kwarg selects the simulation. ``"femsim"`` (the
+    default) runs the femsim program. ``"numpy"`` computes V(k) in Python
+    with `structopt.common.crossmodule.fem.FEMSimulator`, which needs no
+    external program and is run on the ranks like the STEM fitness. Its
+    intensities for every rotation and pixel are kept on the individual
+    (and its copies) so that when a mutation moves a few atoms, only the
+    atom pairs involving those atoms are recomputed. They take
+    ``nphi * npsi * ntheta * npixels * nk`` doubles per individual; set
+    the ``incremental`` kwarg to false to not keep them.
+    """
 
     @single_core
     def __init__(self, parameters):
@@ -27,8 +48,21 @@ class FEMSIM(object):
         self.base = None
         self.folder = None
         self.paramfilename = None
+        self.simulator = None
 
         assert self.parameters.kwargs.xsize == self.parameters.kwargs.ysize == self.parameters.kwargs.zsize
+        assert self.transfer in ('files', 'intercomm')
+        assert self.engine in ('femsim', 'numpy')
+
+
+    @property
+    def transfer(self):
+        return self.parameters.kwargs.get('transfer', 'files')
+
+
+    @property
+    def engine(self):
+        return self.parameters.kwargs.get('engine', 'femsim')
 
 
     @single_core
@@ -58,6 +92,8 @@ class FEMSIM(object):
         https://github.com/mpi4py/mpi4py/blob/2acfc552c42846628304e54a3b87e2bf3a59af07/src/mpi4py/MPI/Comm.pyx#L1555
         """
         femsim_command = os.environ['FEMSIM_COMMAND']
+        if self.transfer == 'intercomm':
+            return {'command': femsim_command, 'args': [self.base, 'intercomm'], 'info': {}}
         args = [self.base, self.paramfilename]
         info = {'wdir': self.folder}
         return {'command': femsim_command, 'args': args, 'info': info}
@@ -70,6 +106,11 @@ class FEMSIM(object):
 
         logger.info('Received individual HI = {0} for FEMSIM evaluation'.format(individual.id))
 
+        self.base = 'indiv{i}'.format(i=individual.id)
+        if self.transfer == 'intercomm':
+            self.prepare_model(individual)
+            return
+
         # Make individual folder and copy files there
         self.folder = os.path.abspath(os.path.join(self.parameters.path, 'FEMSIM/generation{gen}/individual{i}'.format(gen=gparameters.generation, i=individual.id)))
         os.makedirs(self.folder, exist_ok=True)
@@ -80,19 +121,24 @@ class FEMSIM(object):
         shutil.copy(self.parameters.kwargs.parameter_filename, self.paramfilename)
         self.write_paramfile(individual)
 
-        self.base = 'indiv{i}'.format(i=individual.id)
-
 
     @single_core
-    def write_paramfile(self, individual):
-        # Write structure file to disk so that the fortran femsim can read it in
+    def prepare_model(self, individual):
+        # Wrap the structure into the femsim box
         individual.set_cell([[self.parameters.kwargs.xsize, 0., 0.], [0., self.parameters.kwargs.ysize, 0.], [0., 0., self.parameters.kwargs.zsize]])
         individual.wrap()
+        positions = individual.positions
         for index in range(0, 3):
-            lo = np.amin(individual.get_positions()[:, index])
-            hi = np.amax(individual.get_positions()[:, index])
+            lo = np.amin(positions[:, index])
+            hi = np.amax(positions[:, index])
             assert lo >= 0
             assert hi <= self.parameters.kwargs.xsize
+
+
+    @single_core
+    def write_paramfile(self, individual):
+        # Write structure file to disk so that the fortran femsim can read it in
+        self.prepare_model(individual)
         comment = "{} {} {}".format(self.parameters.kwargs.xsize, self.parameters.kwargs.ysize, self.parameters.kwargs.zsize)
         filename = os.path.join(gparameters.logging.path, 'modelfiles', 'individual{id}.xyz'.format(id=individual.id))
         write_xyz(filename, individual, comment=comment)
@@ -125,7 +171,133 @@ class FEMSIM(object):
         return vk
 
 
+    @single_core
+    def send_model(self, intercomm, rank, individual):
+        """Sends the model to the femsim program whose first rank is `rank`
+        in the remote group of `intercomm` (see `receive_model`)."""
+        from mpi4py import MPI
+
+        kwargs = self.parameters.kwargs
+        header = np.array([len(individual), len(self.k), kwargs.nphi, kwargs.npsi, kwargs.ntheta], dtype=np.int32)
+        sizes = np.array([kwargs.xsize, kwargs.ysize, kwargs.zsize, kwargs.Q], dtype=np.float64)
+        intercomm.Send([header, MPI.INT], dest=rank, tag=MPMD_INPUT_TAG)
+        intercomm.Send([sizes, MPI.DOUBLE], dest=rank, tag=MPMD_INPUT_TAG)
+        intercomm.Send([np.ascontiguousarray(individual.positions, dtype=np.float64), MPI.DOUBLE], dest=rank, tag=MPMD_INPUT_TAG)
+        intercomm.Send([individual.numbers.astype(np.int32), MPI.INT], dest=rank, tag=MPMD_INPUT_TAG)
+        intercomm.Send([self.k.astype(np.float64), MPI.DOUBLE], dest=rank, tag=MPMD_INPUT_TAG)
+
+
+    @single_core
+    def receive_vk(self, intercomm, rank, individual):
+        """Receives V(k) from the femsim program whose first rank is `rank`
+        in the remote group of `intercomm` (see `send_vk`)."""
+        from mpi4py import MPI
+
+        vk = np.empty(len(self.k), dtype=np.float64)
+        intercomm.Recv([vk, MPI.DOUBLE], source=rank, tag=MPMD_RESULT_TAG)
+        return vk
+
+
+    @single_core
+    def get_simulator(self):
+        """Returns the `FEMSimulator` of the ``numpy`` engine."""
+        if self.simulator is None:
+            from structopt.common.crossmodule.fem import FEMSimulator
+            kwargs = self.parameters.kwargs
+            self.simulator = FEMSimulator(kwargs.xsize, self.k, kwargs.Q, kwargs.nphi, kwargs.npsi, kwargs.ntheta)
+        return self.simulator
+
+
+    @single_core
+    def calculate_vk(self, individual):
+        """Computes V(k) of an individual with the ``numpy`` engine.
+
+        When the individual (or the individual it was copied from) was
+        evaluated before and fewer than a quarter of its atoms changed
+        since, the kept intensities are updated for the changed atoms
+        instead of being recomputed. The simulator wraps the positions into
+        the box itself, so the individual is not modified.
+        """
+        from structopt.common.crossmodule.fem import variance
+        from structopt.tools import changed_atoms
+
+        simulator = self.get_simulator()
+        positions = individual.get_positions()
+        numbers = individual.get_atomic_numbers()
+        kwargs = self.parameters.kwargs
+        key = (kwargs.xsize, kwargs.Q, kwargs.nphi, kwargs.npsi, kwargs.ntheta, self.k.tobytes())
+
+        state = getattr(individual, '_FEMSIM_state', None)
+        intensities = None
+        if state is not None and state['key'] == key:
+            old, new = changed_atoms(state['positions'], state['numbers'], positions, numbers)
+            if len(old) + len(new) < len(positions) / 4:
+                unchanged = np.ones(len(positions), bool)
+                unchanged[new] = False
+                intensities = simulator.update(state['intensities'],
+                                               (positions[unchanged], numbers[unchanged]),
+                                               (state['positions'][old], state['numbers'][old]),
+                                               (positions[new], numbers[new]))
+        if intensities is None:
+            intensities = simulator.intensities(positions, numbers)
+
+        if kwargs.get('incremental', True):
+            individual._FEMSIM_state = {'key': key, 'positions': positions, 'numbers': numbers,
+                                        'intensities': intensities}
+        return variance(intensities)
+
+
+    @single_core
+    def calculate_fitness(self, individual):
+        """The chi^2 of V(k) of an individual with the ``numpy`` engine."""
+        return self.chi2(self.calculate_vk(individual))
+
+
     @single_core
     def chi2(self, vk):
         return np.sum(((self.vk - vk) / self.vk_err)**2) / len(self.k)
 
+
+def receive_model(parent):
+    """The femsim side of `FEMSIM.send_model`: receives the model from the
+    parent intercommunicator (``MPI.Comm.Get_parent()``). Programs spawned
+    together share ``MPI.COMM_WORLD``; this is called on the first rank of
+    each program, i.e. rank 0 of ``MPI.COMM_WORLD`` split by
+    ``MPI.APPNUM``. The messages, all with tag ``MPMD_INPUT_TAG``, are:
+
+    1. int32 ``[natoms, nk, nphi, npsi, ntheta]``
+    2. float64 ``[xsize, ysize, zsize, Q]``
+    3. float64 positions, natoms x 3 in row-major order
+    4. int32 atomic numbers, natoms
+    5. float64 k, nk
+
+    Returns:
+        dict: the received values by name
+    """
+    from mpi4py import MPI
+
+    header = np.empty(5, dtype=np.int32)
+    parent.Recv([header, MPI.INT], source=0, tag=MPMD_INPUT_TAG)
+    natoms, nk, nphi, npsi, ntheta = (int(value) for value in header)
+    sizes = np.empty(4, dtype=np.float64)
+    parent.Recv([sizes, MPI.DOUBLE], source=0, tag=MPMD_INPUT_TAG)
+    positions = np.empty((natoms, 3), dtype=np.float64)
+    parent.Recv([positions, MPI.DOUBLE], source=0, tag=MPMD_INPUT_TAG)
+    numbers = np.empty(natoms, dtype=np.int32)
+    parent.Recv([numbers, MPI.INT], source=0, tag=MPMD_INPUT_TAG)
+    k = np.empty(nk, dtype=np.float64)
+    parent.Recv([k, MPI.DOUBLE], source=0, tag=MPMD_INPUT_TAG)
+    xsize, ysize, zsize, Q = sizes
+    return {'positions': positions, 'numbers': numbers, 'k': k, 'size': (xsize, ysize, zsize),
+            'Q': Q, 'nphi': nphi, 'npsi': npsi, 'ntheta': ntheta}
+
+
+def send_vk(parent, vk, code=0):
+    """The femsim side of `FEMSIM.receive_vk`: sends V(k) (float64, nk,
+    tag ``MPMD_RESULT_TAG``) followed by the completion code (int32, tag
+    ``MPMD_DONE_TAG``) to the parent. On failure, send any V(k) of the
+    right length and a nonzero code."""
+    from mpi4py import MPI
+
+    parent.Send([np.ascontiguousarray(vk, dtype=np.float64), MPI.DOUBLE], dest=0, tag=MPMD_RESULT_TAG)
+    parent.Send([np.array([code], dtype=np.int32), MPI.INT], dest=0, tag=MPMD_DONE_TAG)
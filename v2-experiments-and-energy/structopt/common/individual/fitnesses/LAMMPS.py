@@ -2,7 +2,8 @@ import numpy as np
 from scipy.interpolate import interp1d
 import os
 
-from ase.calculators.lammpsrun import LAMMPS as lammps
+from structopt.common.crossmodule.lammps import LAMMPS as lammps
+from structopt.common.crossmodule.exceptions import LAMMPSTimeout
 
 from structopt.tools import root, single_core, parallel
 from structopt.tools.dictionaryobject import DictionaryObject
@@ -50,6 +51,8 @@ class LAMMPS(object):
         # These variables never change
         self.parameters = parameters
         self.output_dir = gparameters.logging.path
+        # Overrides the timeout kwarg, see structopt.common.population.stragglers
+        self.timeout = None
 
 
     @single_core
@@ -69,7 +72,10 @@ class LAMMPS(object):
             calcdir = os.path.join(self.output_dir, 'fitness/LAMMPS/generation{}/individual{}'.format(gparameters.generation, individual.id))
             rank = gparameters.mpi.rank
 
-            calc = lammps(self.parameters.kwargs, calcdir=calcdir)
+            parameters = self.parameters.kwargs
+            if self.timeout is not None:
+                parameters = dict(parameters, timeout=self.timeout)
+            calc = lammps(parameters, calcdir=calcdir)
             individual.set_calculator(calc)
             try:
                 # We will manually run the lammps calculator's calculate.
@@ -81,6 +87,10 @@ class LAMMPS(object):
                 calc.calculate(individual, trj_file=trj_file)
                 E = individual.get_potential_energy()
                 print("Finished calculating fitness of individual {} on rank {} with LAMMPS".format(individual.id, rank))
+            except LAMMPSTimeout:
+                E = np.inf
+                individual._timed_out = True
+                print("Timed out calculating fitness of individual {} on rank {} with LAMMPS".format(individual.id, rank))
             except RuntimeError:
                 E = np.inf
                 print("Error calculating fitness of individual {} on rank {} with LAMMPS".format(individual.id, rank))
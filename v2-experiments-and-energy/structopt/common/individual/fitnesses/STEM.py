@@ -1,17 +1,23 @@
 import os
 import math
+import hashlib
 import logging
 import numpy as np
-from scipy.signal import fftconvolve
 from scipy.ndimage import sobel
-from scipy.optimize import fmin
 
 from ase.io import read
 
-from structopt.tools import root, single_core, parallel
+from structopt.tools import root, single_core, parallel, changed_atoms, atom_ids
 from structopt.tools.dictionaryobject import DictionaryObject
+from structopt.tools.fft import get_dtype, rfftn, irfftn, hermitian_half, hermitian_full
 import gparameters
 
+# Approximate cost, in ns, of an FFT per pixel and log2(pixels), and of
+# stamping one PSF value. Used by STEM.use_splat.
+FFT_COST = 7.0
+SPLAT_COST = 14.0
+
+
 class STEM(object):
     """Calculates the chi^2 difference between a simulated and experimental image.
     In order to calculate a z-contrast image and chi^2 function the following
@@ -26,6 +32,32 @@ class STEM(object):
         The x and y dimensions of STEM image.
     resolution : float
         The pixels per angstrom resolution
+    psf_tolerance : float
+        The fraction of its peak below which the real-space PSF is truncated
+        for stamping. Defaults to 1e-6.
+    imaging : str
+        How images are computed: 'fft' convolves the whole image with the
+        PSF, 'splat' stamps the truncated PSF of each atom in real space and
+        'auto' (the default) picks the cheaper one for the number of atoms.
+    upsample_factor : int
+        Shifts between the image and the target are resolved to 1 /
+        upsample_factor of a pixel when aligning. Defaults to 100.
+    pyramid_levels : int
+        The number of coarser levels, each at half the resolution of the
+        previous one, that the population is first evaluated on. Individuals
+        are only evaluated at the next finer level if their fitness beats
+        the `pyramid_quantile` quantile of the population at the current
+        level. Defaults to 0, evaluating everything at full resolution.
+    pyramid_quantile : float
+        See `pyramid_levels`. Defaults to 0.5.
+    refresh_interval : int
+        The number of times the image kept on an individual is updated for
+        the atoms that changed before it is recomputed from scratch (see
+        `get_projected_image`). Defaults to 20.
+    precision : str
+        'double' (the default) or 'single'. In single precision, images,
+        the target and their FFTs are stored and transformed as float32,
+        which halves their memory and is enough to rank HAADF images.
     """
 
     @single_core
@@ -36,7 +68,12 @@ class STEM(object):
         self.parameters.setdefault('kwargs', {})
         self.parameters['kwargs'].setdefault('zed', 1)
         self.psf = None
+        self.psf_ft = None
+        self.psf_kernel = None
+        self.psf_stamps = None
         self.target = None
+        self.target_ft = None
+        self.pyramid = {}
         self.phantom = True
 
         # If running within StructOpt, create directory for saving files
@@ -46,41 +83,166 @@ class STEM(object):
         self.path = path
         os.makedirs(self.path, exist_ok=True)
 
-    def calculate_fitness(self, individual):
+    def calculate_fitness(self, individual, level=0):
         """Calculates the fitness of an individual with respect to a target
-        image. Normalize this fitness by the number of atoms."""
+        image. Normalize this fitness by the number of atoms. The image is
+        simulated and compared at the given pyramid `level` (see
+        `get_level`)."""
+        return self.fitness_batch([individual], level)[0]
+
+    def fitness_batch(self, individuals, level=0):
+        """Returns `calculate_fitness` of each of `individuals`, aligning
+        all of their images to the target with batched FFTs."""
+        if level == 0:
+            chis = [products['contrast'] for products in self.get_products_batch(individuals)]
+        else:
+            module = self.get_level(level)
+            if module.target is None:
+                module.generate_target()
+            aligned = module.cross_correlate_batch([module.get_image(individual) for individual in individuals])
+            chis = [image - module.target for image, x_shift, y_shift in aligned]
+
+        return [self.normalize(chi, individual, level) for chi, individual in zip(chis, individuals)]
+
+    def get_products(self, individual):
+        """Returns the intermediates of comparing `individual` to the
+        target as a dict: the simulated 'image', the 'contrast' between
+        the aligned image and the target and the (x, y) pixel 'shift' of
+        the alignment.
+
+        The products are kept on the individual (and its copies), tagged
+        with a hash of its structure and the imaging parameters, so the
+        STEM mutations reuse what the fitness computed. They are
+        recomputed once the positions, numbers or parameters change. The
+        arrays are read-only.
+        """
+        return self.get_products_batch([individual])[0]
+
+    def get_products_batch(self, individuals):
+        """`get_products` for several individuals. The images that have to
+        be aligned are aligned together, see `cross_correlate_batch`."""
+        keys = [(structure_hash(individual), self.get_key(), str(self.parameters['kwargs'].get('target')),
+                 repr(self.parameters['kwargs'].get('multislice'))) for individual in individuals]
+        stale = []
+        for individual, key in zip(individuals, keys):
+            products = getattr(individual, '_STEM_products', None)
+            if products is None or products['key'] != key:
+                stale.append((individual, key))
+        if not stale:
+            return [individual._STEM_products for individual in individuals]
 
-        if self.psf is None:
-            self.generate_psf()
         if self.target is None:
             self.generate_target()
+        images = [self.get_image(individual) for individual, key in stale]
+        for (individual, key), image, (aligned, x_shift, y_shift) in zip(stale, images, self.cross_correlate_batch(images)):
+            contrast = aligned - self.target
+            image.flags.writeable = False
+            contrast.flags.writeable = False
+            individual._STEM_products = {'key': key, 'image': image, 'contrast': contrast, 'shift': (x_shift, y_shift)}
 
-        image = self.get_image(individual)
-        image, x_shift, y_shift = self.cross_correlate(image)
-
-        chi = image - self.target
-        chi = self.normalize(chi, individual)
-
-        return chi
+        return [individual._STEM_products for individual in individuals]
 
     def cross_correlate(self, image):
-        convolution = fftconvolve(self.target, image[::-1, ::-1], mode='full')
-        y_max, x_max = np.unravel_index(np.argmax(convolution), convolution.shape)
-        x_shift = x_max - image.shape[1] + 1
-        y_shift = y_max - image.shape[0] + 1
-        image = np.roll(image, x_shift, axis=1)
-        image = np.roll(image, y_shift, axis=0)
+        """Rolls `image` by the whole number of pixels that best matches it
+        to the target. Returns the rolled image and the x and y shifts."""
+        return self.cross_correlate_batch([image])[0]
+
+    def cross_correlate_batch(self, images, batch_size=16):
+        """`cross_correlate` for a list of images. The FFTs and
+        cross-correlations of up to `batch_size` images are computed as one
+        stacked transform."""
+        target_ft = self.get_target_spectrum()
+        results = []
+        for start in range(0, len(images), batch_size):
+            stack = np.stack(images[start:start + batch_size])
+            shape = stack.shape[1:]
+            correlations = irfftn(target_ft * rfftn(stack, axes=(1, 2)).conj(), shape, axes=(1, 2))
+            for image, correlation in zip(stack, correlations):
+                y_shift, x_shift = (int(shift) for shift in correlation_peak(correlation))
+                image = np.roll(image, x_shift, axis=1)
+                image = np.roll(image, y_shift, axis=0)
+                results.append((image, x_shift, y_shift))
+
+        return results
+
+    def get_shift(self, image, upsample_factor=None):
+        """Returns the (y, x) shift in pixels, to within 1/`upsample_factor`
+        of a pixel, that maximizes the cross-correlation of `image` with
+        the target. Defaults to the `upsample_factor` kwarg."""
+        if upsample_factor is None:
+            upsample_factor = self.parameters['kwargs'].get('upsample_factor', 100)
+
+        return register_translation(self.get_target_spectrum(), rfftn(image), image.shape, upsample_factor)
+
+    def get_target_spectrum(self):
+        """Returns the real FFT of the target, computed once per target."""
+        if self.target is None:
+            self.generate_target()
+        if self.target_ft is None or self.target_ft[0] is not self.target:
+            self.target_ft = (self.target, rfftn(self.target))
 
-        return image, x_shift, y_shift
+        return self.target_ft[1]
 
-    def normalize(self, chi, individual):
+    def get_psf_spectrum(self):
+        """Returns the PSF in FFT order, halved for real FFTs (see
+        `hermitian_half`), computed once per PSF."""
+        if self.psf is None:
+            self.generate_psf()
+        if self.psf_ft is None or self.psf_ft[0] is not self.psf:
+            spectrum = hermitian_half(np.fft.fftshift(self.psf)).astype(self.dtype)
+            self.psf_ft = (self.psf, spectrum)
+
+        return self.psf_ft[1]
+
+    @property
+    def dtype(self):
+        """The float dtype of images, set by the `precision` kwarg."""
+        return get_dtype(self.parameters['kwargs'].get('precision', 'double'))
+
+    def get_level(self, level):
+        """Returns the STEM module for `level` of the resolution pyramid. It
+        simulates images at 1/2**level of the resolution, with the PSF for
+        that grid, and compares them to the target Fourier-downsampled to
+        the same grid. Level 0 is this module."""
+        if level == 0:
+            return self
+
+        if level not in self.pyramid:
+            if self.target is None:
+                self.generate_target()
+
+            kwargs = dict(self.parameters['kwargs'])
+            kwargs['resolution'] = kwargs['resolution'] / 2**level
+            if isinstance(kwargs['dimensions'][0], int):
+                kwargs['dimensions'] = [n // 2**level for n in kwargs['dimensions']]
+            kwargs['pyramid_levels'] = 0
+
+            module = STEM({'kwargs': kwargs})
+            module.path = os.path.join(self.path, 'level-{}'.format(level))
+            os.makedirs(module.path, exist_ok=True)
+            # Bilinear splitting of the atoms over larger pixels blurs the
+            # image more than at full resolution; blur the target to match
+            nx, ny, dx, dy = module.get_grid()
+            fine_nx, fine_ny, fine_dx, fine_dy = self.get_grid()
+            spectrum = np.fft.fft2(fourier_downsample(self.target, (ny, nx)))
+            spectrum *= np.outer(bilinear_transfer(ny, dy, fine_dy), bilinear_transfer(nx, dx, fine_dx))
+            module.target = np.fft.ifft2(spectrum).real.astype(module.dtype)
+            self.pyramid[level] = module
+
+        return self.pyramid[level]
+
+    def normalize(self, chi, individual, level=0):
+        """Reduces the difference image `chi` to a single value. Images at
+        pyramid `level` have 4**level fewer pixels, each holding the
+        intensity of 4**level full resolution pixels; the root of the sum of
+        squares is scaled by 1/2**level to match full resolution values."""
         if 'normalize' not in self.parameters['kwargs']:
             return chi
 
         norms = self.parameters['kwargs']['normalize']
 
         if 'SSE' in norms and norms['SSE']:
-            chi = np.sum(np.square(chi)) ** 0.5
+            chi = np.sum(np.square(chi)) ** 0.5 / 2**level
             if 'nprotons' in norms and norms['nprotons']:
                 chi /= sum(individual.get_atomic_numbers()) ** 0.5
         else:
@@ -109,11 +271,15 @@ class STEM(object):
 
         return Z_diff
 
-    def get_linear_convolution(self, individual):
-        """Calculate linear convoluted potential of an individual"""
+    def get_key(self):
+        """Returns the parameters that determine the simulated image."""
+        nx, ny, dx, dy = self.get_grid()
+        kwargs = self.parameters['kwargs']
+        return (nx, ny, dx, dy, kwargs['zed'], kwargs['HWHM'], self.dtype)
 
+    def get_grid(self):
+        """Returns the number of pixels and the pixel size in x and y."""
         r = self.parameters['kwargs']['resolution']
-        zed = self.parameters['kwargs']['zed']
         xmax, ymax = self.parameters['kwargs']['dimensions']
         if isinstance(xmax, float):
             nx = int(xmax * r)
@@ -128,37 +294,193 @@ class STEM(object):
             dx = xmax / nx
             dy = ymax / ny
 
-        ax, ay, az = individual.get_positions().T
+        return nx, ny, dx, dy
+
+    def get_pixel_weights(self, positions, numbers):
+        """Splits the Z**zed weight of each atom over the four pixels around
+        it. Returns the x and y pixel indices and the weights, four per atom."""
+
+        zed = self.parameters['kwargs']['zed']
+        nx, ny, dx, dy = self.get_grid()
+        ax, ay = positions[:, 0], positions[:, 1]
 
         # Assign atom to the bottom left of the grid point
         ix, iy = np.floor(ax / dx), np.floor(ay / dy)
-        
+
         # Apply periodic boundary conditions, considering all
         # corners of each pixel
-        iax, ibx = np.fmod(ix, nx), np.fmod(ix + 1, nx)
-        iay, iby = np.fmod(iy, ny), np.fmod(iy + 1, ny)
+        iax, ibx = (ix % nx).astype(int), ((ix + 1) % nx).astype(int)
+        iay, iby = (iy % ny).astype(int), ((iy + 1) % ny).astype(int)
 
         # Array of fraction of atoms at the left and bottom of the pixel
-        fax = 1 - np.fmod(ax / dx, 1)
-        fay = 1 - np.fmod(ay / dy, 1)
-
-        # Add potentials to grid. Split up the potential into
-        # fractions on the pixel
-        Zatom = individual.get_atomic_numbers()
-        V1 = fax * fay * Zatom ** zed
-        V2 = (1 - fax) * fay * Zatom ** zed
-        V3 = fax * (1 - fay) * Zatom ** zed
-        V4 = (1 - fax) * (1 - fay) * Zatom ** zed
-
-        V = np.zeros([nx, ny])
-        for j in range(len(individual)):
-            V[int(iax[j]), int(iay[j])] += V1[j]
-            V[int(ibx[j]), int(iay[j])] += V2[j]
-            V[int(iax[j]), int(iby[j])] += V3[j]
-            V[int(ibx[j]), int(iby[j])] += V4[j]
+        fax = 1 - (ax / dx - ix)
+        fay = 1 - (ay / dy - iy)
+
+        # Split up the potential into fractions on the pixel
+        Zatom = np.asarray(numbers) ** zed
+        pixel_x = np.concatenate((iax, ibx, iax, ibx))
+        pixel_y = np.concatenate((iay, iay, iby, iby))
+        weights = np.concatenate((fax * fay * Zatom,
+                                  (1 - fax) * fay * Zatom,
+                                  fax * (1 - fay) * Zatom,
+                                  (1 - fax) * (1 - fay) * Zatom))
+
+        return pixel_x, pixel_y, weights
+
+    def get_linear_convolution(self, individual):
+        """Calculate linear convoluted potential of an individual"""
+
+        nx, ny, dx, dy = self.get_grid()
+        pixel_x, pixel_y, weights = self.get_pixel_weights(individual.positions,
+                                                           individual.get_atomic_numbers())
+        V = np.zeros([nx, ny], self.dtype)
+        scatter_add(V, (pixel_x, pixel_y), weights)
 
         return V
 
+    def get_psf_kernel(self):
+        """Returns the real-space PSF truncated to the pixels where it is
+        larger than `psf_tolerance` times its peak. The kernel is centered
+        at index (ry, rx) of the returned array."""
+
+        if self.psf_kernel is not None:
+            return self.psf_kernel
+
+        nx, ny, dx, dy = self.get_grid()
+        kernel = irfftn(self.get_psf_spectrum(), (ny, nx))
+        tolerance = self.parameters['kwargs'].get('psf_tolerance', 1e-6) * kernel[0, 0]
+        rx = min(np.argmax(np.absolute(kernel[0, :nx//2]) < tolerance) or nx//2, (nx - 1)//2)
+        ry = min(np.argmax(np.absolute(kernel[:ny//2, 0]) < tolerance) or ny//2, (ny - 1)//2)
+        kernel = np.roll(np.roll(kernel, ry, axis=0), rx, axis=1)[:2*ry+1, :2*rx+1]
+        self.psf_kernel = kernel
+
+        return kernel
+
+    def get_psf_stamps(self):
+        """Returns the truncated PSF shifted by zero and one pixel in y and
+        x, as a (2, 2, 2*ry+2, 2*rx+2) array indexed by the shifts. The
+        stamp of an atom is the bilinear blend of these four, which is the
+        PSF convolved with the atom's four pixels in `get_pixel_weights`."""
+
+        if self.psf_stamps is None:
+            kernel = self.get_psf_kernel()
+            ky, kx = kernel.shape
+            self.psf_stamps = np.zeros((2, 2, ky + 1, kx + 1), kernel.dtype)
+            for sy in range(2):
+                for sx in range(2):
+                    self.psf_stamps[sy, sx, sy:sy+ky, sx:sx+kx] = kernel
+
+        return self.psf_stamps
+
+    def use_splat(self, natoms):
+        """Decides whether stamping the PSF of `natoms` atoms in real space
+        (`splat_psf`) is cheaper than a full FFT (`convolve_psf`). This is
+        overridden by the `imaging` kwarg."""
+
+        imaging = self.parameters['kwargs'].get('imaging', 'auto')
+        if imaging != 'auto':
+            return imaging == 'splat'
+
+        nx, ny, dx, dy = self.get_grid()
+        stamp_size = self.get_psf_stamps()[0, 0].size
+        return natoms * stamp_size * SPLAT_COST < nx * ny * np.log2(nx * ny) * FFT_COST
+
+    def get_projected_image(self, individual):
+        """Calculates the linear z-contrast image of an individual, before
+        any multislice correction.
+
+        The image is either stamped atom by atom in real space or convolved
+        through an FFT, whichever `use_splat` deems cheaper. The raster and
+        image are kept on the individual (and its copies), one per grid, so
+        the levels of the resolution pyramid do not replace each other's.
+        When only a few atoms changed since the last call, the image is
+        updated by stamping the PSF of those atoms at their new positions
+        and subtracting it at their old ones. Atoms are matched by their
+        `atom_ids`, so adding or removing atoms only changes those atoms.
+        Every `refresh_interval` (default 20) updates, the image is
+        recomputed from scratch so that rounding errors do not build up.
+        """
+
+        if self.psf is None:
+            self.generate_psf()
+
+        positions = individual.get_positions()
+        numbers = individual.get_atomic_numbers()
+        ids = atom_ids(individual)
+        nx, ny, dx, dy = self.get_grid()
+        key = self.get_key()
+        refresh_interval = self.parameters['kwargs'].get('refresh_interval', 20)
+
+        states = getattr(individual, '_STEM_state', None) or {}
+        state = states.get(key)
+        if state is not None and state['updates'] < refresh_interval:
+            old, new = changed_atoms(state['positions'], state['numbers'], positions, numbers, state['ids'], ids)
+            old_positions, old_numbers = state['positions'][old], state['numbers'][old]
+            old_x, old_y, old_weights = self.get_pixel_weights(old_positions, old_numbers)
+            new_x, new_y, new_weights = self.get_pixel_weights(positions[new], numbers[new])
+
+            V = state['V'].copy()
+            scatter_add(V, (np.concatenate((new_x, old_x)), np.concatenate((new_y, old_y))),
+                        np.concatenate((new_weights, -old_weights)))
+
+            if self.use_splat(len(old) + len(new)):
+                image = state['image'].copy()
+                self.splat_psf(image, positions[new], numbers[new])
+                self.splat_psf(image, old_positions, old_numbers, sign=-1)
+            else:
+                image = self.convolve_psf(V)
+            updates = state['updates'] + 1 if len(old) + len(new) else state['updates']
+        else:
+            V = self.get_linear_convolution(individual)
+            if self.use_splat(len(positions)):
+                image = np.zeros([ny, nx], self.dtype)
+                self.splat_psf(image, positions, numbers)
+            else:
+                image = self.convolve_psf(V)
+            updates = 0
+
+        # The states may be shared with copies of the individual, so they
+        # are replaced rather than changed in place
+        states = dict(states)
+        states[key] = {'positions': positions, 'numbers': numbers, 'ids': ids,
+                       'V': V, 'image': image, 'updates': updates}
+        individual._STEM_state = states
+
+        return image.copy()
+
+    def convolve_psf(self, V):
+        """Convolves the projected potential V with the PSF through a full
+        real FFT. V is indexed (x, y) and the image (y, x)."""
+        V = V.T
+
+        return irfftn(self.get_psf_spectrum() * rfftn(V), V.shape)
+
+    def splat_psf(self, image, positions, numbers, sign=1):
+        """Adds the truncated PSF of each atom to `image` in real space,
+        wrapping around its edges. Matches `convolve_psf` up to the
+        truncation of the PSF."""
+
+        zed = self.parameters['kwargs']['zed']
+        nx, ny, dx, dy = self.get_grid()
+        stamps = self.get_psf_stamps()
+        ky, kx = stamps.shape[2:]
+        ax, ay = positions[:, 0], positions[:, 1]
+
+        # Blend the four shifted stamps with the bilinear weights of
+        # `get_pixel_weights`, one (ky, kx) stamp per atom
+        ix, iy = np.floor(ax / dx), np.floor(ay / dy)
+        fax = 1 - (ax / dx - ix)
+        fay = 1 - (ay / dy - iy)
+        wx = np.stack((fax, 1 - fax), axis=1)
+        wy = np.stack((fay, 1 - fay), axis=1) * sign * (np.asarray(numbers) ** zed)[:, None]
+        weights = (wy[:, :, None] * wx[:, None, :]).reshape(-1, 4).astype(stamps.dtype)
+        values = np.dot(weights, stamps.reshape(4, -1)).reshape(-1, ky, kx)
+
+        ix, iy = ix.astype(int), iy.astype(int)
+        rows = (iy[:, None] + np.arange(ky) - (ky - 2) // 2) % ny
+        cols = (ix[:, None] + np.arange(kx) - (kx - 2) // 2) % nx
+        scatter_add(image, (rows[:, :, None], cols[:, None, :]), values)
+
     def generate_psf(self):
         """Generates a psf array built from a gaussian function. The relevant 
         parameters specified in the parameters dictionary are below."""
@@ -212,14 +534,14 @@ class STEM(object):
         if (self.path is not None
             and os.path.isfile(os.path.join(self.path, 'target.npy'))):
             with open(os.path.join(self.path, 'target.npy'), "rb") as npy:
-                self.target = np.load(npy)            
+                self.target = np.load(npy).astype(self.dtype, copy=False)
             return
 
         if self.psf is None:
             self.generate_psf()
 
         if not self.parameters['kwargs']['target'].endswith('.xyz'):
-            self.target = self.read_target(self.parameters['kwargs']['target'])
+            self.target = self.read_target(self.parameters['kwargs']['target']).astype(self.dtype, copy=False)
             self.phantom = False
         else:
             atoms = read(self.parameters['kwargs']['target'])
@@ -241,16 +563,7 @@ class STEM(object):
     def get_image(self, individual):
         """Calculates the z-contrasted STEM image of an individual"""
 
-        if self.psf is None:
-            self.generate_psf()
-
-        psf = self.psf
-        V = self.get_linear_convolution(individual)
-
-        ft_psf = np.fft.fftshift(psf)
-        ft_V = np.fft.fft2(V).T
-
-        image = np.fft.ifft2(ft_psf * ft_V, axes=(0, 1)).real
+        image = self.get_projected_image(individual)
 
         if 'multislice' in self.parameters['kwargs']:
             image = self.get_multislice(image, self.parameters['kwargs']['multislice'])
@@ -298,3 +611,94 @@ class STEM(object):
 
         return image
 
+
+def structure_hash(atoms):
+    """Hashes the positions and atomic numbers of `atoms`. Unlike `hash`,
+    the digest is the same in every process."""
+    digest = hashlib.sha1(atoms.positions.tobytes())
+    digest.update(atoms.numbers.tobytes())
+    return digest.hexdigest()
+
+
+def scatter_add(array, indices, values):
+    """Unbuffered `array[rows, cols] += values` for a 2D array, like
+    `np.add.at`, which is slow per value; large scatters are summed with
+    `np.bincount` instead. The indices must be non-negative and may
+    broadcast against `values`."""
+    rows, cols = indices
+    if values.size * 32 < array.size:
+        np.add.at(array, (rows, cols), values)
+    else:
+        flat = np.broadcast_to(rows * array.shape[1] + cols, values.shape)
+        array += np.bincount(flat.ravel(), values.ravel(), minlength=array.size).reshape(array.shape)
+
+
+def register_translation(target_ft, image_ft, shape, upsample_factor=1):
+    """Finds the translation of an image that best matches a target from
+    their real FFTs (`rfftn`), following Guizar-Sicairos et al., Opt.
+    Lett. 33, 156 (2008). `shape` is the shape of the images.
+
+    The peak of the cross-correlation locates the shift to a whole pixel.
+    If `upsample_factor` is larger than one, the cross-correlation is then
+    evaluated on a grid 1/`upsample_factor` of a pixel fine, 1.5 pixels
+    wide around that peak, with a matrix-multiply DFT.
+
+    Returns
+    -------
+    (2,) array: The (y, x) shift in pixels to apply to the image (as with
+    `np.roll`), within half the image size in each direction.
+    """
+    spectrum = target_ft * image_ft.conj()
+    shifts = correlation_peak(irfftn(spectrum, shape))
+
+    if upsample_factor > 1:
+        shifts = np.round(shifts * upsample_factor) / upsample_factor
+        region = int(np.ceil(upsample_factor * 1.5))
+        center = np.fix(region / 2.0)
+        offsets = center - shifts * upsample_factor
+        correlation = upsampled_dft(hermitian_full(spectrum, shape[-1]), region, upsample_factor, offsets)
+        peak = np.unravel_index(np.argmax(np.absolute(correlation)), correlation.shape)
+        shifts += (np.array(peak, dtype=float) - center) / upsample_factor
+
+    return shifts
+
+
+def correlation_peak(correlation):
+    """Returns the whole pixel (y, x) shift at the peak of a
+    cross-correlation, within half its size in each direction."""
+    shape = np.array(correlation.shape)
+    shifts = np.array(np.unravel_index(np.argmax(np.absolute(correlation)), shape), dtype=float)
+    shifts[shifts > shape // 2] -= shape[shifts > shape // 2]
+    return shifts
+
+
+def upsampled_dft(data, region, upsample_factor, offsets):
+    """The inverse DFT of `data` on a `region` x `region` grid with spacing
+    1 / `upsample_factor`, starting `offsets` (y, x) upsampled pixels
+    before the origin. Costs O(region * N) per axis instead of an FFT of
+    the whole upsampled image."""
+    for n, offset in zip(data.shape[::-1], offsets[::-1]):
+        kernel = np.exp(2j * np.pi * np.outer(np.arange(region) - offset,
+                                              np.fft.fftfreq(n, upsample_factor)))
+        data = np.tensordot(kernel, data, axes=(1, -1))
+
+    return data
+
+
+def fourier_downsample(image, shape):
+    """Downsamples `image` to `shape` by keeping only the frequencies that
+    the smaller grid can represent. The total intensity is preserved."""
+    ny, nx = image.shape
+    my, mx = shape
+    y0, x0 = ny // 2 - my // 2, nx // 2 - mx // 2
+    spectrum = np.fft.fftshift(np.fft.fft2(image))[y0:y0+my, x0:x0+mx]
+
+    return np.fft.ifft2(np.fft.ifftshift(spectrum)).real
+
+
+def bilinear_transfer(n, pixel, fine_pixel):
+    """The ratio, at each of the `n` FFT frequencies, of the blur from
+    splitting atoms bilinearly over pixels of size `pixel` to that over
+    pixels of size `fine_pixel`."""
+    frequencies = np.fft.fftfreq(n, pixel)
+    return np.sinc(frequencies * pixel)**2 / np.sinc(frequencies * fine_pixel)**2
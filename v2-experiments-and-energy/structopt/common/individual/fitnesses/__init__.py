@@ -1,6 +1,5 @@
-from .FEMSIM import FEMSIM
-from .LAMMPS import LAMMPS
-from .STEM import STEM
+from importlib import import_module
+
 from structopt.tools import root, single_core, parallel
 
 
@@ -14,8 +13,9 @@ class Fitnesses(object):
         self.module_names = []
 
         for module in self.parameters:
-            # Initialize the class that was imported at the top of the file and append it to the modules list
-            setattr(self, module, globals()[module](parameters=parameters[module]))
+            # Import only the fitness modules that are used, initialize the class and append it to the modules list
+            Module = getattr(import_module('{}.{}'.format(__name__, module)), module)
+            setattr(self, module, Module(parameters=parameters[module]))
             self.modules.append(getattr(self, module))
             self.module_names.append(module)
 
@@ -5,8 +5,10 @@ from itertools import accumulate
 from bisect import bisect
 from collections import defaultdict
 
+import numpy as np
+
 import structopt
-from structopt.tools import root, single_core, parallel
+from structopt.tools import root, single_core, parallel, changed_atoms
 
 from .swap_positions import swap_positions
 from .swap_species import swap_species
@@ -68,6 +70,7 @@ class Mutations(object):
         logger.info("Performing mutation {} on individual {}".format(self.selected_mutation.__name__, individual.id or getattr(individual, "mutated_from", None)))
         print("Performing mutation {} on individual {}".format(self.selected_mutation.__name__, individual.id or getattr(individual, "mutated_from", None)))
 
+        positions, numbers = individual.get_positions(), individual.get_atomic_numbers()
         kwargs = self.kwargs[self.selected_mutation]
         result = self.selected_mutation(individual, **kwargs)
 
@@ -75,6 +78,18 @@ class Mutations(object):
         if result is False:
             return individual
 
+        # Record the atoms the mutation changed for localized relaxations,
+        # on top of those changed by mutations since the last relaxation.
+        # Adding or removing atoms leaves holes the indices do not locate.
+        if len(positions) != len(individual):
+            individual.touched = None
+        elif individual._relaxed or individual.touched is not None:
+            _, new = changed_atoms(positions, numbers, individual.get_positions(), individual.get_atomic_numbers())
+            if individual._relaxed:
+                individual.touched = new
+            else:
+                individual.touched = np.union1d(individual.touched, new)
+
         individual._relaxed = False
         individual._fitted = False
         self.post_processing(individual)
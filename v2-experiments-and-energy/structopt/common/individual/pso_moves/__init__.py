@@ -18,6 +18,7 @@ class Pso_Moves(object):
     def move(self, individual, best_swarm, best_particle):
         """ """
         individual._relaxed = False
+        individual.touched = None
         individual._fitted = False
         return self.update_particle(individual, best_swarm, best_particle, self.kwargs.omega, self.kwargs.phi_p, self.kwargs.phi_g)
 
@@ -2,6 +2,7 @@ import os
 import numpy as np
 
 from structopt.common.crossmodule.lammps import LAMMPS as lammps
+from structopt.common.crossmodule.exceptions import LAMMPSTimeout
 from structopt.tools import root, single_core, parallel
 from structopt.aperiodic.individual.mutations.move_surface_atoms import move_surface_atoms
 import gparameters
@@ -35,12 +36,27 @@ class LAMMPS(object):
         are in "space". Atoms can be in space due to a mutation or
         crossover that results in a large force that shoots the atom
         outside of the particle.
+    local_shell : float
+        If given, individuals whose only changes since their last
+        relaxation were made by mutations that kept the number of atoms
+        are relaxed locally: atoms farther than `local_shell` from every
+        atom the mutations, or the relaxations run before this one (e.g.
+        ``hard_sphere_cutoff``), changed are held fixed with
+        ``fix setforce 0 0 0``.
+    local_minimize : str
+        The convergence criteria of the local minimization. Defaults to
+        `minimize`.
+    polish_minimize : str
+        If given, the local minimization is followed by a short
+        minimization of all the atoms with these convergence criteria.
     """
 
     @single_core
     def __init__(self, parameters):
         # These variables never change
         self.parameters = parameters.kwargs
+        # Overrides the timeout kwarg, see structopt.common.population.stragglers
+        self.timeout = None
         if hasattr(gparameters, 'logging'):
             self.output_dir = gparameters.logging.path
         else:
@@ -63,7 +79,17 @@ class LAMMPS(object):
         rank = gparameters.mpi.rank
         print("Relaxing individual {} on rank {} with LAMMPS".format(individual.id, rank))
 
-        calc = lammps(self.parameters, calcdir=calcdir)
+        parameters = self.parameters
+        free = self.get_free_atoms(individual)
+        if free is not None:
+            print("Relaxing {} of {} atoms of individual {} with LAMMPS".format(len(free), len(individual), individual.id))
+            parameters = dict(parameters, free_atoms=free)
+            if 'local_minimize' in parameters:
+                parameters['minimize'] = parameters['local_minimize']
+        if self.timeout is not None:
+            parameters = dict(parameters, timeout=self.timeout)
+
+        calc = lammps(parameters, calcdir=calcdir)
         individual.set_calculator(calc)
         try:
             # We will manually run the lammps calculator's calculate.
@@ -75,6 +101,10 @@ class LAMMPS(object):
             calc.calculate(individual, trj_file=trj_file)
             E = individual.get_potential_energy()
             print("Finished relaxing individual {} on rank {} with LAMMPS".format(individual.id, rank))
+        except LAMMPSTimeout:
+            E = np.inf
+            individual._timed_out = True
+            print("Timed out relaxing individual {} on rank {} with LAMMPS".format(individual.id, rank))
         except RuntimeError:
             E = np.inf
             print("Error relaxing individual {} on rank {} with LAMMPS".format(individual.id, rank))
@@ -88,6 +118,26 @@ class LAMMPS(object):
 
         return
 
+    @single_core
+    def get_free_atoms(self, individual):
+        """Returns the indices of the atoms within `local_shell` of those
+        mutations and earlier relaxation modules touched since the last
+        relaxation, or None if the whole individual should be relaxed."""
+        shell = self.parameters.get('local_shell')
+        touched = getattr(individual, 'touched', None)
+        if not shell or touched is None or len(touched) == 0:
+            return None
+
+        mic = any(individual.get_pbc())
+        indices = list(range(len(individual)))
+        near = np.zeros(len(individual), dtype=bool)
+        for i in touched:
+            near |= individual.get_distances(i, indices, mic=mic) < shell
+        free = np.flatnonzero(near)
+        if len(free) == len(individual):
+            return None
+        return free
+
     @parallel
     def repair(self, individual, generation):
         """Repairs an individual. Currently takes isolated atoms moves them next to
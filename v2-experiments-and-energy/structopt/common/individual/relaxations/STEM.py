@@ -2,16 +2,15 @@ import logging
 import numpy as np
 import scipy.ndimage.filters as filters
 from scipy.ndimage import center_of_mass
-from scipy.optimize import fmin, brute
 
-import structopt.common.individual.fitnesses
+from structopt.common.individual.fitnesses.STEM import STEM as STEMFitness
 from structopt.tools import root, single_core, parallel
-from structopt.tools import rotation_matrix
-from structopt.common.crossmodule import get_avg_radii, NeighborList
+from structopt.tools import rotation_matrices
+from structopt.common.crossmodule import get_avg_radii
 
 import gparameters
 
-class STEM(structopt.common.individual.fitnesses.STEM):
+class STEM(STEMFitness):
     """Rotates the individual to obtain a better match with STEM image.
     This is done by taking one bright column in the bulk region and reading
     its nearest neighbors as a projection into the xy plane. A bulk atom close
@@ -32,6 +31,9 @@ class STEM(structopt.common.individual.fitnesses.STEM):
         Given a individual nearest neighbor unit to be optimized with the
         STEM image, the gridsize determines how fine the search for
         the rotation be. Tests indicate a gridsize of 10 is suitable.
+    rotation_refinements : int
+        The number of times the best rotation on the grid is refined on a
+        grid of half the spacing around it. Defaults to 3.
     """
 
     def __init__(self, parameters=None):
@@ -39,6 +41,7 @@ class STEM(structopt.common.individual.fitnesses.STEM):
             parameters = {'kwargs': {}}
         parameters['kwargs'].setdefault('rotation_grid', 10)
         parameters['kwargs'].setdefault('rotation_iterations', 2)
+        parameters['kwargs'].setdefault('rotation_refinements', 3)
         parameters['kwargs'].setdefault('surface_moves', 10)
         parameters['kwargs'].setdefault('filter_size', 1)
 
@@ -57,19 +60,13 @@ class STEM(structopt.common.individual.fitnesses.STEM):
         rank = gparameters.mpi.rank
         print("Relaxing individual {} on rank {} with STEM".format(individual.id, rank))
 
-        # Relax the atom by rotating it
-        steps = self.parameters.kwargs['rotation_grid']
+        # Relax the atom by rotating it. The rotations are rigid, so the
+        # neighbors of each atom stay the same
+        neighbors = self.get_neighbors(individual)
         for i in range(self.parameters.kwargs['rotation_iterations']):
-            bonds = self.get_bulk_bonds(individual)
+            bonds = self.get_bulk_bonds(individual, neighbors)
             projection = self.get_STEM_projection(individual)
-            solution = brute(self.epsilon,
-                             args=(bonds, projection),
-                             ranges=(slice(0, np.pi, np.pi/steps),
-                                     slice(-1, 1, 2/steps),
-                                     slice(0, 2*np.pi, 2*np.pi/steps)),
-                             finish=fmin)
-
-            phi, costheta, a = solution
+            phi, costheta, a = self.search_rotations(bonds, projection)
             theta = np.arccos(costheta)
 
             x = np.sin(theta) * np.cos(phi)
@@ -92,49 +89,99 @@ class STEM(structopt.common.individual.fitnesses.STEM):
 
         return
 
+    def search_rotations(self, bonds, projection):
+        """Finds the rotation [phi, cos(theta), a] that minimizes `epsilon`.
+
+        All rotations are first searched on a grid with `rotation_grid`
+        points along each parameter. The grid is then refined
+        `rotation_refinements` times: each time, the 5 x 5 x 5 points at
+        half the previous spacing around the best rotation are searched.
+        """
+        steps = self.parameters.kwargs['rotation_grid']
+        spacing = np.array([np.pi, 2.0, 2*np.pi]) / steps
+        axes = [np.arange(steps) * spacing[0],
+                np.arange(steps) * spacing[1] - 1,
+                np.arange(steps) * spacing[2]]
+        best = self.grid_search(axes, bonds, projection)
+        for i in range(self.parameters.kwargs['rotation_refinements']):
+            spacing /= 2
+            axes = [best[k] + np.arange(-2, 3) * spacing[k] for k in range(3)]
+            axes[1] = np.unique(np.clip(axes[1], -1, 1))
+            best = self.grid_search(axes, bonds, projection)
+
+        return best
+
+    def grid_search(self, axes, bonds, projection):
+        """Returns the rotation [phi, cos(theta), a] with the smallest
+        `epsilon` on the grid spanned by the three `axes`."""
+        grid = np.stack([values.ravel() for values in np.meshgrid(*axes, indexing='ij')], axis=1)
+        errors = self.epsilon(self.get_rotations(grid), bonds, projection)
+        return grid[np.argmin(errors)]
+
+    @staticmethod
+    def get_rotations(rotations):
+        """Returns the rotation matrices of an (M, 3) array of rotations
+        [phi, cos(theta), a] about the axis at polar angle theta and
+        azimuth phi by the angle a."""
+        phi, costheta, a = np.asarray(rotations).T
+        sintheta = np.sqrt(1 - costheta**2)
+        axes = np.stack([sintheta * np.cos(phi), sintheta * np.sin(phi), costheta], axis=1)
+        return rotation_matrices(axes, a)
+
     @staticmethod
-    def epsilon(rotation, bonds, projection):
+    def epsilon(rotations, bonds, projection):
         """Calculates the difference in the projected xy coordinates
         of a rotated bonding center of that of the individual
-        and of the STEM image
+        and of the STEM image, for a batch of rotations
 
         Parameters
         ----------
-        rotation : list [phi, cos(theta), a]
-            Contains phi (rotation around z-axis) and costheta (rotation 
-            along the z-axis) and the angle to rotate the atoms object
-        bonds : list of [vx, vy, vz] vectors
+        rotations : (M, 3, 3) array
+            The rotation matrices to evaluate (see `get_rotations`)
+        bonds : (B, 3) array
             The bonds around an atomic center in the bulk of the individual.
-        projection : list of [vx, vy] vectors
+        projection : (P, 2) array
             The bonds around an atomic center from the STEM image
 
         Output
         ------
-        out : float
+        out : (M,) array
             The sum squared difference between projected [vx, vy] vectors
-            after performing rotation.
+            after performing each rotation.
         """
 
-        phi, costheta, a = rotation
-        theta = np.arccos(costheta)
-        x = np.sin(theta) * np.cos(phi)
-        y = np.sin(theta) * np.sin(phi)
-        z = np.cos(theta)
-        rotate = rotation_matrix(np.array([x, y, z]), a)
-        bonds = np.asarray([[np.dot(rotate, v)[:2] for v in bonds]])
-        projection = np.asarray([projection])
-        dists = np.linalg.norm(np.transpose(bonds, (1, 0, 2)) - projection, axis=2)
-        total_error = np.sum(np.square(np.amin(dists, axis=1)))
+        projected = np.einsum('mij,bj->mbi', rotations[:, :2], bonds)
+        diffs = projected[:, :, None, :] - np.asarray(projection)[None, None, :, :]
+        sq_dists = np.sum(np.square(diffs), axis=3)
+        total_error = np.sum(np.amin(sq_dists, axis=2), axis=1)
 
         return total_error
 
-    def get_bulk_bonds(self, individual):
+    def get_neighbors(self, individual):
+        """Returns the sparse (CSR) adjacency matrix of the atoms closer than
+        1.1 times the average bond length."""
+        from scipy.spatial import cKDTree
+        from scipy.sparse import coo_matrix
+
+        n = len(individual)
+        cutoff = get_avg_radii(individual) * 2 * 1.1
+        pairs = cKDTree(individual.positions).query_pairs(cutoff, output_type='ndarray')
+        rows = np.concatenate((pairs[:, 0], pairs[:, 1]))
+        cols = np.concatenate((pairs[:, 1], pairs[:, 0]))
+
+        return coo_matrix((np.ones(len(rows), bool), (rows, cols)), shape=(n, n)).tocsr()
+
+    def get_bulk_bonds(self, individual, neighbors=None):
         """Chooses a random atom to orient around. The probability
         of choosing the atom is proportional to the atom's distance
-        from the center of mass"""
+        from the center of mass. `neighbors` is the adjacency matrix
+        from `get_neighbors`, computed if not given."""
+
+        if neighbors is None:
+            neighbors = self.get_neighbors(individual)
 
         # Get a bulk atom near the center of the particle
-        pos = individual.get_positions()
+        pos = individual.positions
         com = individual.get_center_of_mass()
         dists_from_com = np.linalg.norm(pos - com, axis=1)
         prob = dists_from_com / sum(dists_from_com)
@@ -142,8 +189,8 @@ class STEM(structopt.common.individual.fitnesses.STEM):
         bulk_atom_pos = pos[bulk_atom_index]
 
         # Get the neighbors of the bulk atom
-        NNs = NeighborList(individual)
-        bonds = np.asarray([pos[i] for i in NNs[bulk_atom_index]]) - bulk_atom_pos
+        start, end = neighbors.indptr[bulk_atom_index:bulk_atom_index+2]
+        bonds = pos[neighbors.indices[start:end]] - bulk_atom_pos
 
         return bonds
 
@@ -199,14 +246,10 @@ class STEM(structopt.common.individual.fitnesses.STEM):
         return vecs
 
     def align(self, atoms):
-        x, y = fmin(self.chi2, [0, 0], args=(atoms, self), disp=False)
-        atoms.translate([x, y, 0])
+        """Translates `atoms` in the xy-plane so that their image best
+        matches the target. The shift is read off the cross-correlation of
+        the image with the target (see `get_shift`)."""
+        nx, ny, dx, dy = self.get_grid()
+        y, x = self.get_shift(self.get_image(atoms))
+        atoms.translate([x * dx, y * dy, 0])
         return
-
-    @staticmethod
-    def chi2(shift, atoms, module):
-        x, y = shift
-        atoms = atoms.copy()
-        atoms.translate([x, y, 0])
-        image = module.get_image(atoms)
-        return np.sum(np.square(module.target - image)) ** 0.5
@@ -1,7 +1,8 @@
-from .LAMMPS import LAMMPS
-from .STEM import STEM
-from .hard_sphere_cutoff import hard_sphere_cutoff
-from structopt.tools import root, single_core, parallel
+from importlib import import_module
+
+import numpy as np
+
+from structopt.tools import root, single_core, parallel, changed_atoms
 
 
 class Relaxations(object):
@@ -13,9 +14,10 @@ class Relaxations(object):
         self.modules = []
 
         for module in self.parameters:
-            # Initialize the class that was imported at the top of the file and append it to the modules list
+            # Import only the relaxation modules that are used, initialize the class and append it to the modules list
             parameters = self.parameters[module]
-            setattr(self, module, globals()[module](parameters=parameters))
+            Module = getattr(import_module('{}.{}'.format(__name__, module)), module)
+            setattr(self, module, Module(parameters=parameters))
             self.modules.append(getattr(self, module))
 
 
@@ -27,7 +29,9 @@ class Relaxations(object):
             individual (Individual): the individual to relax
         """
         for module in self.modules:
+            before = snapshot([individual])
             module.relax(individual, generation)
+            touch_changed([individual], before)
         individual._relaxed = True
         individual._fitted = False
         return None
@@ -37,3 +41,26 @@ class Relaxations(object):
     def post_processing(self):
         pass
 
+
+
+def snapshot(individuals):
+    """Returns the positions and atomic numbers, by id, of those of
+    `individuals` that keep track of the atoms changed since their last
+    relaxation (``touched``)."""
+    return {individual.id: (individual.get_positions(), individual.get_atomic_numbers())
+            for individual in individuals if getattr(individual, 'touched', None) is not None}
+
+
+def touch_changed(individuals, before):
+    """Adds the atoms a relaxation changed since `snapshot` to those the
+    individuals record as ``touched``, so that the localized relaxations
+    that follow it (see the ``local_shell`` of LAMMPS) relax them too."""
+    for individual in individuals:
+        if individual.id not in before or individual.touched is None:
+            continue
+        positions, numbers = before[individual.id]
+        if len(positions) != len(individual):
+            individual.touched = None
+            continue
+        _, new = changed_atoms(positions, numbers, individual.get_positions(), individual.get_atomic_numbers())
+        individual.touched = np.union1d(individual.touched, new).astype(int)
@@ -0,0 +1,37 @@
+from structopt.tools import single_core
+
+
+class archive(object):
+    """Describes individuals for the archive of the basins found during the
+    run (see `structopt.common.population.relaxations.archive`). The atoms
+    are only moved when an individual is found in a known basin.
+
+    The descriptor (see `structopt.common.crossmodule.basins.describe`) is
+    set by the ``cutoff`` (default 6), ``n_radial`` (default 16) and
+    ``l_set`` (default 2, 4, ..., 12) kwargs. Descriptors of the same
+    composition belong to the same basin if they are within ``tolerance``
+    (default 0.01) of each other, or fall in the same cell of a grid of
+    spacing ``resolution`` (default 0.001).
+    """
+
+
+    @single_core
+    def __init__(self, parameters):
+        self.parameters = parameters
+
+
+    @single_core
+    def relax(self, individual, generation=None):
+        """Known basins are looked up for the whole population; individuals
+        are not changed."""
+        return None
+
+
+    @single_core
+    def describe(self, individual):
+        """Returns the composition and descriptor of `individual`."""
+        from structopt.common.crossmodule.basins import describe
+
+        kwargs = self.parameters['kwargs']
+        settings = {key: kwargs[key] for key in ['cutoff', 'n_radial', 'l_set'] if key in kwargs}
+        return describe(individual, **settings)
@@ -0,0 +1,93 @@
+from importlib import import_module
+
+from structopt.tools import single_core
+
+
+class cascade(object):
+    """Scores individuals for the screening stages of the evaluation
+    cascade (see `structopt.common.population.relaxations.cascade`). Lower
+    scores are better. The atoms are never moved.
+
+    The stages are given by the ``stages`` kwarg, a list of dictionaries
+    with the ``name`` of a stage and its ``kwargs``:
+
+    ``overlap``
+        The number of atom pairs closer than ``cutoff`` (default 1.5).
+    ``potential``
+        The energy per atom from an ASE calculator, computed in-process
+        without relaxing. ``calculator`` is the import path of the
+        calculator class (default ``"ase.calculators.emt.EMT"``) and
+        ``calculator_kwargs`` are passed to it.
+    ``STEM``
+        The STEM fitness at the coarse ``level`` (default 1) of its
+        resolution pyramid. Requires the STEM fitness.
+    ``surrogate``
+        The energy per atom predicted by a model trained on the earlier
+        generations. Scored for the whole population, see
+        `structopt.common.population.relaxations.cascade.surrogate_scores`.
+    """
+
+
+    @single_core
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.stages = self.parameters['kwargs'].get('stages', [])
+        self._calculators = {}
+
+
+    @single_core
+    def relax(self, individual, generation=None):
+        """The screening is done for the whole population; individuals
+        are not changed."""
+        return None
+
+
+    @single_core
+    def score(self, individual, index):
+        """Returns the score of `individual` at stage `index`."""
+        return self.evaluate(individual, self.stages[index])
+
+
+    @single_core
+    def score_batch(self, individuals, index):
+        """Returns the scores of `individuals` at stage `index`, sharing
+        this module's calculators. The STEM stage aligns their images
+        together."""
+        stage = self.stages[index]
+        if stage['name'] == 'STEM' and individuals:
+            return individuals[0].fitnesses.STEM.fitness_batch(individuals, **stage.get('kwargs', {}))
+        return [self.evaluate(individual, stage) for individual in individuals]
+
+
+    @single_core
+    def evaluate(self, individual, stage):
+        """Returns the score of `individual` for a `stage` dictionary."""
+        return getattr(self, stage['name'])(individual, **stage.get('kwargs', {}))
+
+
+    @single_core
+    def overlap(self, individual, cutoff=1.5):
+        from scipy.spatial import cKDTree
+        return len(cKDTree(individual.positions).query_pairs(cutoff))
+
+
+    @single_core
+    def potential(self, individual, calculator='ase.calculators.emt.EMT', calculator_kwargs=None):
+        from ase import Atoms
+
+        if calculator_kwargs is None:
+            calculator_kwargs = {}
+        atoms = Atoms(numbers=individual.numbers, positions=individual.positions,
+                      cell=individual.get_cell(), pbc=individual.get_pbc())
+        # Stages with the same calculator and different kwargs get their own instance
+        key = (calculator, repr(sorted(calculator_kwargs.items())))
+        if key not in self._calculators:
+            module, name = calculator.rsplit('.', 1)
+            self._calculators[key] = getattr(import_module(module), name)(**calculator_kwargs)
+        atoms.set_calculator(self._calculators[key])
+        return atoms.get_potential_energy() / len(atoms)
+
+
+    @single_core
+    def STEM(self, individual, level=1):
+        return individual.fitnesses.STEM.calculate_fitness(individual, level)
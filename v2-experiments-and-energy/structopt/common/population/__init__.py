@@ -5,8 +5,9 @@ from reprlib import recursive_repr as _recursive_repr
 
 import structopt
 from ..individual import Individual
-from structopt.tools import root, single_core, parallel, allgather
+from structopt.tools import root, single_core, parallel, allgather, get_executor
 from structopt.tools import SortedDict
+from . import pipeline
 
 POPULATION_MODULES = ['crossovers', 'selections', 'predators', 'fingerprinters', 'fitnesses', 'relaxations', 'mutations', 'pso_moves']
 
@@ -127,7 +128,7 @@ class Population(SortedDict):
 
     @parallel
     def allgather(self, individuals_per_core):
-        """Performs an MPI.allgather on self (the population) and updates the
+        """Performs an allgather on self (the population) and updates the
         correct individuals that have been modified based on the inputs from
         individuals_per_core.
 
@@ -143,9 +144,8 @@ class Population(SortedDict):
 
     @parallel
     def bcast(self):
-        """Performs and MPI.bcast on self."""
-        from mpi4py import MPI
-        correct_individuals = MPI.COMM_WORLD.bcast([individual for individual in self], root=0)
+        """Broadcasts self from the root with the selected executor."""
+        correct_individuals = get_executor().bcast([individual for individual in self], root=0)
         self.replace(correct_individuals)
 
 
@@ -218,7 +218,12 @@ class Population(SortedDict):
     def calculate_fitnesses(self):
         """Perform the fitness evaluations on the entire population."""
 
-        return self.fitnesses.calculate_fitnesses(self)
+        fits = self.fitnesses.calculate_fitnesses(self)
+        if getattr(self, 'mutations', None) is not None:
+            self.mutations.record_lookahead(self)
+        if getattr(self, 'relaxations', None) is not None:
+            self.relaxations.record(self)
+        return fits
 
 
     @parallel
@@ -227,6 +232,14 @@ class Population(SortedDict):
         self.relaxations.relax(self)
 
 
+    @parallel
+    def evaluate(self):
+        """Relax and evaluate the entire population, see
+        `structopt.common.population.pipeline`. Returns the fitnesses and
+        the time spent relaxing and evaluating."""
+        return pipeline.evaluate(self)
+
+
     @parallel
     def apply_fingerprinters(self):
         """Apply fingerprinters on the entire population."""
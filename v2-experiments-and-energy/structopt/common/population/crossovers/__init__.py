@@ -3,12 +3,13 @@ import random
 from itertools import accumulate
 from bisect import bisect
 
-from structopt.tools import root, single_core, parallel, allgather
-import gparameters
+from structopt.tools import root, single_core, parallel, get_executor
+from structopt.tools.executors import merge
 
-from .rotate import rotate
+from .rotate import rotate, rotate_batch
 
 rotate.tag = 'Ro'
+rotate.batch = rotate_batch
 
 
 class Crossovers(object):
@@ -38,58 +39,54 @@ class Crossovers(object):
         x = random.random() * cumdist[-1]
         self.selected_crossover = choices[bisect(cumdist, x)]
 
+    @single_core
+    def __reduce__(self):
+        # The operator dictionaries are keyed by the operator functions, so
+        # rebuild them from the parameters when sent to a worker process
+        return (self.__class__, (self.parameters,))
+
+
     @parallel
     def crossover(self, pairs):
         """ """
-        ncores = gparameters.mpi.ncores
-        rank = gparameters.mpi.rank
-
-        # Assign which pairs to mate on which cores
-        pairs_per_core = {rank: [] for rank in range(ncores)}
-        for i, pair in enumerate(pairs):
-            pairs_per_core[i % ncores].append(pair)
-
-        # Perform the designated crossovers by rank
-        children = []
-        for individual1, individual2 in pairs_per_core[rank]:
-            self.select_crossover()  # Choose a new crossover to perform for every pair
-            if self.selected_crossover is not None:
-                kwargs = self.kwargs[self.selected_crossover]
-                child1, child2 = self._crossover(individual1, individual2, self.selected_crossover, kwargs)
-                children.append(child1)
-                children.append(child2)
-            else:
-                children.append(None)
-                children.append(None)
-
-        children_per_core = {r: [] for r in range(ncores)}
-        all_children = []
-        count = 0
-        for i in range(ncores):
-            if i == rank:
-                for child in children:
-                    all_children.append(child)
-                    children_per_core[i].append(count)
-                    count += 1
-            else:
-                for _ in pairs_per_core[i]:
-                    all_children.append(None)
-                    children_per_core[i].append(count)
-                    count += 1
-                    all_children.append(None)
-                    children_per_core[i].append(count)
-                    count += 1
-
-        if gparameters.mpi.ncores > 1:
-            all_children = allgather(all_children, children_per_core)
-
-        count_nones = all_children.count(None)
+        # Mate the pairs in one chunk per core or worker process
+        executor = get_executor()
+        children_per_chunk = executor.map(self._crossover_chunk, executor.split(pairs))
+        all_children = [child for children in merge(children_per_chunk, len(pairs)) for child in children]
+
+        # Individual.__eq__ compares fitnesses, so count the Nones by identity
+        count_nones = sum(child is None for child in all_children)
         all_children = [child for child in all_children if child is not None]
 
         assert len(all_children) == len(pairs)*2 - count_nones
 
         return all_children
 
+
+    @single_core
+    def _crossover_chunk(self, pairs):
+        """Chooses a new crossover to perform for every pair in `pairs` and
+        returns the (child1, child2) tuple of each pair."""
+        selected = []
+        for pair in pairs:
+            self.select_crossover()
+            selected.append(self.selected_crossover)
+
+        # Crossovers with a `batch` implementation mate all of the pairs
+        # they were selected for in one call
+        children_per_pair = {}
+        for crossfunction in [f for i, f in enumerate(selected) if f is not None and f not in selected[:i]]:
+            indices = [i for i, f in enumerate(selected) if f is crossfunction]
+            kwargs = self.kwargs[crossfunction]
+            self.selected_crossover = crossfunction
+            if hasattr(crossfunction, 'batch'):
+                child_pairs = self._crossover_batch([pairs[i] for i in indices], crossfunction, kwargs)
+            else:
+                child_pairs = [self._crossover(pairs[i][0], pairs[i][1], crossfunction, kwargs) for i in indices]
+            children_per_pair.update(zip(indices, child_pairs))
+
+        return [children_per_pair.get(i, (None, None)) for i in range(len(pairs))]
+
     @single_core
     def _crossover(self, individual1, individual2, crossfunction, crosskwargs):
         if crossfunction is None:
@@ -99,13 +96,32 @@ class Crossovers(object):
         if child1 is not None:
             child1._fitted = False
             child1._relaxed = False
+            child1.touched = None
         if child2 is not None:
             child2._fitted = False
             child2._relaxed = False
+            child2.touched = None
         self.post_processing((individual1, individual2), (child1, child2))
         return child1, child2
 
 
+    @single_core
+    def _crossover_batch(self, pairs, crossfunction, crosskwargs):
+        if crossfunction is None:
+            raise ValueError("Tried to perform a crossover but the selected crossover was `None`.")
+        for individual1, individual2 in pairs:
+            print("Performing crossover {} on individuals {} and {}".format(crossfunction.__name__, individual1, individual2))
+        child_pairs = crossfunction.batch(pairs, **crosskwargs)
+        for parent_pair, child_pair in zip(pairs, child_pairs):
+            for child in child_pair:
+                if child is not None:
+                    child._fitted = False
+                    child._relaxed = False
+                    child.touched = None
+            self.post_processing(parent_pair, child_pair)
+        return child_pairs
+
+
     @single_core
     def post_processing(self, parent_pair, child_pair):
         parent1, parent2 = parent_pair
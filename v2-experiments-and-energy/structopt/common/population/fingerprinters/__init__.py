@@ -1,15 +1,28 @@
+import types
 import functools
 import random
 from itertools import accumulate, combinations
 from bisect import bisect
-from mpi4py import MPI
-from structopt.tools import root, single_core, parallel, disjoint_set_merge
-from structopt.tools.parallel import allgather
+from structopt.tools import root, single_core, parallel, disjoint_set_merge, get_executor
+from structopt.tools.executors import merge
 import gparameters
 from .all_close_atom_positions import all_close_atom_positions
 from .diversify_module import diversify_module
 
 
+def _fingerprint(individual, names):
+    """What the fingerprinters compare: the atoms and the values of the
+    modules named `names`, without the rest of the individual."""
+    return types.SimpleNamespace(id=individual.id,
+                                 positions=individual.get_positions(),
+                                 numbers=individual.get_atomic_numbers(),
+                                 **{name: getattr(individual, name, None) for name in names})
+
+
+def _are_equivalent(fingerprinter, kwargs, fingerprints, pairs):
+    return [fingerprinter(fingerprints[i], fingerprints[j], **kwargs) for i, j in pairs]
+
+
 class Fingerprinters(object):
     """ """
     kwargs = ['keep_best']
@@ -66,15 +79,9 @@ class Fingerprinters(object):
                     for x in equivalent_individuals[1:]:
                         killed.add(x)
 
-            check = False
+            # Only the root gets here, so there is nothing to synchronize
             while len(population) - len(killed) < nkeep:
-                rand = random.choice(range(len(killed)))
-                rand = MPI.COMM_WORLD.bcast(rand, root=0)
-                killed.pop(rand)
-                check = True
-            if check:  # Make sure each core is killing the same individuals
-                all_killed = MPI.COMM_WORLD.allgather(tuple(id for id in killed))
-                assert len(set(all_killed)) <= 1
+                killed.remove(random.choice(sorted(killed)))
 
             new_population = [individual for individual in population if individual.id not in killed]
             killed = [population[id] for id in killed]
@@ -91,23 +98,22 @@ class Fingerprinters(object):
         Args:
             population (Population): the population
         """
-        rank = gparameters.mpi.rank
-        ncores = gparameters.mpi.ncores
-        pairs_per_core = {r: [] for r in range(ncores)}
-        for i, pair in enumerate(combinations(population, 2)):
-            pairs_per_core[i % ncores].append(pair)
-
-        equivalent_pairs_by_core = []
-        for pair in pairs_per_core[rank]: 
-            are_the_same = fingerprinter(*pair, **fingerprinter_kwargs)
-            if are_the_same:
-                equivalent_pairs_by_core.append(pair)
-        if len(equivalent_pairs_by_core) > 0:
-            print("Found {} equivalent pairs on rank {}".format(len(equivalent_pairs_by_core), rank))
-        count = MPI.COMM_WORLD.allgather(len(equivalent_pairs_by_core))
-        all_equivalent_pairs = MPI.COMM_WORLD.allgather(equivalent_pairs_by_core)
-        all_equivalent_pairs = [pair for pairs in all_equivalent_pairs for pair in pairs]
-        assert sum(count) == len(all_equivalent_pairs)
+        # The operator wrappers cannot be pickled, so send the function they wrap
+        fingerprinter = getattr(fingerprinter, '__wrapped__', fingerprinter)
+        # Each worker gets the fingerprints once, with its share of the
+        # pairs as indices
+        names = [name for stage in ['fitnesses', 'relaxations']
+                 if getattr(population, stage, None) is not None
+                 for name in getattr(population, stage).parameters]
+        individuals = list(population)
+        fingerprints = [_fingerprint(individual, names) for individual in individuals]
+        pairs = list(combinations(range(len(individuals)), 2))
+        executor = get_executor()
+        are_the_same = merge(executor.map(functools.partial(_are_equivalent, fingerprinter, fingerprinter_kwargs, fingerprints),
+                                          executor.split(pairs)), len(pairs))
+        all_equivalent_pairs = [(individuals[i], individuals[j]) for (i, j), same in zip(pairs, are_the_same) if same]
+        if len(all_equivalent_pairs) > 0:
+            print("Found {} equivalent pairs".format(len(all_equivalent_pairs)))
 
         return all_equivalent_pairs
 
@@ -1,5 +1,4 @@
 import numpy as np
-import scipy.cluster.vq
 
 
 def all_close_atom_positions(individual1, individual2, rtol=None, atol=0.001):
@@ -18,6 +17,7 @@ def all_close_atom_positions(individual1, individual2, rtol=None, atol=0.001):
 
         `absolute(individual1.positions - individual2.positions) <= (atol + rtol * absolute(individual2.positions))`
     """
+    import scipy.cluster.vq
 
     args = {}
     if rtol is not None:
@@ -25,8 +25,8 @@ def all_close_atom_positions(individual1, individual2, rtol=None, atol=0.001):
     if atol is not None:
         args["atol"] = atol
 
-    a1 = individual1.positions.copy()
-    a2 = individual2.positions.copy()
+    a1 = individual1.positions
+    a2 = individual2.positions
     indexes, dists = scipy.cluster.vq.vq(a1, a2)
     a2sorted = a2[indexes]
 
@@ -1,18 +1,24 @@
 import logging
 
-from structopt.tools import root, single_core, parallel
-from structopt.tools.parallel import allgather
-import gparameters
+import numpy as np
+
+from structopt.tools import root, single_core, parallel, get_executor
+from structopt.common.crossmodule.lammps import DEFAULT_TIMEOUT
+from structopt.common.population.fitnesses import fitness_batch
+from structopt.common.population.stragglers import map_individuals
 
 
 @parallel
 def fitness(population, parameters):
     """Perform the LAMMPS fitness calculation on an entire population.
 
+    With the ``timeouts`` parameter, the timeout of each calculation adapts
+    to the durations of the earlier ones and stragglers are cancelled with
+    an infinite energy (see `structopt.common.population.stragglers`).
+
     Args:
         population (Population): the population to evaluate
     """
-    rank = gparameters.mpi.rank
     if parameters.use_mpi4py:
         logger = logging.getLogger('by-rank')
     else:
@@ -23,29 +29,37 @@ def fitness(population, parameters):
     if not to_fit:
         return [individual.LAMMPS for individual in population]
 
-    if parameters.use_mpi4py:
-        ncores = gparameters.mpi.ncores
+    if parameters.get('timeouts') is None:
+        energies = get_executor(parameters.use_mpi4py).map_shards(calculate_fitnesses, to_fit)
     else:
-        ncores = 1
+        energies = map_individuals(calculate_fitness, to_fit, parameters, 'LAMMPS fitness',
+                                   maximum=parameters['kwargs'].get('timeout', DEFAULT_TIMEOUT))
+        energies = [np.inf if energy is None else energy for energy in energies]
 
-    individuals_per_core = {r: [] for r in range(ncores)}
-    for i, individual in enumerate(to_fit):
-        individuals_per_core[i % ncores].append(individual)
-
-    for individual in individuals_per_core[rank]:
-        print("Running LAMMPS fitness evaluation on individual {}".format(individual.id))
-        energy = individual.fitnesses.LAMMPS.calculate_fitness(individual)
+    # Save the fitness value for the module to each individual after they have been gathered
+    for individual, energy in zip(to_fit, energies):
         individual.LAMMPS = energy
         logger.info('Individual {0} after LAMMPS evaluation has energy {1}'.format(individual.id, energy))
 
-    fits = [individual.LAMMPS for individual in population]
-    positions_per_core = {rank: [population.position(individual) for individual in individuals] for rank, individuals in individuals_per_core.items()}
-    if parameters.use_mpi4py:
-        fits = allgather(fits, positions_per_core)
+    return [individual.LAMMPS for individual in population]
 
-    # Save the fitness value for the module to each individual after they have been allgathered
-    for i, fit in enumerate(fits):
-        population.get_by_position(i).LAMMPS = fit
 
-    return [individual.LAMMPS for individual in population]
+@single_core
+def evaluate_shard(individuals, parameters):
+    """Computes the LAMMPS energies of `individuals`, which store them (see
+    `structopt.common.population.pipeline`)."""
+    calculate_fitnesses(individuals)
+
+
+@single_core
+def calculate_fitness(individual, timeout=None):
+    print("Running LAMMPS fitness evaluation on individual {}".format(individual.id))
+    module = individual.fitnesses.LAMMPS
+    module.timeout = timeout
+    return module.calculate_fitness(individual)
+
 
+@single_core
+def calculate_fitnesses(individuals):
+    print("Running LAMMPS fitness evaluation on individuals {}".format([individual.id for individual in individuals]))
+    return fitness_batch(individuals, 'LAMMPS')
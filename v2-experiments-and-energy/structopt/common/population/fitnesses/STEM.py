@@ -1,13 +1,25 @@
 import logging
+import functools
+import numpy as np
 
-from structopt.tools import root, single_core, parallel
-from structopt.tools.parallel import allgather
-import gparameters
+from structopt.tools import root, single_core, parallel, get_executor
+from structopt.common.population.fitnesses import fitness_batch
 
 @parallel
 def fitness(population, parameters):
     """Performs the STEM fitness calculation on an entire population.
 
+    With the `pyramid_levels` kwarg, the individuals are first evaluated at
+    the coarsest level of the resolution pyramid. At each level, those
+    whose fitness is within the `pyramid_quantile` quantile of the
+    population at that level are evaluated again at the next finer level.
+    Each individual keeps the fitness of the finest level it reached, and
+    that level is recorded as its `fitness_level`.
+
+    The image, contrast and shift computed at full resolution are gathered
+    with the fitnesses and kept on each individual for the STEM mutations
+    (see `STEM.get_products`).
+
     Parameters
     ----------
         population : structopt.Population
@@ -17,38 +29,73 @@ def fitness(population, parameters):
 
     if parameters.use_mpi4py:
         logger = logging.getLogger('by-rank')
-        ncores = gparameters.mpi.ncores
     else:
         logger = logging.getLogger('output')
-        ncores = 1
 
-    rank = gparameters.mpi.rank
+    executor = get_executor(parameters.use_mpi4py)
+    kwargs = parameters.get('kwargs', {})
+    levels = kwargs.get('pyramid_levels', 0)
+    quantile = kwargs.get('pyramid_quantile', 0.5)
 
-    individuals_per_core = {r: [] for r in range(ncores)}
-    for i, individual in enumerate(to_fit):
-        individuals_per_core[i % ncores].append(individual)
+    results = executor.map_shards(functools.partial(calculate_fitnesses, level=levels), to_fit)
+    for individual, result in zip(to_fit, results):
+        individual.STEM_levels = {levels: keep_products(individual, result)}
 
-    for individual in individuals_per_core[rank]:
-        print("Evaluating fitness of individual {} on rank {} with STEM".format(individual.id, rank))
-        chi2 = individual.fitnesses.STEM.calculate_fitness(individual)
-        individual.STEM = chi2
-        logger.info('Individual {0} after STEM evaluation has chi^2 {1}'.format(individual.id, chi2))
+    # Promote the individuals that beat the population at each level
+    for level in range(levels if to_fit else 0, 0, -1):
+        chi2s = [individual.STEM_levels[level] for individual in population
+                 if level in getattr(individual, 'STEM_levels', {})]
+        threshold = np.percentile(chi2s, 100 * quantile)
+        promoted = [individual for individual in to_fit
+                    if level in individual.STEM_levels and individual.STEM_levels[level] <= threshold]
+        results = executor.map_shards(functools.partial(calculate_fitnesses, level=level-1), promoted)
+        for individual, result in zip(promoted, results):
+            individual.STEM_levels[level-1] = keep_products(individual, result)
 
-    positions_per_core = {rank: [population.position(individual) for individual in individuals] for rank, individuals in individuals_per_core.items()}
+    # Save the fitness value for the module to each individual after they have been gathered
+    for individual in to_fit:
+        level = min(individual.STEM_levels)
+        individual.STEM = individual.STEM_levels[level]
+        individual.fitness_level = level
+        logger.info('Individual {0} after STEM evaluation has chi^2 {1} at pyramid level {2}'.format(
+            individual.id, individual.STEM, level))
 
-    fits = []
-    for individual in population:
-        if hasattr(individual, 'STEM'):
-            fits.append(individual.STEM)
-        else:
-            fits.append(None)
+    return [individual.STEM for individual in population]
+
+
+def fusable(parameters):
+    """Whether the fitness can be computed one shard at a time by
+    `evaluate_shard`; the resolution pyramid compares the population."""
+    return parameters.get('kwargs', {}).get('pyramid_levels', 0) == 0
+
+
+@single_core
+def evaluate_shard(individuals, parameters):
+    """Computes the full resolution STEM fitnesses of `individuals` and
+    stores them on the individuals (see
+    `structopt.common.population.pipeline`)."""
+    for individual, result in zip(individuals, calculate_fitnesses(individuals)):
+        individual.STEM_levels = {0: keep_products(individual, result)}
+        individual.STEM = individual.STEM_levels[0]
+        individual.fitness_level = 0
 
-    if parameters.use_mpi4py:
-        fits = allgather(fits, positions_per_core)
 
-    # Save the fitness value for the module to each individual after they have been allgathered
-    for i, fit in enumerate(fits):
-        population.get_by_position(i).STEM = fit
+@single_core
+def calculate_fitnesses(individuals, level=0):
+    """Returns the STEM fitnesses of `individuals` at `level` and, at full
+    resolution, the products of the calculation. The images are aligned
+    together (see `STEM.fitness_batch`)."""
+    print("Evaluating fitness of individuals {} with STEM".format([individual.id for individual in individuals]))
+    chi2s = fitness_batch(individuals, 'STEM', level)
+    return [(chi2, individual._STEM_products if level == 0 else None)
+            for individual, chi2 in zip(individuals, chi2s)]
 
-    return [individual.STEM for individual in population]    
 
+def keep_products(individual, result):
+    """Stores the products returned by `calculate_fitnesses` on the
+    individual, which may have been evaluated on another rank, and
+    returns the fitness."""
+    chi2, products = result
+    if products is not None:
+        individual._STEM_products = products
+    return chi2
@@ -1,7 +1,7 @@
 import logging
+from importlib import import_module
 import numpy as np
 
-from . import LAMMPS, FEMSIM, STEM
 from structopt.tools import root, single_core, parallel
 import gparameters
 
@@ -12,7 +12,8 @@ class Fitnesses(object):
     @single_core
     def __init__(self, parameters):
         self.parameters = parameters
-        self.modules = [globals()[module] for module in self.parameters]
+        # Import only the fitness modules that are used
+        self.modules = [import_module('{}.{}'.format(__name__, module)) for module in self.parameters]
 
 
     @parallel
@@ -26,7 +27,15 @@ class Fitnesses(object):
         if not to_fit:
             return [individual.fitness for individual in population]
 
-        fitnesses = np.zeros((len(population),), dtype=np.float)
+        # Individuals rejected by the evaluation cascade (see
+        # structopt.common.population.relaxations.cascade) are not
+        # evaluated, nor are those found in a known basin (see
+        # structopt.common.population.relaxations.archive), which already
+        # have the values of the modules
+        rejected = np.array([getattr(individual, 'rejected_at', None) is not None for individual in population], dtype=bool)
+        evaluated = [individual for individual, reject in zip(population, rejected)
+                     if not reject and not getattr(individual, 'basin_hit', False)]
+
         # Run each fitness module on the population. Create sorted
         # module list so all cores run modules in the same order
         modules_module_names = [[module, module.__name__.split('.')[-1]] for module in self.modules]
@@ -37,12 +46,33 @@ class Fitnesses(object):
             if gparameters.mpi.rank == 0:
                 print("Running fitness {} on the entire population".format(module_name))
 
-            fits = module.fitness(population, parameters=module_parameters)
+            module.fitness(evaluated, parameters=module_parameters)
+
+        return self.total_fitnesses(population)
+
+    @parallel
+    def total_fitnesses(self, population):
+        """Combines the fitnesses each module stored on the individuals
+        (e.g. ``individual.STEM``) into their total fitness, weighted by
+        the modules' ``weight``, and marks the individuals as fitted.
+
+        Args:
+            population (Population): the evaluated population
+        """
+        rejected = np.array([getattr(individual, 'rejected_at', None) is not None for individual in population], dtype=bool)
+        evaluated = [individual for individual, reject in zip(population, rejected) if not reject]
 
+        fitnesses = np.zeros((len(population),), dtype=np.float)
+        for module_name in sorted(module.__name__.split('.')[-1] for module in self.modules):
             # Calculate the full objective function with weights
-            weight = getattr(module_parameters, 'weight')
-            fits = np.multiply(fits, weight)
-            fitnesses = np.add(fitnesses, fits)
+            weight = getattr(self.parameters[module_name], 'weight')
+            fits = np.multiply([getattr(individual, module_name) for individual in evaluated], weight)
+            fitnesses[~rejected] += fits
+        fitnesses[rejected] = [individual.cascade_penalty for individual, reject in zip(population, rejected) if reject]
+
+        # Individuals evaluated at a reduced fidelity rank behind those
+        # evaluated at a higher one
+        fitnesses = stratify(fitnesses, [individual.fitness_level for individual in population])
 
         # Store the individuals total fitness for each individual and set each individual to
         # unmodified so that the fitnesses won't be recalculated
@@ -58,3 +88,48 @@ class Fitnesses(object):
         logger = logging.getLogger("output")
         logger.info("Total fitnesses for the population: \n{} (rank {})".format(fitnesses, gparameters.mpi.rank))
 
+
+@single_core
+def fitness_batch(individuals, name, *args):
+    """Returns the fitnesses of `individuals` from their fitness module
+    `name`, e.g. one rank's shard of the population.
+
+    The module of the first individual evaluates the whole shard, so what
+    it caches (targets, simulators, calculators) is built once. Modules
+    that are faster on many individuals at once define
+    ``fitness_batch(individuals, *args)``; the others are called with
+    ``calculate_fitness(individual, *args)`` for each individual.
+    """
+    if not individuals:
+        return []
+    module = getattr(individuals[0].fitnesses, name)
+    if hasattr(module, 'fitness_batch'):
+        return module.fitness_batch(individuals, *args)
+    return [module.calculate_fitness(individual, *args) for individual in individuals]
+
+
+def stratify(fitnesses, levels):
+    """Offsets the fitnesses so that those at each fidelity level are worse
+    (larger) than all those at finer (lower) levels. The differences
+    between fitnesses at the same level are kept.
+
+    Parameters
+    ----------
+    fitnesses : list of floats
+        The fitness of each individual.
+    levels : list of ints
+        The fidelity level of each fitness, 0 being the highest.
+
+    Returns
+    -------
+    array: The offset fitnesses.
+    """
+    fitnesses = np.array(fitnesses, dtype=float)
+    levels = np.asarray(levels)
+    for level in np.unique(levels)[1:]:
+        finer = fitnesses[levels < level].max()
+        coarse = levels == level
+        lowest = fitnesses[coarse].min()
+        if lowest <= finer:
+            fitnesses[coarse] += np.nextafter(finer, np.inf) - lowest
+    return fitnesses
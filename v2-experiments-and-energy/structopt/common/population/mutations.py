@@ -1,6 +1,11 @@
+import logging
+import random
+
 import numpy as np
 
 from structopt.tools import root, single_core, parallel
+from structopt.tools.dictionaryobject import DictionaryObject
+from structopt.common.individual.relaxations.cascade import cascade
 
 
 class Mutations(object):
@@ -12,10 +17,22 @@ class Mutations(object):
         Keywords in parameters:
         keep_original : Add mutated individuals to the population without removing the individual they were mutated from.
         keep_original_best : If the individual with the lowest fitness is mutated, do not remove its un-mutated parent from the population.
+
+        Keywords in the parameters of each mutation:
+        lookahead : Apply the mutation to ``candidates`` copies of the individual, score them with the ``proxy`` stage
+                    of the evaluation cascade (see structopt.common.individual.relaxations.cascade, e.g.
+                    {"name": "potential"}) and keep the ``keep`` (default 1) best. With probability ``audit``
+                    (default 0) all the candidates are kept instead, to log how often the proxy's choice also has
+                    the best fitness.
         """
         self.parameters = parameters
         self.keep_original = parameters.get('keep_original', False)
         self.keep_original_best = parameters.get('keep_original_best', False)
+        self.lookahead = {name: parameters[name]['lookahead'] for name in parameters
+                          if isinstance(parameters[name], dict) and 'lookahead' in parameters[name]}
+        self.proxy = cascade(DictionaryObject({'kwargs': {}}))
+        self.audits = []
+        self.audit_wins = {}
 
     @single_core
     def mutate(self, population):
@@ -26,32 +43,85 @@ class Mutations(object):
         # Make sure not to edit the population in the for loop!
         to_remove = []
         to_add = []
+        audited = []
         for individual in population:
             individual.mutations.select_mutation()
 
             if individual.mutations.selected_mutation is not None:
-                # Duplicate the individual and reset some values
-                mutated = individual.copy()
-                mutated.mutated_from = individual.id
-                mutated.mutations.selected_mutation = individual.mutations.selected_mutation
+                mutation = individual.mutations.selected_mutation
                 individual.mutations.selected_mutation = None
-
-                # Perform the mutation
-                mutated.mutate(select_new=False)
+                mutants, audit = self.lookahead_mutate(individual, mutation)
+                if audit:
+                    audited.append((mutation.__name__, mutants))
 
                 # Replace the individual with the mutated one
                 if not self.keep_original and not (self.keep_original_best and individual.id == min_fit_id):
                     to_remove.append(individual)
-                to_add.append(mutated)
+                to_add.extend(mutants)
 
         for individual in to_remove:
             population.remove(individual)
         for mutated in to_add:
             population.add(mutated)
 
+        # The ids of the audited candidates are known once they are added
+        self.audits.extend((name, [mutated.id for mutated in mutants]) for name, mutants in audited)
+
         return population
 
 
+    @single_core
+    def lookahead_mutate(self, individual, mutation):
+        """Returns the mutated copies of `individual` to add to the
+        population, the best of the lookahead candidates by the proxy
+        score first, and whether they are all kept to be audited."""
+        lookahead = self.lookahead.get(mutation.__name__, {})
+        mutants = []
+        for _ in range(lookahead.get('candidates', 1)):
+            # Duplicate the individual and reset some values
+            mutated = individual.copy()
+            mutated.mutated_from = individual.id
+            mutated.mutations.selected_mutation = mutation
+
+            # Perform the mutation
+            mutated.mutate(select_new=False)
+            mutants.append(mutated)
+        if len(mutants) == 1:
+            return mutants, False
+
+        scores = [self.proxy.evaluate(mutated, lookahead['proxy']) for mutated in mutants]
+        mutants = [mutants[i] for i in np.argsort(scores, kind='mergesort')]
+        logger = logging.getLogger('output')
+        logger.info('Lookahead {} of individual {}: proxy scores {}'.format(mutation.__name__, individual.id, sorted(scores)))
+        if random.random() < lookahead.get('audit', 0.0):
+            return mutants, True
+        return mutants[:lookahead.get('keep', 1)], False
+
+
+    @single_core
+    def record_lookahead(self, population):
+        """Logs how often the candidate chosen by the proxy of an audited
+        lookahead also has the best fitness. Called once the population
+        was evaluated. Audits whose candidates were not all fully evaluated
+        at the same fitness level (e.g. rejected by the cascade or stopped
+        at a coarse STEM level) have fitnesses that cannot be compared and
+        are skipped."""
+        logger = logging.getLogger('output')
+        for name, ids in self.audits:
+            if not all(id in population for id in ids):
+                continue
+            candidates = [population[id] for id in ids]
+            if (any(individual.rejected_at is not None for individual in candidates)
+                    or len({individual.fitness_level for individual in candidates}) > 1):
+                continue
+            fits = [individual.fitness for individual in candidates]
+            wins, total = self.audit_wins.get(name, (0, 0))
+            self.audit_wins[name] = (wins + int(np.argmin(fits) == 0), total + 1)
+        for name, (wins, total) in sorted(self.audit_wins.items()):
+            logger.info('Lookahead {}: the proxy chose the candidate with the best fitness in {} of {} audits'.format(name, wins, total))
+        self.audits = []
+
+
     @single_core
     def post_processing(self):
         pass
@@ -0,0 +1,151 @@
+"""Relaxes and evaluates the population, either stage by stage or fused.
+
+With the default ``"staged"`` pipeline every relaxation module runs on
+the whole population, the relaxed individuals are exchanged between the
+ranks, and then every fitness module runs and exchanges its fitnesses.
+Each exchange waits for the slowest rank.
+
+With ``"pipeline": "fused"``, each worker of the executor takes its shard
+of the individuals through all the relaxation and fitness modules back to
+back, and the results are exchanged once, as a compact record per
+individual: how far its atoms moved, its cell if a relaxation changed it
+(e.g. LAMMPS with ``relax_box``), the values the modules stored on it and
+the time the shard took. The atoms are sent in full only if a relaxation
+added or removed some. The caches kept on the individuals (e.g. the
+STEM products) stay on the rank that computed them.
+
+Stages that compare the population, such as the evaluation cascade or the
+STEM resolution pyramid, cannot be run one shard at a time; with those the
+staged pipeline is used.
+"""
+
+import time
+import logging
+import functools
+from importlib import import_module
+
+from structopt.tools import single_core, parallel, get_executor
+from structopt.common.individual.relaxations import snapshot, touch_changed
+
+
+@parallel
+def evaluate(population):
+    """Relaxes the individuals that have not been relaxed and evaluates
+    those that have not been evaluated.
+
+    Returns:
+        The total fitnesses of the population and the time spent relaxing
+        and evaluating, as a dict with 'relax' and 'fitness' keys.
+    """
+    t_0 = time.time()
+    if population.parameters.get('pipeline', 'staged') != 'fused' or not fusable(population):
+        population.relax()
+        t_relax = time.time() - t_0
+        fits = population.calculate_fitnesses()
+        return fits, {'relax': t_relax, 'fitness': time.time() - t_0 - t_relax}
+
+    relaxations = [module.__name__ for module in population.relaxations.modules]
+    fitnesses = sorted((module.__name__, population.fitnesses.parameters[module.__name__.split('.')[-1]])
+                       for module in population.fitnesses.modules)
+    names = [name.split('.')[-1] for name in relaxations + [name for name, parameters in fitnesses]]
+    use_mpi4py = all(stage.parameters[name].use_mpi4py
+                     for stage in [population.relaxations, population.fitnesses] for name in stage.parameters)
+
+    to_evaluate = [individual for individual in population if not individual._relaxed or not individual._fitted]
+    positions = [individual.get_positions() for individual in to_evaluate]
+    records = get_executor(use_mpi4py).map_shards(
+        functools.partial(evaluate_shard, relaxations=relaxations, fitnesses=fitnesses, names=names), to_evaluate)
+
+    for individual, x, record in zip(to_evaluate, positions, records):
+        apply_record(individual, x, record)
+
+    fits = population.fitnesses.total_fitnesses(population)
+    if getattr(population, 'mutations', None) is not None:
+        population.mutations.record_lookahead(population)
+
+    # The shards ran concurrently; the slowest one sets the pace
+    t_relax = max([record['timings']['relax'] for record in records] or [0.0])
+    return fits, {'relax': t_relax, 'fitness': time.time() - t_0 - t_relax}
+
+
+def apply_record(individual, positions, record):
+    """Gives `individual`, whose atoms were at `positions` when it was
+    sent, the results in a record of `evaluate_shard`."""
+    assert record['id'] == individual.id
+    if record['arrays'] is not None:
+        individual.arrays = {name: a.copy() for name, a in record['arrays'].items()}
+    elif record['displacements'] is not None:
+        individual.set_positions(positions + record['displacements'])
+    if record['cell'] is not None:
+        individual.set_cell(record['cell'])
+    for name, value in record['values'].items():
+        setattr(individual, name, value)
+    individual.fitness_level = record['fitness_level']
+    individual._relaxed = True
+    individual.touched = None
+
+
+def fusable(population):
+    """Whether every relaxation and fitness module of `population` can be
+    run one shard at a time. Logs the modules that cannot."""
+    logger = logging.getLogger('output')
+    blocking = []
+    for kind, stage, shard in [('relaxation', population.relaxations, 'relax_shard'),
+                               ('fitness', population.fitnesses, 'evaluate_shard')]:
+        for module in stage.modules:
+            name = module.__name__.split('.')[-1]
+            if not hasattr(module, shard) or not getattr(module, 'fusable', lambda parameters: True)(stage.parameters[name]):
+                blocking.append('{} {}'.format(kind, name))
+    if blocking:
+        logger.info('Using the staged pipeline, the {} cannot be fused'.format(', '.join(blocking)))
+    return not blocking
+
+
+@single_core
+def evaluate_shard(individuals, relaxations, fitnesses, names):
+    """Relaxes and evaluates one shard of the population with the
+    population modules named in `relaxations`, in order, and in
+    `fitnesses`, a list of (module name, parameters). Returns a record per individual with its 'id', the
+    'displacements' of its atoms (None if they did not move), the
+    'values' of the attributes named `names` that the modules set (e.g. the
+    energy of a LAMMPS relaxation or the STEM fitness), its
+    'fitness_level' and the 'timings' of the shard. The 'cell' is None
+    unless it changed, and 'arrays', all of the atom arrays, is None unless
+    the number of atoms changed, in which case 'displacements' is None."""
+    t_0 = time.time()
+    to_relax = [individual for individual in individuals if not individual._relaxed]
+    positions = {individual.id: individual.get_positions() for individual in to_relax}
+    cells = {individual.id: individual.get_cell() for individual in to_relax}
+    for name in relaxations:
+        before = snapshot(to_relax)
+        import_module(name).relax_shard(to_relax)
+        touch_changed(to_relax, before)
+    for individual in to_relax:
+        individual._relaxed = True
+    t_relax = time.time() - t_0
+
+    to_fit = [individual for individual in individuals if not individual._fitted]
+    for name, parameters in fitnesses:
+        import_module(name).evaluate_shard(to_fit, parameters)
+    timings = {'relax': t_relax, 'fitness': time.time() - t_0 - t_relax}
+
+    records = []
+    for individual in individuals:
+        displacements, cell, arrays = None, None, None
+        if individual.id in positions:
+            if len(individual) != len(positions[individual.id]):
+                arrays = individual.arrays
+            else:
+                displacements = individual.get_positions() - positions[individual.id]
+                if not displacements.any():
+                    displacements = None
+            if (individual.get_cell() != cells[individual.id]).any():
+                cell = individual.get_cell()
+        records.append({'id': individual.id,
+                        'displacements': displacements,
+                        'cell': cell,
+                        'arrays': arrays,
+                        'values': {name: getattr(individual, name) for name in names if hasattr(individual, name)},
+                        'fitness_level': individual.fitness_level,
+                        'timings': timings})
+    return records
@@ -1,5 +1,4 @@
 import numpy as np
-import scipy
 
 
 def rank(fits, nkeep, p_min=None):
@@ -22,6 +21,7 @@ def rank(fits, nkeep, p_min=None):
         increases from p_min to (2/N - p_min) in even, (1/N - p_min)
         increments. Defaults to (1/N)^2.
     """
+    import scipy.stats
 
     if p_min is None:
         p_min = 1.0 / len(fits) ** 2
@@ -1,7 +1,6 @@
 import numpy as np
 
 from structopt.tools import root, single_core, parallel
-from scipy.constants import physical_constants
 
 @single_core
 def roulette(fits, nkeep, T=None):
@@ -20,6 +19,7 @@ def roulette(fits, nkeep, T=None):
         If T is not None, a boltzman-like transformation is applied
         to all fitness values with T.
     """
+    from scipy.constants import physical_constants
 
     ids, fits = zip(*fits.items())
     ids = list(ids)
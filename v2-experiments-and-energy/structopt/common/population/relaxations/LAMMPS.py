@@ -1,26 +1,47 @@
-from structopt.tools import root, single_core, parallel
-import gparameters
+import numpy as np
+
+from structopt.tools import root, single_core, parallel, get_executor
+from structopt.common.crossmodule.lammps import DEFAULT_TIMEOUT
+from structopt.common.population.relaxations import relax_batch
+from structopt.common.population.stragglers import map_individuals
 
 
 @parallel
 def relax(population, parameters):
     """Relax the entire population using LAMMPS.
 
+    With the ``timeouts`` parameter, the timeout of each relaxation adapts
+    to the durations of the earlier ones and stragglers are cancelled (see
+    `structopt.common.population.stragglers`). Cancelled individuals keep
+    their structure and get an infinite energy.
+
     Args:
         population (Population): the population to relax
     """
 
     to_relax = [individual for individual in population if not individual._relaxed]
-    ncores = gparameters.mpi.ncores
-    rank = gparameters.mpi.rank
-
-    individuals_per_core = {rank: [] for rank in range(ncores)}
-    for i, individual in enumerate(to_relax):
-        individuals_per_core[i % ncores].append(individual)
-
-    for individual in individuals_per_core[rank]:
-        individual.relaxations.LAMMPS.relax(individual)
-
-    if parameters.use_mpi4py:
-        population.allgather(individuals_per_core)
 
+    # Relaxed copies come back from other cores and processes
+    if parameters.get('timeouts') is None:
+        relaxed = get_executor(parameters.use_mpi4py).map_shards(relax_shard, to_relax)
+    else:
+        relaxed = map_individuals(relax_individual, to_relax, parameters, 'LAMMPS relaxation',
+                                  maximum=parameters['kwargs'].get('timeout', DEFAULT_TIMEOUT))
+        for i, individual in enumerate(relaxed):
+            if individual is None:
+                relaxed[i] = to_relax[i]
+                relaxed[i].LAMMPS = np.inf
+    population.update(relaxed)
+
+
+@single_core
+def relax_individual(individual, timeout=None):
+    module = individual.relaxations.LAMMPS
+    module.timeout = timeout
+    module.relax(individual)
+    return individual
+
+
+@single_core
+def relax_shard(individuals):
+    return relax_batch(individuals, 'LAMMPS')
@@ -1,5 +1,5 @@
-from structopt.tools import root, single_core, parallel
-import gparameters
+from structopt.tools import root, single_core, parallel, get_executor
+from structopt.common.population.relaxations import relax_batch
 
 
 @parallel
@@ -11,15 +11,12 @@ def relax(population, parameters):
     """
 
     to_relax = [individual for individual in population if not individual._relaxed]
-    ncores = gparameters.mpi.ncores
-    rank = gparameters.mpi.rank
 
-    individuals_per_core = {rank: [] for rank in range(ncores)}
-    for i, individual in enumerate(to_relax):
-        individuals_per_core[i % ncores].append(individual)
+    # Relaxed copies come back from other cores and processes
+    relaxed = get_executor(parameters.use_mpi4py).map_shards(relax_shard, to_relax)
+    population.update(relaxed)
 
-    for individual in individuals_per_core[rank]:
-        individual.relaxations.STEM.relax(individual)
 
-    if parameters.use_mpi4py:
-        population.allgather(individuals_per_core)
+@single_core
+def relax_shard(individuals):
+    return relax_batch(individuals, 'STEM')
@@ -1,9 +1,8 @@
 import logging
+from importlib import import_module
 
-from . import LAMMPS
-from . import STEM
-from . import hard_sphere_cutoff
 from structopt.tools import root, single_core, parallel
+from structopt.common.individual.relaxations import snapshot, touch_changed
 import gparameters
 
 
@@ -15,7 +14,8 @@ class Relaxations(object):
 
         # Store the relaxation modules in a list based on their specified order
         self.parameters = parameters
-        modules = [globals()[module] for module in self.parameters]
+        # Import only the relaxation modules that are used
+        modules = [import_module('{}.{}'.format(__name__, module)) for module in self.parameters]
         orders = [self.parameters[module]['order'] for module in self.parameters]
         modules_orders = list(zip(modules, orders))
         modules_orders = sorted(modules_orders, key=lambda modules_orders: modules_orders[1])
@@ -41,15 +41,51 @@ class Relaxations(object):
             if gparameters.mpi.rank == 0:
                 print("Running relaxation {} on the entire population".format(module.__name__.split('.')[-1]))
             parameters = self.parameters[module.__name__.split('.')[-1]]
+            before = snapshot(to_relax)
             module.relax(population, parameters=parameters)
+            touch_changed(population, before)
 
         for individual in population:
             individual._relaxed = True
+            individual.touched = None
 
         return
 
 
+    @parallel
+    def record(self, population):
+        """Lets the relaxation modules that keep track of the run (e.g. the
+        archive of basins) learn from the newly evaluated individuals.
+
+        Args:
+            population (Population): the evaluated population
+        """
+        for module in self.modules:
+            if hasattr(module, 'record'):
+                module.record(population, parameters=self.parameters[module.__name__.split('.')[-1]])
+
+
     @single_core
     def post_processing(self):
         pass
 
+
+@single_core
+def relax_batch(individuals, name):
+    """Relaxes `individuals` with their relaxation module `name`, e.g. one
+    rank's shard of the population, and returns them.
+
+    As in `structopt.common.population.fitnesses.fitness_batch`, the module
+    of the first individual relaxes the whole shard, with
+    ``relax_batch(individuals)`` if it defines it and otherwise with
+    ``relax(individual)`` for each individual.
+    """
+    if not individuals:
+        return []
+    module = getattr(individuals[0].relaxations, name)
+    if hasattr(module, 'relax_batch'):
+        module.relax_batch(individuals)
+    else:
+        for individual in individuals:
+            module.relax(individual)
+    return individuals
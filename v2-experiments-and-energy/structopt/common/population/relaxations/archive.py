@@ -0,0 +1,120 @@
+import os
+import logging
+
+from structopt.tools import single_core, parallel, get_executor
+import gparameters
+
+# The archive of the run, loaded from the checkpoint or created when first used
+archives = {}
+
+
+@parallel
+def relax(population, parameters):
+    """Looks up the individuals that have not been relaxed yet in the
+    archive of the basins found by the earlier generations, before the
+    relaxations that follow it in ``order``.
+
+    An individual whose descriptor (see
+    `structopt.common.individual.relaxations.archive`) belongs to a known
+    basin takes the relaxed structure of the basin and the values the
+    relaxation and fitness modules computed for it (e.g. its ``LAMMPS``
+    energy). It is not relaxed or evaluated again. The others are relaxed
+    and evaluated as usual and added to the archive afterwards (see
+    `record`), under the descriptors from before and after the relaxations.
+    Ordered after a cheap relaxation, e.g. ``hard_sphere_cutoff``, the
+    lookup uses the descriptors of the pre-relaxed structures.
+
+    The descriptors are computed on the ranks of the executor, and every
+    rank keeps the same archive. It is saved to ``checkpoint`` when it
+    changes and loaded from it at the start, if that file exists.
+
+    Args:
+        population (Population): the population to look up
+    """
+    logger = logging.getLogger('output')
+    archive = get_archive(parameters['kwargs'])
+
+    candidates = [individual for individual in population if not individual._relaxed]
+    for individual in candidates:
+        individual.basin_hit = False
+        individual.__dict__.pop('basin_descriptor', None)
+    descriptors = get_executor(parameters.use_mpi4py).map_shards(describe_shard, candidates)
+
+    hits = 0
+    for individual, (composition, descriptor) in zip(candidates, descriptors):
+        basin = archive.find(composition, descriptor)
+        if basin is None:
+            individual.basin_descriptor = (composition, descriptor)
+        else:
+            restore(individual, archive.basins[basin])
+            hits += 1
+    logger.info('Found {} of {} individuals in the {} known basins'.format(hits, len(candidates), len(archive)))
+
+
+@parallel
+def record(population, parameters):
+    """Adds the basins of the individuals that were relaxed and evaluated
+    since the last lookup to the archive, with the values of the
+    relaxation and fitness modules and the relaxed structure. A basin
+    found again keeps the record of the individual with the better
+    fitness."""
+    archive = get_archive(parameters['kwargs'])
+    new = [individual for individual in population
+           if 'basin_descriptor' in individual.__dict__
+           and getattr(individual, 'rejected_at', None) is None and individual._fitted]
+    if not new:
+        return
+
+    names = list(population.relaxations.parameters) + list(population.fitnesses.parameters)
+    descriptors = get_executor(parameters.use_mpi4py).map_shards(describe_shard, new)
+    for individual, relaxed in zip(new, descriptors):
+        basin = archive.find(*relaxed)
+        if basin is None:
+            basin = archive.add_basin(None)
+        if archive.basins[basin] is None or individual.fitness < archive.basins[basin]['fitness']:
+            archive.basins[basin] = {'fitness': individual.fitness,
+                                     'fitness_level': individual.fitness_level,
+                                     'values': {name: getattr(individual, name) for name in names
+                                                if getattr(individual, name, None) is not None},
+                                     'positions': individual.get_positions(),
+                                     'numbers': individual.get_atomic_numbers()}
+        archive.add(*relaxed, basin)
+        archive.add(*individual.basin_descriptor, basin)
+        del individual.basin_descriptor
+
+    checkpoint = parameters['kwargs'].get('checkpoint')
+    if checkpoint and gparameters.mpi.rank == 0:
+        archive.save(checkpoint)
+
+
+def get_archive(kwargs):
+    from structopt.common.crossmodule.basins import BasinArchive
+
+    if 'archive' not in archives:
+        checkpoint = kwargs.get('checkpoint')
+        if checkpoint and os.path.exists(checkpoint):
+            archives['archive'] = BasinArchive.load(checkpoint)
+        else:
+            settings = {key: kwargs[key] for key in ['resolution', 'tolerance', 'eps'] if key in kwargs}
+            archives['archive'] = BasinArchive(**settings)
+    return archives['archive']
+
+
+def restore(individual, record):
+    """Gives `individual` the relaxed structure and the values of a basin."""
+    if len(record['positions']) == len(individual):
+        individual.set_atomic_numbers(record['numbers'])
+        individual.set_positions(record['positions'])
+    for name, value in record['values'].items():
+        setattr(individual, name, value)
+    individual.fitness_level = record['fitness_level']
+    individual.basin_hit = True
+    individual._relaxed = True
+
+
+@single_core
+def describe_shard(individuals):
+    if not individuals:
+        return []
+    module = individuals[0].relaxations.archive
+    return [module.describe(individual) for individual in individuals]
@@ -0,0 +1,201 @@
+import os
+import logging
+import functools
+
+import numpy as np
+
+from structopt.tools import single_core, parallel, get_executor
+import gparameters
+
+# Fidelity level of individuals rejected by the cascade, above any STEM
+# pyramid level; those rejected at earlier stages are placed higher still
+REJECTED_LEVEL = 100
+
+# Stages that are pass/fail rather than ranked
+STAGE_DEFAULTS = {'overlap': {'max': 0}}
+
+# The surrogate models of the surrogate stages, by stage index
+surrogates = {}
+
+
+@parallel
+def relax(population, parameters):
+    """Screens the individuals that have not been relaxed yet through the
+    stages of the cascade, cheapest first, before the relaxations that
+    follow it in ``order``.
+
+    Each stage scores the remaining candidates (see
+    `structopt.common.individual.relaxations.cascade`) and passes those
+    whose score is at most the stage's threshold, plus ``margin`` times
+    its magnitude. The threshold is the stage's ``max`` if it has one,
+    otherwise the ``keep`` quantile of the scores of the candidates and of
+    the individuals that passed the stage before, and otherwise the score
+    the candidates have to beat to be among the ``nkeep`` best, i.e. to
+    survive the predators if the score were the fitness.
+
+    The ``surrogate`` stage is scored for the population as a whole, see
+    `surrogate_scores`.
+
+    Rejected individuals are not relaxed further, are skipped by the
+    fitness modules and get the rank of their score at the stage (between
+    0 and 1) as their fitness, at the fidelity level ``REJECTED_LEVEL``
+    plus the number of stages they did not pass, so they rank behind every
+    evaluated individual (see `stratify`).
+
+    Args:
+        population (Population): the population to screen
+    """
+    logger = logging.getLogger('output')
+    stages = parameters['kwargs'].get('stages', [])
+    executor = get_executor(parameters.use_mpi4py)
+    nkeep = getattr(population, 'initial_number_of_individuals', len(population))
+
+    candidates = [individual for individual in population if not individual._relaxed]
+    for individual in candidates:
+        individual.rejected_at = None
+        individual.fitness_level = 0
+        individual.cascade_scores = {}
+        individual.__dict__.pop('surrogate_features', None)
+
+    for index, stage in enumerate(stages):
+        if not candidates:
+            break
+        stage = dict(STAGE_DEFAULTS.get(stage['name'], {}), **stage)
+
+        if stage['name'] == 'surrogate':
+            scores = surrogate_scores(population, candidates, index, stage.get('kwargs', {}))
+            if scores is None:
+                logger.info('Cascade stage {} (surrogate) is still training'.format(index))
+                continue
+        else:
+            scores = executor.map_shards(functools.partial(score_shard, index=index), candidates)
+        for individual, score in zip(candidates, scores):
+            individual.cascade_scores[index] = score
+
+        pool = np.array([individual.cascade_scores[index] for individual in population
+                         if index in getattr(individual, 'cascade_scores', {})])
+        threshold = get_threshold(pool, stage, nkeep)
+
+        passed = []
+        for individual in candidates:
+            score = individual.cascade_scores[index]
+            if score <= threshold:
+                passed.append(individual)
+            else:
+                individual.rejected_at = index
+                individual.cascade_penalty = np.count_nonzero(pool <= score) / len(pool)
+                individual.fitness_level = REJECTED_LEVEL + len(stages) - index
+                individual._relaxed = True
+        logger.info('Cascade stage {} ({}) passed {} of {} individuals'.format(
+            index, stage['name'], len(passed), len(candidates)))
+        candidates = passed
+
+
+def get_threshold(pool, stage, nkeep):
+    """Returns the score up to which individuals pass `stage`, given the
+    scores in `pool`."""
+    pool = pool[np.isfinite(pool)]
+    if 'max' in stage:
+        threshold = stage['max']
+    elif len(pool) == 0:
+        return np.inf
+    elif 'keep' in stage:
+        threshold = np.percentile(pool, 100 * stage['keep'])
+    else:
+        threshold = np.sort(pool)[min(nkeep, len(pool)) - 1]
+    return threshold + stage.get('margin', 0.0) * abs(threshold)
+
+
+@single_core
+def score_shard(individuals, index):
+    if not individuals:
+        return []
+    return individuals[0].relaxations.cascade.score_batch(individuals, index)
+
+
+def surrogate_scores(population, candidates, index, kwargs):
+    """Scores `candidates` with the surrogate energy model of stage `index`
+    (see `structopt.common.crossmodule.surrogate`), as the predicted energy
+    per atom minus ``confidence`` (default 2) standard deviations, so only
+    candidates that are clearly worse are rejected.
+
+    The model is first trained on the individuals of `population` that
+    were scored by it before and have since been relaxed and evaluated,
+    from their descriptors before the relaxation and their energy after
+    it. The energy is taken from the attribute named by ``energy``
+    (default ``"LAMMPS"``) and divided by the number of atoms unless
+    ``per_atom`` is false, e.g. if the LAMMPS fitness already normalizes
+    it.
+
+    The score of those individuals becomes their energy, so the
+    candidates are compared with the actual energies of the population.
+    The errors of the earlier predictions are written to the timing log.
+    The model is saved to ``checkpoint`` after training and loaded from
+    it at the start, if that file exists.
+
+    Returns None until the model has seen ``min_samples`` (default 20)
+    structures; the descriptors of the candidates are kept for training
+    either way. ``cutoff``, ``n_radial``, ``lmax`` and ``alpha`` are
+    passed to the model.
+    """
+    from structopt.common.crossmodule.surrogate import Surrogate
+
+    checkpoint = kwargs.get('checkpoint')
+    if index not in surrogates:
+        if checkpoint and os.path.exists(checkpoint):
+            surrogates[index] = Surrogate.load(checkpoint)
+        else:
+            settings = {key: kwargs[key] for key in ['cutoff', 'n_radial', 'lmax', 'alpha'] if key in kwargs}
+            surrogates[index] = Surrogate(**settings)
+    model = surrogates[index]
+    if model.elements is None:
+        model.elements = sorted(set(z for individual in population for z in individual.numbers))
+
+    # Train on the individuals evaluated since the last generation
+    energy = kwargs.get('energy', 'LAMMPS')
+    trained = [individual for individual in population
+               if 'surrogate_features' in individual.__dict__ and individual.rejected_at is None
+               and individual._relaxed and getattr(individual, energy, None) is not None]
+    if trained:
+        energies = np.array([getattr(individual, energy) for individual in trained], dtype=float)
+        if kwargs.get('per_atom', True):
+            energies /= [len(individual) for individual in trained]
+        predictions = np.array([individual.surrogate_prediction for individual in trained])
+        model.update(trained, energies, np.array([individual.surrogate_features for individual in trained]))
+        for individual, e in zip(trained, energies):
+            del individual.surrogate_features
+            if not hasattr(individual, 'cascade_scores'):
+                individual.cascade_scores = {}
+            individual.cascade_scores[index] = e
+        log_surrogate(model, energies, predictions, kwargs.get('confidence', 2.0))
+        if checkpoint and gparameters.mpi.rank == 0:
+            model.save(checkpoint)
+
+    features = model.features(candidates)
+    mean, std = model.predict(candidates, features)
+    for individual, x, prediction in zip(candidates, features, zip(mean, std)):
+        individual.surrogate_features = x
+        individual.surrogate_prediction = prediction
+    if len(model) < kwargs.get('min_samples', 20):
+        return None
+    # Candidates the model cannot describe pass
+    scores = mean - kwargs.get('confidence', 2.0) * std
+    scores[~np.isfinite(scores)] = -np.inf
+    return list(scores)
+
+
+def log_surrogate(model, energies, predictions, confidence):
+    """Writes the errors of the surrogate predictions of newly evaluated
+    individuals to the timing log."""
+    logger = logging.getLogger('timing')
+    mean, std = predictions.T
+    predicted = np.isfinite(mean)
+    if not predicted.any():
+        logger.info('Surrogate: trained on {} structures'.format(len(model)))
+        return
+    errors = mean[predicted] - energies[predicted]
+    hits = np.absolute(errors) <= confidence * std[predicted]
+    logger.info('Surrogate: trained on {} structures; {} predictions: MAE {:.4f}, RMSE {:.4f} (energy per atom), '
+                '{:.0%} within {} standard deviations'.format(
+                    len(model), len(errors), np.absolute(errors).mean(), np.sqrt((errors**2).mean()),
+                    hits.mean(), confidence))
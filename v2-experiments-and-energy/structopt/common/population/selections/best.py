@@ -1,4 +1,3 @@
-import scipy.stats
 
 
 def best(population, fits):
@@ -12,6 +11,7 @@ def best(population, fits):
     fits : list
         Fitnesses that corresponds to population
     """
+    import scipy.stats
 
     # Get ranks of each population value based on its fitness
     ranks = list(scipy.stats.rankdata(fits, method='ordinal'))
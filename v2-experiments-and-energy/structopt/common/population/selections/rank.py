@@ -1,6 +1,5 @@
 from copy import deepcopy
 import numpy as np
-import scipy
 
 
 def rank(population, fits, p_min=None, unique_pairs=False, unique_parents=False):
@@ -29,6 +28,7 @@ def rank(population, fits, p_min=None, unique_pairs=False, unique_parents=False)
         If True, all parents can only mate with on other individual.
         True increases the diversity of the population.
     """
+    import scipy.stats
 
     # Get ranks of each population value based on its fitness
     ranks = scipy.stats.rankdata(fits, method='ordinal')
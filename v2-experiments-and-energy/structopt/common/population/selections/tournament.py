@@ -1,4 +1,3 @@
-import scipy
 import numpy as np
 from copy import deepcopy
 
@@ -28,6 +27,7 @@ def tournament(population, fits, tournament_size=5, unique_pairs=False,
         If True, all parents can only mate with on other individual.
         True increases the diversity of the population.
     """
+    import scipy.stats
 
     # Get ranks of each population value based on its fitness
     ranks = list(scipy.stats.rankdata(fits, method='ordinal'))
@@ -0,0 +1,71 @@
+"""Adaptive timeouts and straggler handling for the evaluations of
+individuals that run external programs, e.g. LAMMPS.
+
+They are set by the ``timeouts`` entry of a module's parameters::
+
+    "LAMMPS": {"order": 1, "use_mpi4py": true,
+               "timeouts": {"quantile": 0.9, "factor": 3, "minimum": 10, "quorum": 0.9},
+               "kwargs": {...}}
+
+The timeout of each evaluation is ``factor`` times the ``quantile`` of the
+durations of the earlier evaluations, at least ``minimum`` seconds and at
+most the module's fixed ``timeout`` kwarg or its default (see
+`structopt.tools.AdaptiveTimeout`). Once a ``quorum`` fraction of the
+individuals of a generation were evaluated, the others are given the
+``quantile`` duration to finish, after which they are cancelled and get
+a penalty; this needs an executor that evaluates the individuals
+independently, i.e. ``process_pool``. Evaluations that timed out count
+as lasting their timeout, and cancelled ones as lasting the time they
+were given after the quorum, so that the quantile is not fit to the
+fast evaluations only. The timeouts and the stragglers are written to
+the timing log.
+"""
+
+import time
+import logging
+import functools
+
+from structopt.tools import single_core, get_executor, AdaptiveTimeout
+
+# The timeouts of each module, by name
+trackers = {}
+
+TIMEOUT_SETTINGS = ['quantile', 'factor', 'minimum', 'min_samples', 'window']
+
+
+def map_individuals(func, individuals, parameters, name, maximum=None):
+    """Returns ``func(individual, timeout)`` of each of `individuals`, or
+    None for those given up on as stragglers, with the timeout and
+    straggler settings of ``parameters.timeouts`` (see the module
+    documentation). `func` sets ``individual._timed_out`` if the timeout
+    was reached. `maximum` is the longest timeout, in seconds, and `name`
+    identifies the module in the timing log."""
+    executor = get_executor(parameters.use_mpi4py)
+    settings = parameters['timeouts']
+    if name not in trackers:
+        kwargs = {key: settings[key] for key in TIMEOUT_SETTINGS if key in settings}
+        trackers[name] = AdaptiveTimeout(maximum=maximum, **kwargs)
+    tracker = trackers[name]
+    timeout, grace = tracker.timeout, tracker.typical
+
+    results, stragglers = executor.map_stragglers(functools.partial(timed_call, func, timeout=timeout), individuals,
+                                                  quorum=settings.get('quorum', 1.0), grace=grace)
+    finished = [result for result in results if result is not None]
+    tracker.observe([seconds for value, seconds, timed_out in finished if not timed_out],
+                    censored=[timeout for value, seconds, timed_out in finished if timed_out] + [grace] * len(stragglers))
+
+    timed_out = [individual.id for individual, result in zip(individuals, results) if result is not None and result[2]]
+    logger = logging.getLogger('timing')
+    logger.info('{}: timeout {}, {} of {} evaluations timed out {}, {} stragglers cancelled {}'.format(
+        name, 'none' if timeout is None else '{:.1f} s'.format(timeout), len(timed_out), len(individuals), timed_out,
+        len(stragglers), [individuals[i].id for i in stragglers]))
+    return [None if result is None else result[0] for result in results]
+
+
+@single_core
+def timed_call(func, individual, timeout):
+    """Returns ``func(individual, timeout)``, its duration and whether it
+    timed out."""
+    t_0 = time.time()
+    value = func(individual, timeout=timeout)
+    return value, time.time() - t_0, individual.__dict__.pop('_timed_out', False)
@@ -1,4 +1,4 @@
-from . import parameters, logger_utils, eam
+from . import parameters, logger_utils
 from .read_xyz import read_xyz
 from .write_xyz import write_xyz
 from .write_data import write_data
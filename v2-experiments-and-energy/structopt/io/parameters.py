@@ -5,7 +5,6 @@ import os
 import json
 import logging
 import time
-import distutils.spawn
 
 from structopt.tools.dictionaryobject import DictionaryObject
 
@@ -27,40 +26,56 @@ def read(input):
     return parameters
 
 
+def check_mpi_configuration():
+    """Checks that mpi4py was built against Open MPI and the `mpiexec` on
+    the PATH. Returns an error message, or None if the configuration is fine."""
+    import shutil
+    import mpi4py
+    from mpi4py import MPI
+
+    mpiexec = shutil.which("mpiexec")
+    if mpiexec is None:
+        return "Could not find 'mpiexec' on the PATH."
+    mpiexec_path, _ = os.path.split(mpiexec)
+    for executable, path in mpi4py.get_config().items():
+        if executable not in ['mpicc', 'mpicxx', 'mpif77', 'mpif90', 'mpifort']:
+            continue
+        if mpiexec_path not in path:
+            return "mpi4py may not be configured against the same version of 'mpiexec' that you are using. The 'mpiexec' path is {mpiexec_path} and mpi4py.get_config() returns:\n{mpi4py_config}\n".format(mpiexec_path=mpiexec_path, mpi4py_config=mpi4py.get_config())
+    if 'Open MPI' not in MPI.get_vendor():
+        return "mpi4py must have been installed against Open MPI in order for StructOpt to function correctly."
+    vendor_number = ".".join([str(x) for x in MPI.get_vendor()[1]])
+    if vendor_number not in mpiexec_path:
+        return "The MPI version that mpi4py was compiled against does not match the version of 'mpiexec'. mpi4py's version number is {}, and mpiexec's path is {}".format(MPI.get_vendor(), mpiexec_path)
+    return None
+
+
 def set_default_mpi_parameters(parameters):
     # If mpi4py is used, make sure we can import it and set the rank/size for all cores in the parameters.mpi
-    use_mpi4py = True
     if 'relaxations' in parameters:
         for module in parameters.relaxations:
             parameters.relaxations[module].setdefault('use_mpi4py', False)
             parameters.relaxations[module].setdefault('MPMD', 0)
-            if parameters.relaxations[module].use_mpi4py:
-                use_mpi4py = True
     if 'fitnesses' in parameters:
         for module in parameters.fitnesses:
             parameters.fitnesses[module].setdefault('use_mpi4py', False)
             parameters.fitnesses[module].setdefault('MPMD', 0)
-            if parameters.fitnesses[module].use_mpi4py:
-                use_mpi4py = True
+
+    # The executor runs the population-level stages: serial, process_pool or mpi
+    parameters.setdefault('executor', {'name': 'mpi'})
+    parameters.executor.setdefault('kwargs', {})
 
     parameters.setdefault('mpi', {})
-    if use_mpi4py:
+    if parameters.executor.name == 'mpi':
         try:
-            import mpi4py
+            from mpi4py import MPI
         except ImportError:
             raise ImportError("mpi4py must be installed to use StructOpt.")
-        mpiexec_path, _ = os.path.split(distutils.spawn.find_executable("mpiexec"))
-        for executable, path in mpi4py.get_config().items():
-            if executable not in ['mpicc', 'mpicxx', 'mpif77', 'mpif90', 'mpifort']:
-                continue
-            if mpiexec_path not in path:
-                raise ImportError("mpi4py may not be configured against the same version of 'mpiexec' that you are using. The 'mpiexec' path is {mpiexec_path} and mpi4py.get_config() returns:\n{mpi4py_config}\n".format(mpiexec_path=mpiexec_path, mpi4py_config=mpi4py.get_config()))
-        from mpi4py import MPI
-        if 'Open MPI' not in MPI.get_vendor():
-            raise ImportError("mpi4py must have been installed against Open MPI in order for StructOpt to function correctly.")
-        vendor_number = ".".join([str(x) for x in MPI.get_vendor()[1]])
-        if vendor_number not in mpiexec_path:
-            raise ImportError("The MPI version that mpi4py was compiled against does not match the version of 'mpiexec'. mpi4py's version number is {}, and mpiexec's path is {}".format(MPI.get_vendor(), mpiexec_path))
+        # The configuration is the same on every rank, so only check it once
+        error = check_mpi_configuration() if MPI.COMM_WORLD.Get_rank() == 0 else None
+        error = MPI.COMM_WORLD.bcast(error, root=0)
+        if error is not None:
+            raise ImportError(error)
 
         parameters.mpi.rank = MPI.COMM_WORLD.Get_rank()
         parameters.mpi.ncores = MPI.COMM_WORLD.Get_size()
@@ -103,6 +118,7 @@ def set_default(parameters):
     if 'post_processing' in parameters:
         parameters.post_processing.setdefault('XYZs', -1)
     parameters.setdefault('fingerprinters', DictionaryObject({}))
+    parameters.setdefault('pipeline', 'staged')
     if 'convergence' in parameters:
         parameters.convergence.setdefault('max_generations', 10)
     if 'fingerprinters' in parameters:
@@ -1,8 +1,7 @@
-import ase.io
-
-
 def read_xyz(filename, index=None, format=None, **kwargs):
     """Reads an xyz file into an ASE Atoms object and returns it."""
+    import ase.io
+
     atoms = ase.io.read(filename, index, format, **kwargs)
     f = open(filename, 'r')
     f.readline()  # natoms
@@ -1,8 +1,6 @@
-from ase.calculators.lammpsrun import Prism
-
-
 def write_data(filename, individual):
     """Function for writing the atom positions in a seperate file"""
+    from ase.calculators.lammpsrun import Prism
 
     individual.wrap()
     individual.center()
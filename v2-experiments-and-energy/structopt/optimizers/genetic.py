@@ -66,15 +66,11 @@ class GeneticAlgorithm(object):
             self.timing['crossover'].append(0)
             self.timing['mutation'].append(0)
 
-        t_relax_0 = time.time()
-        self.population.relax()
-        self.timing['relax'].append(time.time() - t_relax_0)
-
-        t_fitness_0 = time.time()
-        fits = self.population.calculate_fitnesses()
+        fits, timing = self.population.evaluate()
         if gparameters.mpi.rank == 0:
             print("All fitnesses:\n  {}".format(fits))
-        self.timing['fitness'].append(time.time() - t_fitness_0)
+        self.timing['relax'].append(timing['relax'])
+        self.timing['fitness'].append(timing['fitness'])
 
         t_fingerprinter_0 = time.time()
         killed_by_fingerprinters = self.population.apply_fingerprinters()
@@ -3,11 +3,100 @@ import sys
 import random
 import logging
 
+import numpy as np
+
 import structopt
 import gparameters
+from structopt.tools import root
 from structopt.common.population import Population
 
 
+class Swarm(object):
+    """The state of a particle swarm as contiguous (P, N, 3) arrays, for P
+    particles of N atoms: the current positions and velocities and the
+    best positions each particle has visited. The whole swarm moves in one
+    vectorized step (`move`), the same update as
+    `pso_moves.update_particle`.
+
+    The individuals of the population are handed views of the positions
+    (`materialize`) for the relaxations and fitnesses. Changes made in place
+    go straight into the swarm; changes that replace the view (or that were
+    made on copies, e.g. on other processes) are read back by
+    `update_bests`.
+
+    Parameters
+    ----------
+    population : Population
+        The particles, all with the same number of atoms.
+    omega, phi_p, phi_g : float
+        The inertia and the attraction to the particle's and the swarm's
+        best positions.
+    """
+
+    def __init__(self, population, omega, phi_p, phi_g):
+        self.omega, self.phi_p, self.phi_g = omega, phi_p, phi_g
+        self.positions = np.array([individual.get_positions() for individual in population])
+        velocities = [individual.get_velocities() for individual in population]
+        self.velocities = np.array([np.zeros((len(individual), 3)) if v is None else v
+                                    for individual, v in zip(population, velocities)])
+        self.best_positions = self.positions.copy()
+        self.best_fitnesses = np.full(len(population), np.inf)
+
+    @property
+    def best(self):
+        """The index of the particle with the best position of the swarm."""
+        return int(np.argmin(self.best_fitnesses))
+
+    def materialize(self, population):
+        """Points the positions of the individuals at views of the current
+        positions and marks them to be relaxed and fitted."""
+        for i, individual in enumerate(population):
+            individual.arrays['positions'] = self.positions[i].view()
+            individual._relaxed = False
+            individual.touched = None
+            individual._fitted = False
+            individual._Q_l = np.array([])
+
+    def update_bests(self, population, fits):
+        """Reads the positions back from the individuals after they were
+        relaxed and keeps those that improved on their particle's best.
+        Returns True if the best position of the swarm changed."""
+        for i, individual in enumerate(population):
+            positions = individual.arrays['positions']
+            if not np.shares_memory(positions, self.positions[i]):
+                self.positions[i] = positions
+
+        best = self.best_fitnesses.min()
+        fits = np.asarray(fits, dtype=float)
+        improved = fits < self.best_fitnesses
+        self.best_positions[improved] = self.positions[improved]
+        self.best_fitnesses[improved] = fits[improved]
+        return bool(self.best_fitnesses.min() < best)
+
+    def move(self):
+        """Moves every particle with one vectorized update of the whole swarm."""
+        self.positions, self.velocities = self._move()
+
+    @root
+    def _move(self):
+        """Computes the new positions and velocities on the root so that
+        every rank moves the same way."""
+        rp = np.random.rand(*self.positions.shape)
+        rg = np.random.rand(*self.positions.shape)
+        velocities = (self.omega * self.velocities
+                      + self.phi_p * rp * (self.best_positions - self.positions)
+                      + self.phi_g * rg * (self.best_positions[self.best] - self.positions))
+        return self.positions + velocities, velocities
+
+    def best_individual(self, population):
+        """Returns a copy of the best particle at the best position of the swarm."""
+        i = self.best
+        individual = list(population)[i].copy()
+        individual.set_positions(self.best_positions[i])
+        individual._fitness = self.best_fitnesses[i]
+        return individual
+
+
 class ParticleSwarmOptimization(object):
     """Defines methods to run a particle swarm optimization using the functions in the rest of the library."""
 
@@ -40,24 +129,15 @@ class ParticleSwarmOptimization(object):
                 self.population[id].id = id
                 self.population[id].rattle(stdev=0.5, seed=id)
 
-            self.population.relax()
-            fits = self.population.calcualte_fitnesses()
-            self.best_swarm = self.population[0].copy()
-            self.best_particles = [individual.copy() for individual in self.population]
+            kwargs = self.population.parameters.pso_moves.update_particles.kwargs
+            self.swarm = Swarm(self.population, kwargs.omega, kwargs.phi_p, kwargs.phi_g)
 
-        self.population.relax()
-        fits = self.population.calculate_fitnesses()
+        self.swarm.materialize(self.population)
+        fits, _ = self.population.evaluate()
+        self._is_best_swarm_updated = self.swarm.update_bests(self.population, fits)
+        self.best_swarm = self.swarm.best_individual(self.population)
 
-        if gparameters.generation > 0:
-            for i in range(len(self.population)):
-                if fits[i] < self.best_particles[i]._fitness:
-                    self.best_particles[i] = self.population[i].copy()
-                    if self.best_particles[i]._fitness < self.best_swarm._fitness:
-                        self.best_swarm = self.best_particles[i].copy()
-                        self._is_best_swarm_updated = True
-
-        updated_population = self.population.run_pso_moves(self.best_swarm, self.best_particles)
-        self.population.replace(updated_population)
+        self.swarm.move()
         self.check_convergence()
         self.post_processing_step()
         gparameters.generation += 1
@@ -85,8 +165,6 @@ class ParticleSwarmOptimization(object):
 
 
 if __name__ == "__main__":
-    import numpy as np
-
     parameters = structopt.setup(sys.argv[1])
 
     random.seed(parameters.seed)
@@ -1,5 +1,8 @@
+from .executors import get_executor
 from .parallel import root, single_core, parallel, allgather, parse_MPMD_cores_per_structure, get_rank, get_size
 from .random_three_vector import random_three_vector
 from .sorted_dict import SortedDict
-from .rotation_matrix import rotation_matrix
+from .rotation_matrix import rotation_matrix, rotation_matrices
 from .disjoint_set_merge import disjoint_set_merge
+from .changed_atoms import changed_atoms, atom_ids
+from .timeouts import AdaptiveTimeout
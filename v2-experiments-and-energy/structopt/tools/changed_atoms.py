@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def changed_atoms(old_positions, old_numbers, positions, numbers, old_ids=None, ids=None):
+    """Compares two versions of a structure atom by atom. Returns the
+    indices of the atoms that changed or were removed in the old version
+    and of those that changed or were added in the new version.
+
+    Without `old_ids` and `ids`, atoms are matched by index, so removing
+    an atom changes every atom after it. With them (see `atom_ids`), atoms
+    are matched by id."""
+    if old_ids is None or ids is None:
+        n = min(len(old_positions), len(positions))
+        changed = np.flatnonzero((old_positions[:n] != positions[:n]).any(axis=1) |
+                                 (old_numbers[:n] != numbers[:n]))
+        old = np.concatenate((changed, np.arange(n, len(old_positions))))
+        new = np.concatenate((changed, np.arange(n, len(positions))))
+        return old, new
+
+    common, i_old, i_new = np.intersect1d(old_ids, ids, assume_unique=True, return_indices=True)
+    changed = ((old_positions[i_old] != positions[i_new]).any(axis=1) |
+               (old_numbers[i_old] != numbers[i_new]))
+    removed = np.setdiff1d(np.arange(len(old_ids)), i_old)
+    added = np.setdiff1d(np.arange(len(ids)), i_new)
+    old = np.sort(np.concatenate((i_old[changed], removed)))
+    new = np.sort(np.concatenate((i_new[changed], added)))
+    return old, new
+
+
+def atom_ids(atoms):
+    """Returns an id for each atom of `atoms`. The ids are kept in the
+    'atom_ids' array of `atoms`, so they follow the atoms when others are
+    removed or reordered. Atoms without an id (e.g. added with `extend`)
+    or sharing one with an earlier atom are given new ids."""
+    ids = atoms.arrays.get('atom_ids')
+    if ids is None:
+        ids = np.zeros(len(atoms), int)
+    fresh = np.ones(len(ids), bool)
+    fresh[np.unique(ids, return_index=True)[1]] = False
+    fresh |= ids <= 0
+    if fresh.any() or 'atom_ids' not in atoms.arrays:
+        ids = ids.copy()
+        ids[fresh] = (ids.max() if len(ids) else 0) + 1 + np.arange(fresh.sum())
+        atoms.set_array('atom_ids', ids)
+    return ids.copy()
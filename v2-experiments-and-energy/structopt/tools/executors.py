@@ -0,0 +1,239 @@
+"""Execution backends for the population-level stages (relaxations, fitnesses,
+crossovers and fingerprinters).
+
+Every executor runs the same program on every rank and provides the same
+collective operations:
+
+* ``map(func, items)`` evaluates ``func`` on every item and returns the
+  results, in order, on every rank.
+* ``map_shards(func, items)`` splits ``items`` into one shard per worker and
+  evaluates ``func`` on each shard as a whole, for modules that are faster
+  on many items at once. ``func`` returns one result per item of its shard.
+* ``map_stragglers(func, items, quorum, grace)`` is `map` that gives up on
+  the items still running ``grace`` seconds after a ``quorum`` fraction of
+  them finished, where the executor can (see
+  `ProcessPoolExecutor.map_stragglers`), and also returns their indices.
+* ``scatter(items)`` returns the share of ``items`` this rank is responsible for.
+* ``gather(results, n)`` collects the shares back into a list of length ``n``
+  on every rank.
+* ``bcast(data)`` and ``allgather(data)`` behave like their MPI counterparts.
+
+The executor is selected with the ``executor`` parameter, e.g.::
+
+    "executor": {"name": "process_pool", "kwargs": {"max_workers": 8}}
+
+and defaults to ``mpi``.
+"""
+
+import os
+import sys
+import time
+import random
+import functools
+
+import numpy as np
+
+
+class SerialExecutor(object):
+    """Runs everything in the current process."""
+    rank = 0
+    size = 1
+
+    @property
+    def nworkers(self):
+        """The number of workers that items are split over by `split`."""
+        return 1
+
+    def map(self, func, items):
+        return [func(item) for item in items]
+
+    def map_shards(self, func, items):
+        items = list(items)
+        return merge(self.map(func, self.split(items)), len(items))
+
+    def map_stragglers(self, func, items, quorum=1.0, grace=None):
+        """Returns the results of `map`, with None for the items given up
+        on, and the indices of those items. Items evaluated one after the
+        other, or in lockstep on the MPI ranks, all run to completion."""
+        return self.map(func, items), []
+
+    def scatter(self, items):
+        return list(items)
+
+    def gather(self, results, n):
+        assert len(results) == n
+        return list(results)
+
+    def bcast(self, data, root=0):
+        return data
+
+    def allgather(self, data):
+        return [data]
+
+    def split(self, items):
+        """Splits `items` round-robin into one chunk per worker. `merge`
+        restores the original order."""
+        return [items[i::self.nworkers] for i in range(self.nworkers)]
+
+    def shutdown(self):
+        pass
+
+
+class ProcessPoolExecutor(SerialExecutor):
+    """Runs `map` on a pool of worker processes on a single node.
+
+    Everything except `map` behaves as in `SerialExecutor`. The functions and
+    items given to `map` must be picklable. Each task reseeds `random` and
+    `numpy.random` from the parent's generator so that the workers do not
+    share a random stream.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+
+    @property
+    def nworkers(self):
+        return self.max_workers
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def map(self, func, items):
+        items = list(items)
+        if len(items) <= 1 or self.max_workers == 1:
+            return [func(item) for item in items]
+        seeds = [random.getrandbits(32) for _ in items]
+        chunksize = max(1, len(items) // (4 * self.max_workers))
+        return list(self.pool.map(functools.partial(_seeded_call, func), seeds, items, chunksize=chunksize))
+
+    def map_stragglers(self, func, items, quorum=1.0, grace=None):
+        """Once a `quorum` fraction of `items` finished, waits at most
+        `grace` seconds for the others. The ones that have not started are
+        cancelled; those that are running are abandoned and occupy their
+        worker until they finish."""
+        from concurrent.futures import wait, FIRST_COMPLETED
+
+        items = list(items)
+        if quorum >= 1 or grace is None or len(items) <= 1 or self.max_workers == 1:
+            return self.map(func, items), []
+        seeds = [random.getrandbits(32) for _ in items]
+        futures = [self.pool.submit(_seeded_call, func, seed, item) for seed, item in zip(seeds, items)]
+        pending, deadline = set(futures), None
+        while pending:
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if deadline is None and len(futures) - len(pending) >= quorum * len(futures):
+                deadline = time.time() + grace
+            elif deadline is not None and not done:
+                break
+        for future in pending:
+            future.cancel()
+        stragglers = [i for i, future in enumerate(futures) if future in pending]
+        return [None if future in pending else future.result() for future in futures], stragglers
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class MPIExecutor(SerialExecutor):
+    """Distributes work round-robin over the ranks of ``MPI.COMM_WORLD``.
+
+    If `nworkers` is smaller than the number of ranks, only the first
+    `nworkers` ranks are given work and the results are shared with the rest.
+    """
+
+    def __init__(self, nworkers=None):
+        from mpi4py import MPI
+        self.comm = MPI.COMM_WORLD
+        self.rank = self.comm.Get_rank()
+        self.size = self.comm.Get_size()
+        self._nworkers = min(nworkers or self.size, self.size)
+
+    @property
+    def nworkers(self):
+        return self._nworkers
+
+    def map(self, func, items):
+        items = list(items)
+        return self.gather([func(item) for item in self.scatter(items)], len(items))
+
+    def scatter(self, items):
+        if self.rank >= self.nworkers:
+            return []
+        return list(items[self.rank::self.nworkers])
+
+    def gather(self, results, n):
+        results_per_rank = self.comm.allgather(results)
+        return merge(results_per_rank[:self.nworkers], n)
+
+    def bcast(self, data, root=0):
+        return self.comm.bcast(data, root=root)
+
+    def allgather(self, data):
+        return self.comm.allgather(data)
+
+
+EXECUTORS = {'serial': SerialExecutor,
+             'process_pool': ProcessPoolExecutor,
+             'mpi': MPIExecutor}
+
+_executor = None
+_executor_key = None
+
+
+def get_executor(use_mpi4py=True):
+    """Returns the executor selected by the ``executor`` parameter.
+
+    If no parameters have been set up, MPI is used if mpi4py has already been
+    imported and otherwise everything runs serially. With `use_mpi4py` False
+    (a module's ``use_mpi4py`` parameter), the work is not distributed: the
+    root does all of it and shares the results.
+    """
+    global _executor, _executor_key
+    import gparameters
+    parameters = gparameters.get('executor')
+    if parameters is not None:
+        key = (parameters['name'], tuple(sorted(parameters.get('kwargs', {}).items())))
+    elif 'mpi4py' in sys.modules:
+        key = ('mpi', ())
+    else:
+        key = ('serial', ())
+
+    if key != _executor_key:
+        if _executor is not None:
+            _executor.shutdown()
+        name, kwargs = key
+        if name not in EXECUTORS:
+            raise ValueError("Unknown executor '{}'. Use one of: {}".format(name, ', '.join(sorted(EXECUTORS))))
+        _executor = EXECUTORS[name](**dict(kwargs))
+        _executor_key = key
+
+    if not use_mpi4py:
+        if isinstance(_executor, MPIExecutor):
+            return MPIExecutor(nworkers=1)
+        return SerialExecutor()
+    return _executor
+
+
+def merge(chunks, n=None):
+    """Inverse of `SerialExecutor.split`: interleaves round-robin `chunks`
+    back into a single list."""
+    if n is None:
+        n = sum(len(chunk) for chunk in chunks)
+    merged = [None] * n
+    for i, chunk in enumerate(chunks):
+        merged[i::len(chunks)] = chunk
+    return merged
+
+
+def _seeded_call(func, seed, item):
+    random.seed(seed)
+    np.random.seed(seed)
+    return func(item)
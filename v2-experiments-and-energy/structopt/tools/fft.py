@@ -0,0 +1,70 @@
+"""Real FFTs that compute in the precision of their input.
+
+``numpy.fft`` always works in double precision. ``scipy.fft`` (scipy >= 1.4)
+keeps single precision inputs in single precision and is used when it is
+installed; otherwise the results of ``numpy.fft`` are cast back to the
+input precision. scipy is only imported on the first transform.
+"""
+
+import numpy as np
+
+PRECISIONS = {'single': np.float32, 'double': np.float64}
+
+_backend = None
+
+
+def get_dtype(precision):
+    """Returns the real dtype for a ``precision`` parameter, 'single' or 'double'."""
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision '{}'. Use one of: {}".format(precision, ', '.join(sorted(PRECISIONS))))
+    return PRECISIONS[precision]
+
+
+def backend():
+    """Returns ``scipy.fft`` if it is available and ``numpy.fft`` otherwise."""
+    global _backend
+    if _backend is None:
+        try:
+            import scipy.fft as _backend
+        except ImportError:
+            _backend = np.fft
+    return _backend
+
+
+def rfftn(a, s=None, axes=None):
+    """`numpy.fft.rfftn`, returning complex64 for float32 input."""
+    a = np.asarray(a)
+    dtype = np.result_type(a.dtype, np.complex64)
+    return backend().rfftn(a, s, axes).astype(dtype, copy=False)
+
+
+def irfftn(a, s=None, axes=None):
+    """`numpy.fft.irfftn`, returning float32 for complex64 input."""
+    a = np.asarray(a)
+    dtype = np.finfo(np.result_type(a.dtype, np.complex64)).dtype
+    return backend().irfftn(a, s, axes).astype(dtype, copy=False)
+
+
+def hermitian_half(spectrum):
+    """Returns the half of a real, FFT-ordered `spectrum` that `irfftn`
+    uses along the last axis, after symmetrizing it so that
+    ``irfftn(hermitian_half(spectrum) * rfftn(a), a.shape)`` equals
+    ``ifftn(spectrum * fftn(a)).real`` for any real `a`."""
+    mirrored = np.roll(spectrum[(slice(None, None, -1),) * spectrum.ndim],
+                       1, axis=tuple(range(spectrum.ndim)))
+    symmetric = 0.5 * (spectrum + mirrored)
+    return symmetric[..., :spectrum.shape[-1] // 2 + 1]
+
+
+def hermitian_full(half, n):
+    """Returns the full FFT of a real array, of length `n` along the last
+    axis, from its real FFT `half` (`rfftn`), using the symmetry of the
+    spectrum of a real array instead of transforming it again."""
+    m = half.shape[-1]
+    full = np.empty(half.shape[:-1] + (n,), half.dtype)
+    full[..., :m] = half
+    mirrored = half[..., n - m:0:-1].conj()
+    for axis in range(half.ndim - 1):
+        mirrored = np.roll(np.flip(mirrored, axis), 1, axis=axis)
+    full[..., m:] = mirrored
+    return full
@@ -1,5 +1,17 @@
+import os
 import sys
+import math
 import functools
+from collections import defaultdict
+
+import numpy as np
+
+from .executors import get_executor
+
+# Tags of the messages exchanged with programs spawned by `MPMD`
+MPMD_INPUT_TAG = 1
+MPMD_RESULT_TAG = 2
+MPMD_DONE_TAG = 3
 
 
 def get_rank():
@@ -30,16 +42,16 @@ def root(method=None, broadcast=True):
 
     @functools.wraps(method)
     def wrapper(*args, **kwargs):
-        if broadcast and 'mpi4py' in sys.modules:
-            from mpi4py import MPI
-            if MPI.COMM_WORLD.Get_rank() == 0:
+        executor = get_executor()
+        if broadcast and executor.size > 1:
+            if executor.rank == 0:
                 data = method(*args, **kwargs)
             else:
                 data = None
             if hasattr(data, 'bcast'):
                 data.bcast()
             else:
-                data = MPI.COMM_WORLD.bcast(data, root=0)
+                data = executor.bcast(data, root=0)
         else:
             data = method(*args, **kwargs)
         return data
@@ -65,7 +77,7 @@ def single_core(method):
 
 
 def allgather(stuff, stuffs_per_core):
-    """Performs an MPI.allgather on a selection of data and uses stuffs_per_core
+    """Performs an allgather on a selection of data and uses stuffs_per_core
     to parse out the correct information and return it.
 
     Args:
@@ -105,14 +117,13 @@ def allgather(stuff, stuffs_per_core):
     if hasattr(stuff, 'allgather'):
         raise TypeError('instance of {} has an `allgather` function that should be used instead'.format(stuff.__class__.__name__))
 
-    from mpi4py import MPI
     # The lists in stuffs_per_core all need to be of the same length
     max_stuffs_per_core = max(len(stuffs) for stuffs in stuffs_per_core.values())
     for rank, stuffs in stuffs_per_core.items():
         while len(stuffs) < max_stuffs_per_core:
             stuffs.append(None)
 
-    all_stuffs_per_core = MPI.COMM_WORLD.allgather(stuff)
+    all_stuffs_per_core = get_executor().allgather(stuff)
     correct_stuff = [None for _ in range(len(stuff))]
     for rank, indices in stuffs_per_core.items():
         for index in indices:
@@ -185,33 +196,36 @@ class SingleCorePerIndividual(object):
         allgather(self.results, positions_per_core)
 
 
-"""
-@root
-def fitness(population, parameters):
-    from mpi4py import MPI
-
-    to_fit = [individual for individual in population if not individual._fitted]
-
-    if to_fit:
-        spawn_args = [individual.fitnesses.FEMSIM.get_spawn_args(individual) for individual in to_fit]
-        MPMD(to_fit, spawn_args, parameters)
-
-        # Collect the results for each chisq and return them
-        logger = logging.getLogger('output')
-        for i, individual in enumerate(to_fit):
-            vk = individual.fitnesses.FEMSIM.get_vk_data()
-            individual.FEMSIM = individual.fitnesses.FEMSIM.chi2(vk)
-            logger.info('Individual {0} for FEMSIM evaluation had chisq {1}'.format(i, individual.FEMSIM))
+@root(broadcast=False)
+def MPMD(to_run, spawn_args, parameters, send=None, receive=None):
+    """Runs one MPI program per individual in `to_run`, spawning as many at
+    a time with ``MPI_Comm_spawn_multiple`` as the cores allow.
+
+    If `send` and `receive` are given, the inputs and results are exchanged
+    over the intercommunicator rather than through files. Once all programs
+    of a batch are spawned, ``send(intercomm, rank, individual)`` is called
+    for each of them, where `rank` is the first rank of that program in the
+    remote group. Then ``receive(intercomm, rank, individual)`` collects
+    each result, after which the program sends a single int with tag
+    ``MPMD_DONE_TAG``: 0 if it succeeded and an error code otherwise.
 
-    return [individual.FEMSIM for individual in population]
-"""
+    Args:
+        to_run (list<Individual>): the individuals to run the programs for
+        spawn_args (list<dict>): the 'command', 'args' and 'info' to spawn the
+            program of each individual with (see e.g. ``FEMSIM.get_spawn_args``)
+        parameters (dict): the module parameters; ``MPMD`` is the number of
+            cores per program
+        send (callable): sends the input of a program
+        receive (callable): receives the result of a program
 
-@root(broadcast=False)
-def MPMD(self, to_run, spawn_args, parameters):
-    """This is a function to run MPMD, with an example for FEMSIM above.
-    I'm not confident we should use it yet, but only because I haven't tested it; I'm relatively confident it will work.
+    Returns:
+        list: the results of `receive` (None without it) and the completion
+        codes, one (result, code) tuple per individual
     """
-    ncores = parameters.ncores
+    from mpi4py import MPI
+    import gparameters
+
+    ncores = gparameters.mpi.ncores
     cores_per_individual = ncores // len(to_run)
     # Round cores_per_individual down to nearest power of 2
     if cores_per_individual == 0:
@@ -226,18 +240,15 @@ def MPMD(self, to_run, spawn_args, parameters):
     elif cores_per_individual > minmax['max']:
         cores_per_individual = minmax['max']
 
-    # Setup each individual and get the inputs for each individual that need to be passed into the spawn
+    # Collect the inputs for each individual that need to be passed into the spawn
     multiple_spawn_args = defaultdict(list)
-    for individual in to_run:
-        for arg_name, arg in spawn_args.items():
+    for args in spawn_args:
+        for arg_name, arg in args.items():
             multiple_spawn_args[arg_name].append(arg)
 
-    # Make sure each key in `multiple_spawn_args` has the same number of elements and set `count` to that value
-    count = -1
+    # Make sure each key in `multiple_spawn_args` has the same number of elements
     for key, value in multiple_spawn_args.items():
-        if count != -1:
-            assert len(value) == count
-        count = len(value)
+        assert len(value) == len(to_run)
 
     # Create MPI.Info objects from the kwargs dicts in multiple_spawn_args['info'] for each rank
     infos = [MPI.Info.Create() for _ in multiple_spawn_args['info']]
@@ -246,7 +257,8 @@ def MPMD(self, to_run, spawn_args, parameters):
             info.Set(key, value)
 
     # Run the multiple spawn
-    individuals_per_iteration = ncores // cores_per_individual
+    results = []
+    individuals_per_iteration = max(1, ncores // cores_per_individual)  # Error correction if the user allowed more cores for MPMD than they are running on
     individuals_per_iteration = min(individuals_per_iteration, len(to_run))
     num_iterations = math.ceil(len(to_run) / individuals_per_iteration)
     for i in range(num_iterations):
@@ -255,12 +267,30 @@ def MPMD(self, to_run, spawn_args, parameters):
         if i == len(to_run) // individuals_per_iteration:  # The last iteration may not be exactly individuals_per_iteration
             individuals_this_iteration = len(to_run) % individuals_per_iteration
             cores_per_individual = ncores // individuals_this_iteration # All the cores available should be used
-        print("Spawning {} femsim processes, each with {} cores".format(individuals_this_iteration, cores_per_individual))
+        print("Spawning {} {} processes, each with {} cores".format(
+            individuals_this_iteration, os.path.basename(multiple_spawn_args['command'][j]), cores_per_individual))
         intercomm = MPI.COMM_SELF.Spawn_multiple(command=multiple_spawn_args['command'][j:j+individuals_this_iteration],
                                                  args=multiple_spawn_args['args'][j:j+individuals_this_iteration],
                                                  maxprocs=[cores_per_individual]*individuals_this_iteration,
                                                  info=infos[j:j+individuals_this_iteration]
                                                  )
+
+        # Exchange the inputs and results with the first rank of each program
+        batch = to_run[j:j+individuals_this_iteration]
+        ranks = [k * cores_per_individual for k in range(len(batch))]
+        if send is not None:
+            for rank, individual in zip(ranks, batch):
+                send(intercomm, rank, individual)
+        for rank, individual in zip(ranks, batch):
+            if receive is None:
+                results.append((None, 0))
+                continue
+            result = receive(intercomm, rank, individual)
+            code = np.empty(1, dtype=np.int32)
+            intercomm.Recv([code, MPI.INT], source=rank, tag=MPMD_DONE_TAG)
+            results.append((result, int(code[0])))
+
         # Disconnect the child processes
         intercomm.Disconnect()
 
+    return results
@@ -16,3 +16,20 @@ def rotation_matrix(axis, theta):
     return np.array([[aa+bb-cc-dd, 2*(bc+ad), 2*(bd-ac)],
                      [2*(bc-ad), aa+cc-bb-dd, 2*(cd+ab)],
                      [2*(bd+ac), 2*(cd-ab), aa+dd-bb-cc]])
+
+
+def rotation_matrices(axes, thetas):
+    """
+    Vectorized `rotation_matrix`: returns an (M, 3, 3) array of the
+    rotations about each of the (M, 3) `axes` by the (M,) `thetas`.
+    """
+    axes = np.asarray(axes, dtype=float)
+    axes = axes / np.linalg.norm(axes, axis=1)[:, None]
+    thetas = np.asarray(thetas, dtype=float)
+    a = np.cos(thetas/2.0)
+    b, c, d = (-axes*np.sin(thetas/2.0)[:, None]).T
+    aa, bb, cc, dd = a*a, b*b, c*c, d*d
+    bc, ad, ac, ab, bd, cd = b*c, a*d, a*c, a*b, b*d, c*d
+    return np.stack([np.stack([aa+bb-cc-dd, 2*(bc+ad), 2*(bd-ac)], axis=1),
+                     np.stack([2*(bc-ad), aa+cc-bb-dd, 2*(cd+ab)], axis=1),
+                     np.stack([2*(bd+ac), 2*(cd-ab), aa+dd-bb-cc], axis=1)], axis=1)
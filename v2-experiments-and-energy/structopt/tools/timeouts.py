@@ -0,0 +1,47 @@
+"""Timeouts that adapt to the observed durations of evaluations."""
+
+import collections
+
+import numpy as np
+
+
+class AdaptiveTimeout(object):
+    """Sets the timeout of an evaluation to `factor` times the `quantile`
+    of the durations of the last `window` evaluations that finished,
+    bounded by `minimum` and `maximum`. Until `min_samples` durations were
+    observed, the timeout is `maximum` (None for no timeout).
+    """
+
+    def __init__(self, quantile=0.9, factor=3.0, minimum=10.0, maximum=None, min_samples=10, window=500):
+        self.quantile = quantile
+        self.factor = factor
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_samples = min_samples
+        self.durations = collections.deque(maxlen=window)
+
+    def observe(self, durations, censored=()):
+        """Adds the durations (in seconds) of finished evaluations, and the
+        lower bounds of the durations of those that were stopped before
+        they finished (e.g. at their timeout). The bounds are counted as
+        durations, so that slow evaluations keep pulling the quantile up."""
+        self.durations.extend(durations)
+        self.durations.extend(censored)
+
+    @property
+    def typical(self):
+        """The `quantile` of the observed durations, or None before
+        `min_samples` were observed."""
+        if len(self.durations) < self.min_samples:
+            return None
+        return float(np.percentile(self.durations, 100 * self.quantile))
+
+    @property
+    def timeout(self):
+        typical = self.typical
+        if typical is None:
+            return self.maximum
+        timeout = max(self.factor * typical, self.minimum)
+        if self.maximum is not None:
+            timeout = min(timeout, self.maximum)
+        return timeout
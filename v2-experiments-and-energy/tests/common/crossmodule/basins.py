@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import numpy as np
+from ase.cluster import Icosahedron
+from structopt.common.crossmodule.basins import describe, BasinArchive
+from structopt.tools import rotation_matrix
+
+
+def test_describe():
+    atoms = Icosahedron('Cu', 3)
+    atoms.numbers[::3] = 79
+    composition, descriptor = describe(atoms)
+    assert composition == ((29, 36), (79, 19))
+
+    # Rotations, translations and permutations of the atoms do not change it
+    other = atoms[np.random.RandomState(0).permutation(len(atoms))]
+    other.positions = other.positions.dot(rotation_matrix([1.0, -2.0, 0.5], 1.1).T) + [3.0, -1.0, 2.0]
+    assert describe(other)[0] == composition
+    assert np.allclose(describe(other)[1], descriptor)
+
+    atoms.rattle(0.1, seed=0)
+    assert not np.allclose(describe(atoms)[1], descriptor, atol=1e-2)
+
+
+def test_archive():
+    archive = BasinArchive(tolerance=1e-2)
+    composition, descriptor = describe(Icosahedron('Cu', 2))
+    assert archive.find(composition, descriptor) is None
+    basin = archive.add_basin({'LAMMPS': -3.5})
+    archive.add(composition, descriptor, basin)
+
+    # Exact, nearby, distant and other compositions
+    assert archive.find(composition, descriptor) == basin
+    assert archive.find(composition, descriptor + 1e-3) == basin
+    assert archive.find(composition, descriptor + 1e-1) is None
+    assert archive.find(((79, 13),), descriptor) is None
+
+    filename = os.path.join(tempfile.mkdtemp(), 'basins.pkl')
+    archive.save(filename)
+    loaded = BasinArchive.load(filename)
+    assert len(loaded) == 1 and loaded.basins[0] == {'LAMMPS': -3.5}
+    assert loaded.find(composition, descriptor + 1e-3) == basin
+
+
+if __name__ == "__main__":
+    test_describe()
+    test_archive()
@@ -0,0 +1,36 @@
+import numpy as np
+from scipy.special import sph_harm
+from ase.lattice.cubic import FaceCenteredCubic
+from structopt.common.crossmodule.bond_order import sum_harmonics, order_parameters, bond_order
+from structopt.tools import rotation_matrix
+
+
+def test_harmonics():
+    rng = np.random.RandomState(0)
+    vectors = rng.normal(size=(50, 3))
+    vectors[:3] = [[0, 0, 1], [-1, -1, 0], [-1, 0.5, -0.3]]
+    sums = sum_harmonics(vectors, np.arange(50), 50, 12)
+
+    r = np.linalg.norm(vectors, axis=1)
+    azimuth, polar = np.arctan2(vectors[:, 1], vectors[:, 0]), np.arccos(vectors[:, 2] / r)
+    for l in range(13):
+        for m in range(l + 1):
+            assert np.allclose(sums[:, l, m], sph_harm(m, l, azimuth, polar))
+
+
+def test_fcc():
+    # Q_4 and Q_6 of the fcc nearest neighbor shell, in any orientation
+    atoms = FaceCenteredCubic('Cu', size=(3, 3, 3), latticeconstant=3.6)
+    rotated = atoms.positions.dot(rotation_matrix([1.0, 2.0, -0.5], 0.7).T)
+    Q_l, q_lm = bond_order([atoms, rotated], [4, 6], cutoff=3.0, per_atom=True)
+    assert np.allclose(Q_l, [[0.19094, 0.57452]] * 2, atol=1e-5)
+
+    # The atom in the middle has all its neighbors
+    center = np.argmin(np.linalg.norm(atoms.positions - atoms.positions.mean(axis=0), axis=1))
+    for q in q_lm:
+        assert np.allclose(order_parameters(q[center], [4, 6]), [0.19094, 0.57452], atol=1e-5)
+
+
+if __name__ == "__main__":
+    test_harmonics()
+    test_fcc()
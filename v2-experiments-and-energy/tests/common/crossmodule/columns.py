@@ -0,0 +1,42 @@
+import numpy as np
+from ase.cluster import FaceCenteredCubic
+from structopt.common.individual import Individual
+from structopt.common.crossmodule import get_columns
+
+
+def make_individual():
+    individual = Individual(load_modules=False)
+    individual.extend(FaceCenteredCubic('Au', [(1, 0, 0), (1, 1, 0), (1, 1, 1)], [3, 4, 3]))
+    individual.set_cell([30.0, 30.0, 30.0])
+    individual.center()
+    return individual
+
+
+def test_columns():
+    individual = make_individual()
+    pos = individual.positions
+    columns = get_columns(individual, 0.5)
+
+    # Atoms share a column exactly when they have the same xy coordinates
+    xys = np.round(pos[:, :2], 3)
+    assert len(columns) == len(np.unique(xys, axis=0))
+    for indices in columns.indices:
+        assert (xys[indices] == xys[indices[0]]).all()
+    assert columns.heights.sum() == len(individual)
+    assert np.allclose(columns.xys[columns.labels], pos[:, :2])
+    assert np.allclose(pos[columns.top, 2], [pos[indices, 2].max() for indices in columns.indices])
+    assert np.allclose(pos[columns.bottom, 2], [pos[indices, 2].min() for indices in columns.indices])
+
+
+def test_columns_cache():
+    individual = make_individual()
+    columns = get_columns(individual, 0.5)
+    assert get_columns(individual, 0.5) is columns
+    assert get_columns(individual, 0.6) is not columns
+    individual.translate([0.0, 0.0, 1.0])
+    assert get_columns(individual, 0.6) is not columns
+
+
+if __name__ == "__main__":
+    test_columns()
+    test_columns_cache()
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+from scipy.special import j0
+from ase.io import read
+from structopt.common.crossmodule.fem import FEMSimulator, variance
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                       'examples', 'genetic', 'periodic', 'Al-metallic-glass')
+
+
+def make_model(natoms=60, size=12.0, seed=0):
+    rng = np.random.RandomState(seed)
+    positions = rng.uniform(0, size, (natoms, 3))
+    numbers = rng.choice([13, 29], natoms)
+    return positions, numbers
+
+
+def test_intensities():
+    # The binned pair sums match a direct sum over the atoms in each pixel
+    size = 12.0
+    positions, numbers = make_model(size=size)
+    k = np.linspace(0.2, 0.8, 7)
+    simulator = FEMSimulator(size, k, 0.2, 2, 2, 1)
+    assert len(simulator.pixels) == 9
+    intensities = simulator.intensities(positions, numbers)
+
+    images, image_numbers = simulator.images(positions, numbers)
+    for r, rotation in enumerate(simulator.rotations):
+        rotated = images.dot(rotation.T)
+        inside = (np.absolute(rotated) < size / 2).all(axis=1)
+        xys, zs = rotated[inside, :2], image_numbers[inside]
+        for p, pixel in enumerate(simulator.pixels):
+            distances = np.sqrt(((xys - pixel)**2).sum(axis=1))
+            members = distances < simulator.resolution
+            w = zs[members] * simulator.probe(distances[members])
+            rij = np.sqrt(((xys[members, None] - xys[None, members])**2).sum(axis=2))
+            expected = np.einsum('i,j,ijk->k', w, w, j0(2 * np.pi * rij[:, :, None] * k))
+            assert np.allclose(intensities[r, p], expected, rtol=1e-3, atol=1e-3 * expected.max())
+
+
+def test_update():
+    size = 12.0
+    positions, numbers = make_model(size=size)
+    simulator = FEMSimulator(size, np.linspace(0.2, 0.8, 7), 0.2, 2, 3, 2)
+    intensities = simulator.intensities(positions, numbers)
+
+    # Move two atoms, remove one and add one
+    new_positions = np.append(positions[:-1], [[1.0, 2.0, 3.0]], axis=0)
+    new_numbers = np.append(numbers[:-1], 29)
+    new_positions[[3, 7]] += [[0.5, -0.3, 0.2], [-1.0, 0.4, 13.0]]
+    unchanged = np.setdiff1d(np.arange(len(positions) - 1), [3, 7])
+    old, new = [3, 7, len(positions) - 1], [3, 7, len(positions) - 1]
+
+    updated = simulator.update(intensities, (positions[unchanged], numbers[unchanged]),
+                               (positions[old], numbers[old]), (new_positions[new], new_numbers[new]))
+    assert np.allclose(updated, simulator.intensities(new_positions, new_numbers))
+
+
+def test_femsim_agreement():
+    # V(k) of the example model agrees with femsim's, computed with
+    # 1 x 80 x 40 = 3200 rotations, already with 1 x 20 x 10 = 200 of them
+    model = read(os.path.join(EXAMPLE, 'relax_497.xyz'))
+    data = np.loadtxt(os.path.join(EXAMPLE, 'phantom_497.txt'), skiprows=1)
+    k, femsim_vk = data[:, 0], data[:, 1]
+
+    simulator = FEMSimulator(19.65790858, k, 0.03286502, 1, 20, 10)
+    vk = variance(simulator.intensities(model.positions, model.numbers))
+    assert np.argmax(vk) == np.argmax(femsim_vk)
+    assert np.corrcoef(vk, femsim_vk)[0, 1] > 0.78
+    assert abs(vk.mean() / femsim_vk.mean() - 1) < 0.1
+
+
+if __name__ == "__main__":
+    test_intensities()
+    test_update()
+    test_femsim_agreement()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+import numpy as np
+from ase.cluster import Icosahedron
+from ase.calculators.emt import EMT
+from structopt.common.crossmodule.surrogate import Surrogate
+
+
+def make_structures(n, seed):
+    rng = np.random.RandomState(seed)
+    structures, energies = [], []
+    for _ in range(n):
+        atoms = Icosahedron('Cu', 3)
+        atoms.numbers[rng.rand(len(atoms)) < 0.3] = 79
+        atoms.rattle(rng.uniform(0.02, 0.3), seed=rng.randint(1000000))
+        atoms.set_calculator(EMT())
+        structures.append(atoms)
+        energies.append(atoms.get_potential_energy() / len(atoms))
+    return structures, np.array(energies)
+
+
+def test_surrogate():
+    structures, energies = make_structures(60, 0)
+    test_structures, test_energies = make_structures(20, 1)
+
+    # Training generation by generation is the same as all at once
+    model = Surrogate()
+    for i in range(0, 60, 20):
+        model.update(structures[i:i + 20], energies[i:i + 20])
+    batch = Surrogate(elements=[29, 79])
+    batch.update(structures, energies)
+    mean, std = model.predict(test_structures)
+    assert np.allclose((mean, std), batch.predict(test_structures))
+
+    errors = np.absolute(mean - test_energies)
+    assert errors.mean() < 0.3 * test_energies.std()
+    assert np.mean(errors < 2 * std) > 0.8
+
+    filename = os.path.join(tempfile.mkdtemp(), 'surrogate.npz')
+    model.save(filename)
+    assert np.allclose(Surrogate.load(filename).predict(test_structures), (mean, std))
+
+    # Unknown elements are not predicted
+    test_structures[0].numbers[0] = 47
+    mean, std = model.predict(test_structures[:1])
+    assert np.isnan(mean[0]) and np.isinf(std[0])
+
+
+if __name__ == "__main__":
+    test_surrogate()
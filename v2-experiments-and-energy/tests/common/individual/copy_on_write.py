@@ -0,0 +1,42 @@
+import numpy as np
+from structopt.common.individual.relaxations.hard_sphere_cutoff import hard_sphere_cutoff
+from tests.helpers import make_cluster
+
+
+def test_copy_on_write():
+    individual = make_cluster()
+    positions = individual.get_positions()
+
+    clone = individual.copy()
+    assert np.shares_memory(clone.arrays['positions'], individual.arrays['positions'])
+
+    clone[0].position = [1.0, 2.0, 3.0]
+    clone[1].symbol = 'Pt'
+    assert np.allclose(clone.positions[0], [1.0, 2.0, 3.0])
+    assert np.allclose(individual.positions, positions)
+    assert individual[1].symbol == 'Au'
+
+    individual.translate([1.0, 0.0, 0.0])
+    assert np.allclose(individual.positions, positions + [1.0, 0.0, 0.0])
+    assert np.allclose(clone.positions[1:], positions[1:])
+
+
+def test_relax_copy_and_parent():
+    individual = make_cluster()
+    # Squeeze the cluster so that the hard-sphere cutoff moves atoms apart
+    individual.set_cell([8.0, 8.0, 8.0], scale_atoms=True)
+    positions = individual.get_positions()
+
+    clone = individual.copy()
+    relaxation = hard_sphere_cutoff(parameters=None, cutoff=2.0)
+    relaxation.relax(clone)
+    assert not np.allclose(clone.positions, positions)
+    assert np.allclose(individual.positions, positions)
+
+    relaxation.relax(individual)
+    assert np.allclose(individual.positions, clone.positions)
+
+
+if __name__ == "__main__":
+    test_copy_on_write()
+    test_relax_copy_and_parent()
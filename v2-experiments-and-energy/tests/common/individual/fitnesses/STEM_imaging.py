@@ -0,0 +1,203 @@
+import os
+
+import numpy as np
+from ase.io import read
+
+from structopt.common.individual import Individual
+from structopt.common.individual.fitnesses.STEM import STEM, fourier_downsample
+from structopt.common.population.fitnesses import stratify
+from structopt.tools import changed_atoms, atom_ids
+from tests.helpers import make_cluster
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..', 'examples',
+                       'genetic', 'aperiodic', 'Au55-STEM-move_surface_atoms_STEM-parallel')
+
+
+def make_module(**kwargs):
+    kwargs = dict({'HWHM': 0.4, 'dimensions': [20.0, 20.0], 'resolution': 5.0, 'zed': 1.7}, **kwargs)
+    return STEM({'kwargs': kwargs})
+
+
+def make_individual(atoms=None):
+    if atoms is not None:
+        individual = Individual(load_modules=False)
+        individual.fitnesses = None
+        individual.extend(atoms)
+        individual.set_cell([20.0, 20.0, 20.0])
+        individual.center()
+        return individual
+
+    # Put some atoms across the edges of the image
+    individual = make_cluster()
+    positions = individual.get_positions()
+    positions[:5] -= [10.0, 10.0, 0.0]
+    individual.set_positions(positions)
+    return individual
+
+
+def test_backends():
+    individual = make_individual()
+    fft = make_module(imaging='fft').get_image(individual.copy())
+    splat = make_module(imaging='splat').get_image(individual.copy())
+    assert np.allclose(splat, fft, rtol=0, atol=1e-5 * fft.max())
+
+
+def test_incremental_image():
+    module = make_module()
+    individual = make_individual()
+    module.get_image(individual)
+
+    # Move one atom, change another and remove the last one on a copy
+    mutated = individual.copy()
+    positions = mutated.get_positions()
+    positions[3] += [1.3, -0.7, 0.2]
+    mutated.set_positions(positions)
+    mutated[10].symbol = 'Pt'
+    mutated.pop()
+
+    image = module.get_image(mutated)
+    del mutated._STEM_state
+    full = module.get_image(mutated)
+    assert np.allclose(image, full, rtol=0, atol=1e-5 * full.max())
+
+    # Large changes are not stamped on the old image
+    mutated.rattle(0.1)
+    full = module.convolve_psf(module.get_linear_convolution(mutated))
+    assert np.allclose(module.get_image(mutated), full, rtol=0, atol=1e-5 * full.max())
+
+    # Atoms are matched by id, so removing the first atom only changes that atom
+    ids = atom_ids(mutated)
+    state = mutated._STEM_state[module.get_key()]
+    del mutated[0]
+    assert np.array_equal(atom_ids(mutated), ids[1:])
+    old, new = changed_atoms(state['positions'], state['numbers'], mutated.get_positions(),
+                             mutated.get_atomic_numbers(), state['ids'], atom_ids(mutated))
+    assert list(old) == [0] and list(new) == []
+
+    # Each level of the pyramid keeps its own image, and the image is
+    # recomputed from scratch after refresh_interval updates
+    module = make_module(pyramid_levels=1, refresh_interval=2)
+    module.target = module.get_image(make_individual())
+    individual = make_individual()
+    for level in [0, 1, 0]:
+        module.get_level(level).get_image(individual)
+    assert len(individual._STEM_state) == 2
+    updates = []
+    for i in range(3):
+        individual[i].x += 0.5
+        module.get_image(individual)
+        updates.append(individual._STEM_state[module.get_key()]['updates'])
+    assert updates == [1, 2, 0]
+
+
+def test_registration():
+    module = make_module()
+    individual = make_individual()
+    module.target = module.get_image(individual)
+
+    shifted = individual.copy()
+    shifted.translate([0.73, -1.21, 0.0])
+    y, x = module.get_shift(module.get_image(shifted))
+    assert np.allclose([x, y], [-0.73 * 5, 1.21 * 5], atol=0.02)
+
+    image, x_shift, y_shift = module.cross_correlate(module.get_image(shifted))
+    assert (x_shift, y_shift) == (-4, 6)
+
+
+def test_pyramid():
+    image = np.random.random((100, 100))
+    assert np.isclose(fourier_downsample(image, (50, 50)).sum(), image.sum())
+
+    # The coarse target is close to a coarse image of the same structure
+    module = make_module(pyramid_levels=1, imaging='fft')
+    individual = make_individual()
+    module.target = module.get_image(individual)
+    coarse = module.get_level(1)
+    assert coarse.target.shape == (50, 50)
+    image = coarse.get_image(individual)
+    assert np.linalg.norm(image - coarse.target) < 0.1 * np.linalg.norm(image)
+    individual.rattle(0.3, seed=1)
+    image = coarse.get_image(individual)
+    assert np.linalg.norm(image - coarse.target) > 0.3 * np.linalg.norm(image)
+
+    # Fitnesses at a coarse level rank behind those at full resolution
+    fitnesses = stratify([3.0, 1.0, 2.0, 0.5], [0, 1, 0, 1])
+    assert list(np.argsort(fitnesses)) == [2, 0, 3, 1]
+    assert np.isclose(fitnesses[1] - fitnesses[3], 0.5)
+
+
+def test_precision():
+    # Rank the example structures, and rattled copies of them, against the
+    # example target in single and double precision
+    structures = []
+    for name in ['decahedron', 'cuboctahedron', 'icosahedron']:
+        atoms = read(os.path.join(EXAMPLE, 'Au55-{}.xyz'.format(name)))
+        for i in range(4):
+            individual = make_individual(atoms)
+            individual.rattle(0.05 * i, seed=i)
+            structures.append(individual)
+
+    fitnesses = {}
+    for precision in ['double', 'single']:
+        module = make_module(precision=precision, zed=1, normalize={'SSE': True, 'nprotons': True})
+        module.target = module.get_image(structures[0])
+        fitnesses[precision] = np.array([module.calculate_fitness(individual) for individual in structures])
+        assert module.get_image(structures[0]).dtype == module.dtype
+
+    assert np.allclose(fitnesses['single'], fitnesses['double'], rtol=0, atol=1e-5 * fitnesses['double'].max())
+    assert (np.argsort(fitnesses['single']) == np.argsort(fitnesses['double'])).all()
+
+
+def test_products():
+    module = make_module(normalize={'SSE': True})
+    individual = make_individual()
+    module.target = module.get_image(individual)
+    individual.rattle(0.1, seed=0)
+    fitness = module.calculate_fitness(individual)
+
+    # The products of the fitness are reused by another module with the
+    # same parameters, and by copies of the individual
+    products = individual._STEM_products
+    other = make_module(normalize={'SSE': True})
+    assert other.get_products(individual.copy()) is products
+    assert np.isclose(np.sum(np.square(products['contrast'])) ** 0.5, fitness)
+    assert not products['contrast'].flags.writeable
+
+    # Changing the structure or the parameters invalidates them
+    other.target = module.target
+    mutated = individual.copy()
+    mutated[0].symbol = 'Pt'
+    assert other.get_products(mutated) is not products
+    other = make_module(zed=1.5)
+    other.target = module.target
+    assert other.get_products(individual) is not products
+
+
+def test_batch():
+    module = make_module(pyramid_levels=1, imaging='fft', normalize={'SSE': True})
+    module.target = module.get_image(make_individual())
+    structures = []
+    for i in range(5):
+        individual = make_individual()
+        individual.translate([1.3 * i, -0.7 * i, 0.0])
+        individual.rattle(0.05, seed=i)
+        structures.append(individual)
+
+    # Aligning the images together, in blocks, matches aligning them one at a time
+    images = [module.get_image(individual) for individual in structures]
+    for image, (aligned, x_shift, y_shift) in zip(images, module.cross_correlate_batch(images, batch_size=2)):
+        assert (y_shift, x_shift) == tuple(module.get_shift(image, upsample_factor=1))
+        assert np.array_equal(aligned, np.roll(np.roll(image, x_shift, axis=1), y_shift, axis=0))
+    for level in [0, 1]:
+        batch = module.fitness_batch([individual.copy() for individual in structures], level)
+        assert np.allclose(batch, [module.calculate_fitness(individual.copy(), level) for individual in structures])
+
+
+if __name__ == "__main__":
+    test_backends()
+    test_incremental_image()
+    test_registration()
+    test_pyramid()
+    test_precision()
+    test_products()
+    test_batch()
@@ -0,0 +1,44 @@
+import numpy as np
+from ase import Atoms
+from tests.helpers import make_cluster
+
+
+def test_positions_view():
+    individual = make_cluster()
+
+    positions = individual.positions
+    assert np.shares_memory(positions, individual.arrays['positions'])
+    assert not positions.flags.writeable
+    try:
+        positions[0] = 0.0
+    except ValueError:
+        pass
+    else:
+        assert False, "positions should be read-only"
+
+    individual.set_positions(individual.get_positions() + 1.0)
+    assert np.allclose(positions, individual.get_positions())
+
+    individual.center()
+    assert np.allclose(individual.positions.mean(axis=0), 10.0)
+
+
+def test_ase_writers():
+    individual = make_cluster()
+
+    # The ase.Atoms methods that write through the positions array still work
+    reference = Atoms(positions=individual.get_positions(), cell=individual.get_cell())
+    for atoms in [individual, reference]:
+        atoms.set_cell([22.0, 22.0, 22.0], scale_atoms=True)
+        atoms.set_distance(0, 1, 3.0)
+        atoms.set_angle([0, 1, 2], 1.5, mask=[0, 0, 1] + [0] * (len(atoms) - 3))
+        atoms.set_dihedral([0, 1, 2, 3], 1.0, mask=[0, 0, 0, 1] + [0] * (len(atoms) - 4))
+        atoms.wrap()
+        atoms.set_scaled_positions(atoms.get_scaled_positions())
+    assert np.allclose(individual.get_positions(), reference.get_positions())
+    assert np.allclose(individual.get_cell(), reference.get_cell())
+
+
+if __name__ == "__main__":
+    test_positions_view()
+    test_ase_writers()
@@ -0,0 +1,89 @@
+import os
+import random
+import tempfile
+
+import numpy as np
+from structopt.tools.dictionaryobject import DictionaryObject
+from structopt.common.individual.mutations import Mutations
+from structopt.common.individual.relaxations import snapshot, touch_changed
+from structopt.common.individual.relaxations.LAMMPS import LAMMPS
+from structopt.common.individual.relaxations.hard_sphere_cutoff import hard_sphere_cutoff
+from structopt.common.crossmodule.lammps import LAMMPS as lammps
+from tests.helpers import make_cluster
+
+
+def test_local_relaxation():
+    random.seed(0)
+    individual = make_cluster('Au', 4, cell=30.0)
+    individual._relaxed = True
+
+    # Mutations record the atoms they move until the next relaxation
+    mutations = Mutations(DictionaryObject({'move_atoms': {'probability': 1.0, 'kwargs': {}}}))
+    mutations.select_mutation()
+    touched = []
+    for _ in range(2):
+        positions = individual.get_positions()
+        mutations.mutate(individual)
+        touched.extend(np.flatnonzero((individual.positions != positions).any(axis=1)))
+    assert np.array_equal(individual.touched, np.unique(touched))
+
+    # Only the atoms around them are relaxed
+    relaxation = LAMMPS(DictionaryObject({'kwargs': {'local_shell': 3.0, 'minimize': '1e-8 1e-8 5000 10000',
+                                                     'polish_minimize': '1e-4 1e-4 100 1000'}}))
+    free = relaxation.get_free_atoms(individual)
+    distances = individual.get_all_distances()[individual.touched]
+    assert np.array_equal(free, np.flatnonzero((distances < 3.0).any(axis=0)))
+    assert len(free) < len(individual)
+
+    parameters = dict(relaxation.parameters, free_atoms=free)
+    lammps.update_parameters_from_atoms(parameters, individual)
+    filename = os.path.join(tempfile.mkdtemp(), 'input.lammps')
+    lammps.write_input(filename, individual, parameters, [], 'trj.lammps', 'data.lammps')
+    with open(filename) as f:
+        lines = f.read().split('\n')
+    ids = set()
+    for item in lines[lines.index('group frozen subtract all free') - 1].split()[3:]:
+        first, _, last = item.partition(':')
+        ids.update(range(int(first), int(last or first) + 1))
+    assert ids == set(free + 1)
+    assert lines.index('fix freeze frozen setforce 0.0 0.0 0.0') < lines.index('minimize 1e-8 1e-8 5000 10000') \
+        < lines.index('unfix freeze') < lines.index('minimize 1e-4 1e-4 100 1000')
+
+    # Without a record of the changes, everything is relaxed
+    individual.touched = None
+    assert relaxation.get_free_atoms(individual) is None
+
+
+def test_local_relaxation_after_hard_sphere():
+    individual = make_cluster('Au', 4, cell=30.0)
+    individual.touched = np.array([0])
+
+    # Squeeze two atoms far from the touched one together
+    distances = individual.get_distances(0, list(range(len(individual))))
+    far = int(np.argmax(distances))
+    near = int(np.argsort(individual.get_distances(far, list(range(len(individual)))))[1])
+    positions = individual.get_positions()
+    positions[far] = positions[near] + 0.3 * (positions[far] - positions[near]) / np.linalg.norm(positions[far] - positions[near])
+    individual.set_positions(positions)
+
+    # The atoms the hard-sphere cutoff pushes apart are relaxed by LAMMPS too
+    before = snapshot([individual])
+    hard_sphere_cutoff(parameters=None).relax(individual)
+    touch_changed([individual], before)
+    moved = np.flatnonzero((individual.get_positions() != positions).any(axis=1))
+    assert far in moved and near in moved
+    relaxation = LAMMPS(DictionaryObject({'kwargs': {'local_shell': 3.0, 'minimize': '1e-8 1e-8 5000 10000'}}))
+    free = relaxation.get_free_atoms(individual)
+    assert set(moved) | {0} <= set(free)
+
+    parameters = dict(relaxation.parameters, free_atoms=free)
+    lammps.update_parameters_from_atoms(parameters, individual)
+    filename = os.path.join(tempfile.mkdtemp(), 'input.lammps')
+    lammps.write_input(filename, individual, parameters, [], 'trj.lammps', 'data.lammps')
+    with open(filename) as f:
+        assert 'group frozen subtract all free' in f.read()
+
+
+if __name__ == "__main__":
+    test_local_relaxation()
+    test_local_relaxation_after_hard_sphere()
@@ -0,0 +1,32 @@
+import numpy as np
+from structopt.common.population.crossovers.rotate import rotate, rotate_batch
+from tests.helpers import make_cluster
+
+
+def make_individual(seed):
+    individual = make_cluster()
+    numbers = individual.get_atomic_numbers()
+    numbers[np.random.RandomState(seed).rand(len(numbers)) < 0.3] = 78
+    individual.set_atomic_numbers(numbers)
+    return individual
+
+
+def test_rotate_conserves_composition():
+    parent1, parent2 = make_individual(0), make_individual(1)
+    child1, child2 = rotate(parent1, parent2, conserve_composition=True)
+    assert len(child1) == len(parent1) and len(child2) == len(parent2)
+    assert (np.sort(child1.numbers) == np.sort(parent1.numbers)).all()
+    assert (np.sort(child2.numbers) == np.sort(parent2.numbers)).all()
+
+
+def test_rotate_batch():
+    pairs = [(make_individual(i), make_individual(i + 10)) for i in range(4)]
+    children = rotate_batch(pairs)
+    assert len(children) == len(pairs)
+    for (parent1, parent2), (child1, child2) in zip(pairs, children):
+        assert len(child1) == len(parent1) and len(child2) == len(parent2)
+
+
+if __name__ == "__main__":
+    test_rotate_conserves_composition()
+    test_rotate_batch()
@@ -0,0 +1,73 @@
+import random
+
+from ase.cluster import Icosahedron
+from ase.calculators.emt import EMT
+from structopt.tools.dictionaryobject import DictionaryObject
+from structopt.aperiodic import APeriodic
+from structopt.common.population.mutations import Mutations
+import tests.helpers
+
+
+class Population(dict):
+    def __iter__(self):
+        return iter(list(self.values()))
+
+    def add(self, individual):
+        individual.id = self.next_id = getattr(self, 'next_id', 0) + 1
+        self[individual.id] = individual
+
+    def remove(self, individual):
+        del self[individual.id]
+
+
+def energy(individual):
+    atoms = individual.copy()
+    atoms.set_calculator(EMT())
+    return atoms.get_potential_energy()
+
+
+def test_lookahead():
+    random.seed(0)
+    parameters = DictionaryObject({'rattle': {'probability': 1.0, 'kwargs': {'stdev': 0.1},
+                                              'lookahead': {'candidates': 4, 'keep': 4, 'proxy': {'name': 'potential'}}}})
+    individual = APeriodic(mutation_parameters=parameters)
+    individual.extend(Icosahedron('Cu', 3))
+    individual.set_cell([20.0, 20.0, 20.0])
+    individual.center()
+    individual.id = 0
+    population = Population({0: individual})
+
+    # The candidates come sorted by the proxy
+    mutations = Mutations(parameters)
+    mutants, audit = mutations.lookahead_mutate(individual, individual.mutations.rattle)
+    assert len(mutants) == 4 and not audit
+    energies = [energy(mutated) for mutated in mutants]
+    assert energies == sorted(energies)
+    assert all(mutated.mutated_from == 0 and not mutated._relaxed for mutated in mutants)
+
+    # Only the best is kept
+    parameters['rattle']['lookahead']['keep'] = 1
+    mutations = Mutations(parameters)
+    mutations.mutate(population)
+    assert len(population) == 1 and 0 not in population
+
+    # Audited lookaheads keep all the candidates
+    parameters['rattle']['lookahead']['audit'] = 1.0
+    mutations = Mutations(parameters)
+    mutations.mutate(population)
+    assert len(population) == 4 and len(mutations.audits) == 1
+    for mutated in population:
+        mutated._fitness = energy(mutated)
+    mutations.record_lookahead(population)
+    assert mutations.audit_wins == {'rattle': (1, 1)} and not mutations.audits
+
+    # Audits with a candidate rejected by the cascade are not counted
+    mutated = list(population)[0]
+    mutations.audits = [('rattle', [individual.id for individual in population])]
+    mutated.rejected_at = 0
+    mutations.record_lookahead(population)
+    assert mutations.audit_wins == {'rattle': (1, 1)}
+
+
+if __name__ == "__main__":
+    test_lookahead()
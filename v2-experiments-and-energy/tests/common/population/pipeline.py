@@ -0,0 +1,101 @@
+import types
+
+import numpy as np
+from structopt.tools.dictionaryobject import DictionaryObject
+from structopt.common.individual import Individual
+from structopt.common.individual.fitnesses.STEM import STEM
+from structopt.common.individual.relaxations.hard_sphere_cutoff import hard_sphere_cutoff
+from structopt.common.population import pipeline
+from structopt.common.population.fitnesses import Fitnesses
+from structopt.common.population.relaxations import Relaxations
+from tests.helpers import Population as _Population, make_cluster
+
+
+class Population(_Population):
+    def relax(self):
+        self.relaxations.relax(self)
+
+    def calculate_fitnesses(self):
+        return self.fitnesses.calculate_fitnesses(self)
+
+    def update(self, individuals):
+        self[:] = individuals
+
+
+def make_population(pipeline_name, **stem_kwargs):
+    stem_parameters = {'weight': 1.0, 'use_mpi4py': False,
+                       'kwargs': dict({'HWHM': 0.4, 'dimensions': [20.0, 20.0], 'resolution': 5.0, 'zed': 1.7,
+                                       'normalize': {'SSE': True}},
+                                      **stem_kwargs)}
+    parameters = DictionaryObject({
+        'pipeline': pipeline_name,
+        'relaxations': {'hard_sphere_cutoff': {'order': 0, 'use_mpi4py': False, 'kwargs': {}}},
+        'fitnesses': {'STEM': stem_parameters}})
+    population = Population()
+    population.parameters = parameters
+    population.relaxations = Relaxations(parameters.relaxations)
+    population.fitnesses = Fitnesses(parameters.fitnesses)
+
+    fitness = STEM(parameters.fitnesses.STEM)
+    modules = {'relaxations': types.SimpleNamespace(hard_sphere_cutoff=hard_sphere_cutoff(parameters.relaxations)),
+               'fitnesses': types.SimpleNamespace(STEM=fitness)}
+    for i in range(4):
+        individual = make_cluster('Au', 3, stdev=0.1 * i, seed=i)
+        individual.__dict__.update(modules)
+        if i == 0:
+            fitness.target = fitness.get_image(individual)
+        # Squeeze two atoms together for the relaxation to separate
+        positions = individual.get_positions()
+        positions[1] = positions[0] + [0.3, 0.0, 0.0]
+        individual.set_positions(positions)
+        individual.id = i
+        population.append(individual)
+    return population
+
+
+def test_pipeline():
+    staged, fused = make_population('staged'), make_population('fused')
+    assert pipeline.fusable(fused)
+    staged_fits, _ = pipeline.evaluate(staged)
+    fused_fits, timing = pipeline.evaluate(fused)
+
+    # Both pipelines relax and evaluate the same way
+    assert np.allclose(staged_fits, fused_fits)
+    for a, b in zip(staged, fused):
+        assert np.allclose(a.positions, b.positions)
+        assert a.STEM == b.STEM and b._relaxed and b._fitted
+    assert set(timing) == {'relax', 'fitness'}
+
+    # The STEM resolution pyramid compares the population
+    assert not pipeline.fusable(make_population('fused', pyramid_levels=1))
+
+
+def relax_shard(individuals):
+    """A relaxation for `test_records`, run by the pipeline as a module."""
+    for individual in individuals:
+        change(individual)
+
+
+def test_records():
+    # Relaxations on another process that change the cell or the number of
+    # atoms come back in the record
+    global change
+    population = make_population('fused')
+    original = population[0]
+    for change in [lambda individual: individual.set_cell([22.0, 22.0, 22.0], scale_atoms=True),
+                   lambda individual: individual.pop(0)]:
+        relaxed = Individual(load_modules=False)
+        relaxed.extend(original)
+        relaxed.set_cell(original.get_cell())
+        relaxed.id = original.id
+        positions = original.get_positions()
+        [record] = pipeline.evaluate_shard([relaxed], relaxations=[__name__], fitnesses=[], names=[])
+        pipeline.apply_record(original, positions, record)
+        assert len(original) == len(relaxed)
+        assert np.allclose(original.get_cell(), relaxed.get_cell())
+        assert np.allclose(original.positions, relaxed.positions)
+
+
+if __name__ == "__main__":
+    test_pipeline()
+    test_records()
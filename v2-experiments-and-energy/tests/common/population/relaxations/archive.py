@@ -0,0 +1,56 @@
+import os
+import types
+import tempfile
+
+import numpy as np
+from structopt.tools.dictionaryobject import DictionaryObject
+from structopt.tools import rotation_matrix
+from structopt.common.individual.relaxations.archive import archive
+from structopt.common.population.relaxations.archive import relax, record, archives
+from structopt.common.crossmodule.basins import BasinArchive
+from tests.helpers import Population, make_cluster
+
+
+def make_individual(parameters, id, stdev=0.0, seed=0):
+    individual = make_cluster('Cu', 2, stdev=stdev, seed=seed)
+    individual.relaxations = types.SimpleNamespace(archive=archive(parameters))
+    individual.numbers[:4] = 79
+    individual.id = id
+    return individual
+
+
+def test_archive():
+    checkpoint = os.path.join(tempfile.mkdtemp(), 'basins.pkl')
+    parameters = DictionaryObject({'use_mpi4py': False, 'kwargs': {'checkpoint': checkpoint}})
+    archives.clear()
+    population = Population(make_individual(parameters, i, 0.1, seed=i) for i in range(3))
+    population.relaxations = types.SimpleNamespace(parameters={'archive': parameters})
+    population.fitnesses = types.SimpleNamespace(parameters={'LAMMPS': {}})
+
+    relax(population, parameters)
+    assert not any(individual.basin_hit for individual in population)
+
+    # The first two relax into the ideal icosahedron, the third elsewhere
+    relaxed = make_individual(parameters, None).get_positions()
+    for individual in population:
+        individual.set_positions(relaxed if individual.id < 2 else relaxed * 1.05)
+        individual.LAMMPS = -3.0 if individual.id < 2 else -2.0
+        individual._fitness = individual.LAMMPS
+        individual._relaxed = individual._fitted = True
+    record(population, parameters)
+    assert len(archives['archive']) == 2
+    assert len(BasinArchive.load(checkpoint)) == 2
+
+    # A copy of an individual from before its relaxation and a rotated
+    # minimum are found; a new structure is not
+    children = Population([make_individual(parameters, 3, 0.1, seed=0), make_individual(parameters, 4, 0.1, seed=7),
+                           make_individual(parameters, 5)])
+    children[2].set_positions((relaxed - relaxed.mean(axis=0)).dot(rotation_matrix([1.0, 1.0, 0.0], 0.4).T))
+    relax(children, parameters)
+    assert [child.basin_hit for child in children] == [True, False, True]
+    assert np.allclose(children[0].positions, relaxed) and children[0].LAMMPS == -3.0 and children[0]._relaxed
+    assert not children[1]._relaxed and not hasattr(children[1], 'LAMMPS')
+
+
+if __name__ == "__main__":
+    test_archive()
@@ -0,0 +1,85 @@
+import types
+
+import numpy as np
+from ase.calculators.emt import EMT
+from structopt.tools.dictionaryobject import DictionaryObject
+from structopt.common.individual.relaxations.cascade import cascade
+from structopt.common.population.relaxations.cascade import relax, surrogates, REJECTED_LEVEL
+from structopt.common.population.fitnesses import stratify
+from tests.helpers import Population, make_cluster
+
+
+def make_population(parameters, n=6, stdev=0.05):
+    module = cascade(parameters)
+    population = Population()
+    for i in range(n):
+        individual = make_cluster('Cu', 2, stdev=stdev * i, seed=i)
+        individual.relaxations = types.SimpleNamespace(cascade=module)
+        individual.id = i
+        population.append(individual)
+    return population
+
+
+def test_cascade():
+    parameters = DictionaryObject({'use_mpi4py': False, 'kwargs': {'stages': [
+        {'name': 'overlap', 'kwargs': {'cutoff': 1.0}},
+        {'name': 'potential', 'keep': 0.5}]}})
+    population = make_population(parameters)
+
+    # Squeeze two atoms of the first individual together
+    positions = population[0].get_positions()
+    positions[1] = positions[0] + [0.5, 0.0, 0.0]
+    population[0].set_positions(positions)
+    population[5]._relaxed = True
+
+    relax(population, parameters)
+    assert population[0].rejected_at == 0
+    assert population[5].rejected_at is None and not hasattr(population[5], 'cascade_scores')
+
+    # The less rattled half of those scored by the potential pass it
+    energies = {individual.id: individual.cascade_scores[1] for individual in population[1:5]}
+    passed = [individual.id for individual in population[1:5] if individual.rejected_at is None]
+    assert sorted(passed) == sorted(energies, key=energies.get)[:2]
+    assert all(not individual._relaxed for individual in population if individual.id in passed)
+
+    # Rejected individuals rank behind the evaluated ones, earlier rejections last
+    fitnesses = [individual.cascade_penalty if individual.rejected_at is not None else -1.0 * individual.id
+                 for individual in population]
+    levels = [individual.fitness_level for individual in population]
+    assert max(levels) == REJECTED_LEVEL + 2
+    fitnesses = stratify(fitnesses, levels)
+    order = np.argsort(fitnesses)
+    assert order[-1] == 0
+    assert set(order[:3]) == set(passed) | {5}
+
+
+def test_surrogate():
+    surrogates.clear()
+    parameters = DictionaryObject({'use_mpi4py': False, 'kwargs': {'stages': [
+        {'name': 'surrogate', 'kwargs': {'min_samples': 20}}]}})
+    population = make_population(parameters, 24, 0.01)
+    population.initial_number_of_individuals = 12
+
+    # The first generation passes while the model has no data
+    relax(population, parameters)
+    assert all(individual.rejected_at is None for individual in population)
+    for individual in population:
+        atoms = individual.copy()
+        atoms.set_calculator(EMT())
+        individual.LAMMPS = atoms.get_potential_energy()
+        individual._relaxed = True
+
+    # Children far worse than the population are rejected
+    children = make_population(parameters, 12, 0.01)
+    for child in children[6:]:
+        child.rattle(0.3, seed=child.id)
+    population.extend(children)
+    relax(population, parameters)
+    assert len(surrogates[0]) == 24
+    assert all(child.rejected_at is None for child in children[:6])
+    assert all(child.rejected_at == 0 for child in children[6:])
+
+
+if __name__ == "__main__":
+    test_cascade()
+    test_surrogate()
@@ -0,0 +1,28 @@
+"""Scaffolding shared by the tests. Importing this module points the
+logging at a temporary directory and runs as MPI rank 0."""
+import sys
+import tempfile
+
+from ase.cluster import Icosahedron
+import structopt
+from structopt.common.individual import Individual
+
+sys.modules['gparameters'].update({'logging': {'path': tempfile.mkdtemp()}, 'mpi': {'rank': 0}})
+
+
+class Population(list):
+    """A population that is just a list of individuals."""
+    pass
+
+
+def make_cluster(symbol='Au', shells=3, cell=20.0, stdev=0.0, seed=0):
+    """Returns an icosahedral cluster centered in a cubic cell, rattled by
+    `stdev` if it is nonzero."""
+    individual = Individual(load_modules=False)
+    individual.fitnesses = None
+    individual.extend(Icosahedron(symbol, shells))
+    individual.set_cell([cell, cell, cell])
+    individual.center()
+    if stdev:
+        individual.rattle(stdev, seed=seed)
+    return individual
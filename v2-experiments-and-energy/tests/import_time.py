@@ -0,0 +1,42 @@
+import sys
+import subprocess
+
+# Generous enough for a loaded shared filesystem; `import structopt` used to
+# take several times this once scipy and mpi4py were pulled in
+IMPORT_TIME_BUDGET = 1.0
+
+HEAVY_MODULES = ['scipy', 'mpi4py', 'ase.visualize', 'ase.io', 'ase.cluster', 'distutils.spawn']
+
+SCRIPT = """
+import sys, time
+t0 = time.time()
+import structopt
+import structopt.aperiodic.individual.mutations
+import structopt.aperiodic.population.crossovers
+import structopt.aperiodic.population.fingerprinters
+print(time.time() - t0)
+print(' '.join(sys.modules))
+"""
+
+
+def run_import():
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT], universal_newlines=True)
+    elapsed, modules = output.splitlines()
+    return float(elapsed), modules.split()
+
+
+def test_no_heavy_imports():
+    elapsed, modules = run_import()
+    for heavy in HEAVY_MODULES:
+        loaded = [name for name in modules if name == heavy or name.startswith(heavy + '.')]
+        assert not loaded, "{} was imported by `import structopt`".format(heavy)
+
+
+def test_import_time_budget():
+    elapsed = min(run_import()[0] for _ in range(3))
+    assert elapsed < IMPORT_TIME_BUDGET, "`import structopt` took {:.2f} s".format(elapsed)
+
+
+if __name__ == "__main__":
+    test_no_heavy_imports()
+    test_import_time_budget()
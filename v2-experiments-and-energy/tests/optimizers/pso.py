@@ -0,0 +1,63 @@
+import numpy as np
+from structopt.common.individual.relaxations.hard_sphere_cutoff import hard_sphere_cutoff
+from structopt.optimizers.pso import Swarm
+from tests.helpers import make_cluster
+
+
+def make_particles(n=3):
+    particles = []
+    for i in range(n):
+        individual = make_cluster('Au', 2, stdev=0.1, seed=i)
+        individual.set_velocities(np.full((len(individual), 3), 0.1 * i))
+        individual.id = i
+        particles.append(individual)
+    return particles
+
+
+def test_swarm():
+    particles = make_particles()
+    swarm = Swarm(particles, omega=0.5, phi_p=1.0, phi_g=2.0)
+    swarm.materialize(particles)
+    assert np.shares_memory(particles[1].positions, swarm.positions[1])
+
+    # Positions set on the particle go into the swarm; positions replaced
+    # (e.g. by a relaxed copy from another process) are read back
+    particles[0].set_positions(particles[0].get_positions() + 0.1)
+    assert np.shares_memory(particles[0].positions, swarm.positions[0])
+    assert np.allclose(swarm.positions[0], particles[0].positions)
+    relaxed = particles[2].get_positions() + 0.2
+    particles[2].arrays['positions'] = relaxed
+    assert swarm.update_bests(particles, [3.0, 1.0, 2.0])
+    assert np.allclose(swarm.positions[2], relaxed)
+    assert swarm.best == 1
+    assert not swarm.update_bests(particles, [2.0, 4.0, 5.0])
+    assert np.allclose(swarm.best_fitnesses, [2.0, 1.0, 2.0])
+
+    # One step moves every particle as `update_particle` does
+    positions, velocities, best = swarm.positions.copy(), swarm.velocities.copy(), swarm.best_positions.copy()
+    np.random.seed(0)
+    swarm.move()
+    np.random.seed(0)
+    rp = np.random.rand(*positions.shape)
+    rg = np.random.rand(*positions.shape)
+    expected = 0.5 * velocities + 1.0 * rp * (best - positions) + 2.0 * rg * (best[1] - positions)
+    assert np.allclose(swarm.velocities, expected)
+    assert np.allclose(swarm.positions, positions + expected)
+
+    best_individual = swarm.best_individual(particles)
+    assert np.allclose(best_individual.positions, swarm.best_positions[1])
+    assert best_individual._fitness == 1.0
+
+    # Relaxations that move the atoms in place write into the swarm
+    swarm.materialize(particles)
+    positions = swarm.positions.copy()
+    particles[0].set_cell([20.0, 20.0, 20.0])
+    hard_sphere_cutoff(parameters=None, cutoff=3.5).relax(particles[0])
+    swarm.update_bests(particles, [5.0, 5.0, 5.0])
+    assert not np.allclose(swarm.positions[0], positions[0])
+    assert np.allclose(swarm.positions[0], particles[0].positions)
+    assert np.allclose(swarm.positions[1:], positions[1:])
+
+
+if __name__ == "__main__":
+    test_swarm()
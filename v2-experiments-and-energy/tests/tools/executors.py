@@ -0,0 +1,77 @@
+import time
+import random
+
+from structopt.tools import AdaptiveTimeout
+from structopt.tools.executors import SerialExecutor, ProcessPoolExecutor, merge
+
+
+def square(x):
+    return x * x
+
+
+def squares(xs):
+    return [x * x for x in xs]
+
+
+def draw(x):
+    return random.random()
+
+
+def nap(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_split_merge():
+    executor = ProcessPoolExecutor(max_workers=3)
+    items = list(range(10))
+    chunks = executor.split(items)
+    assert len(chunks) == 3
+    assert merge(chunks) == items
+
+
+def test_serial_map():
+    assert SerialExecutor().map(square, range(5)) == [0, 1, 4, 9, 16]
+
+
+def test_process_pool_map():
+    executor = ProcessPoolExecutor(max_workers=2)
+    try:
+        assert executor.map(square, range(20)) == [x * x for x in range(20)]
+        # Every task is seeded separately, so the workers do not repeat each other's random numbers
+        assert len(set(executor.map(draw, range(20)))) == 20
+        assert executor.map_shards(squares, range(7)) == [x * x for x in range(7)]
+    finally:
+        executor.shutdown()
+
+
+def test_map_stragglers():
+    executor = ProcessPoolExecutor(max_workers=2)
+    try:
+        results, stragglers = executor.map_stragglers(nap, [0.01, 0.01, 0.01, 1.0], quorum=0.75, grace=0.1)
+        assert results == [0.01, 0.01, 0.01, None]
+        assert stragglers == [3]
+    finally:
+        executor.shutdown()
+
+
+def test_adaptive_timeout():
+    tracker = AdaptiveTimeout(quantile=0.5, factor=2.0, minimum=1.0, maximum=100.0, min_samples=3)
+    assert tracker.timeout == 100.0
+    tracker.observe([2.0, 4.0, 6.0])
+    assert tracker.timeout == 8.0
+    tracker.observe([0.1] * 10)
+    assert tracker.timeout == 1.0
+
+    # Evaluations stopped at their timeout keep the quantile up
+    tracker = AdaptiveTimeout(quantile=0.5, factor=2.0, minimum=1.0, maximum=100.0, min_samples=3)
+    tracker.observe([1.0, 1.0], censored=[20.0, 20.0, 20.0])
+    assert tracker.timeout == 40.0
+
+
+if __name__ == "__main__":
+    test_split_merge()
+    test_serial_map()
+    test_process_pool_map()
+    test_map_stragglers()
+    test_adaptive_timeout()
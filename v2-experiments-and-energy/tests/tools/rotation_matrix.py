@@ -0,0 +1,17 @@
+import numpy as np
+
+from structopt.tools import rotation_matrix, rotation_matrices
+
+
+def test_rotation_matrices():
+    rng = np.random.RandomState(0)
+    axes = rng.normal(size=(20, 3))
+    thetas = rng.uniform(0, 2 * np.pi, 20)
+    matrices = rotation_matrices(axes, thetas)
+    assert matrices.shape == (20, 3, 3)
+    for axis, theta, matrix in zip(axes, thetas, matrices):
+        assert np.allclose(matrix, rotation_matrix(axis, theta))
+
+
+if __name__ == "__main__":
+    test_rotation_matrices()